@@ -0,0 +1,410 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmarks of the matrix load, edit and save paths on synthetic projects.
+
+    python benchmarks/bench_nccm.py [-o results.json] [--compare baseline.json]
+
+Each benchmark is run for every class count on a generated project with a rule for
+RULE_DENSITY of its class pairs and a board of BOARD_TRACKS tracks, apart from
+startup_import, which times the imports of the plugin up to its window being shown once
+per run and is given as N=0. The results are written as JSON so that two runs, such as
+before and after a commit, can be compared with --compare.
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from nccm_audit import AuditCache, audit_clearances, get_reach, read_board_copper  # noqa: E402
+from nccm_core import (  # noqa: E402
+    Project,
+    fill_matrix,
+    generate_coords,
+    get_class_clearances,
+    get_effective_cells,
+    parse_cell_values,
+)
+from nccm_dru import (  # noqa: E402
+    get_class_val_dict,
+    get_rule_strings,
+    iter_rule_strings,
+    parse_dru,
+    read_dru,
+    update_rules,
+    write_rules,
+)
+from nccm_fake import Board, is_copper_layer, write_synthetic_project  # noqa: E402
+from nccm_layout import ExtentCache, get_grid_layout  # noqa: E402
+from nccm_matrix import ClearanceMatrix, pair_baselines  # noqa: E402
+from nccm_netclass import CACHE_DIR_ENV  # noqa: E402
+from nccm_store import load_matrix as load_stored_matrix  # noqa: E402
+
+SIZES = [5, 34, 200, 1000]
+RULE_DENSITY = 0.1
+BOARD_TRACKS = 10000
+REPEAT = 5
+
+# Each sample runs a benchmark enough times to last at least this long
+MIN_SAMPLE_S = 0.01
+
+# Slowdown ratio reported as a regression by --compare
+THRESHOLD = 1.25
+
+RESULTS_VERSION = 1
+
+STARTUP = "startup_import"
+
+# Imports up to the window being shown, run in a new interpreter. wx is imported before
+# the clock starts, as the plugin cannot put it off, and without wx the modules given
+# as arguments are imported in place of nccm_action.
+STARTUP_CODE = """
+import importlib.util, sys, time
+if importlib.util.find_spec("wx"):
+    import wx, wx.grid
+    modules = ["nccm_action"]
+else:
+    modules = sys.argv[1:]
+start = time.perf_counter()
+for module in modules:
+    __import__(module)
+print(time.perf_counter() - start)
+"""
+
+
+def measure(func: Callable, repeat: int) -> list[float]:
+    """Time a function, calling it as many times per sample as needed to get past the
+    resolution of the clock.
+
+    :param func: Function to time, called without arguments.
+    :param repeat: Number of samples.
+    :return: Seconds per call of each sample.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SAMPLE_S:
+            break
+        number *= 10
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+
+    return samples
+
+
+def get_startup_imports() -> list[str]:
+    """Get the modules imported at the top of nccm_action, apart from wx and the GUI
+    module built on it.
+
+    :return: Module names, in the order they are imported.
+    """
+    f_read = open(os.path.join(REPO_ROOT, "nccm_action.py"), "r", encoding="utf-8")
+    tree = ast.parse(f_read.read())
+    f_read.close()
+
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            modules.append(node.module)
+
+    gui_modules = ("wx", "nccm_gui")
+    return [name for name in dict.fromkeys(modules) if name.split(".")[0] not in gui_modules]
+
+
+def measure_startup(repeat: int) -> list[float]:
+    """Time the imports of the plugin up to its window being shown, each sample in a new
+    interpreter so that nothing is imported yet.
+
+    :param repeat: Number of samples.
+    :return: Seconds taken by the imports in each sample.
+    """
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_CODE, *get_startup_imports()],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(float(result.stdout))
+
+    return samples
+
+
+def get_result(name: str, size: int, samples: list[float]) -> dict:
+    """Get the result of a benchmark in the JSON format, reporting it as it goes.
+
+    :param name: Name of the benchmark.
+    :param size: Class count it was run at.
+    :param samples: Seconds per call of each sample.
+    :return: Result of the benchmark.
+    """
+    print(f"{name:<26}N={size:<6}{min(samples) * 1000:>12.3f} ms", file=sys.stderr)
+    return {
+        "name": name,
+        "n": size,
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+    }
+
+
+def get_benchmarks(directory: str, size: int) -> dict[str, Callable]:
+    """Generate a project of size classes and get the benchmarks to run on it.
+
+    :param directory: Directory to generate the project in.
+    :param size: Number of net classes.
+    :return: Benchmark functions by name.
+    """
+    rule_count = round(size * (size + 1) // 2 * RULE_DENSITY)
+    pro_path = write_synthetic_project(directory, size, rule_count, BOARD_TRACKS)
+    project = Project(pro_path)
+    net_classes = project.get_net_classes()
+    class_names = [net_class.name for net_class in net_classes]
+    baselines = pair_baselines(get_class_clearances(net_classes))
+
+    data, dru = read_dru(project.dru_path)
+    class_val_dict = get_class_val_dict(dru)
+    matrix = ClearanceMatrix(size)
+    coord_val_dict, _ = fill_matrix(matrix, class_names, class_val_dict)
+    cells = get_effective_cells(coord_val_dict.items(), baselines)
+    items = read_board_copper(Board(project), class_names, is_copper_layer)
+    reach = get_reach(matrix, baselines)
+    audit_cache = AuditCache(items, size, None, reach)
+
+    def audit_cell():
+        # Typing a value further than the audit reached measures the pair's classes again
+        audit_cache.pairs.clear()
+        audit_cache.count_violations(0, size - 1, reach * 2)
+
+    def load_matrix():
+        fill_matrix(ClearanceMatrix(size), class_names, class_val_dict)
+
+    def load_store():
+        # The first call parses the rules and writes the store that the others load
+        load_stored_matrix(project.dru_path, ClearanceMatrix(size), class_names)
+
+    def edit_cell():
+        # An edit stores the new value and updates the values of the non-empty cells
+        matrix.set(0, size - 1, matrix.get(0, size - 1) + 0.001)
+        coord_val_dict[(0, size - 1)] = matrix.get(0, size - 1)
+
+    def check_all_cells():
+        dict(matrix.nonzero())
+
+    # Text of every cell, as pasted from a spreadsheet
+    texts = [f"{value}mm" for value in matrix.values]
+
+    # Labels measured as if every character was 7 by 14 pixels, cached after the first call
+    extent_cache = ExtentCache()
+
+    def measure(texts):
+        return extent_cache.measure("bench", texts, lambda text: (7 * len(text), 14))
+
+    cell_sets = [cells, cells[1:]]
+
+    # The same rules with the value of one pair in the middle of the section edited
+    middle = len(cells) // 2
+    edited = cells[:middle] + [(cells[middle][0], cells[middle][1] + 0.001)] + cells[middle + 1 :]
+    edit_sets = [cells, edited]
+
+    def update_one_rule():
+        edit_sets.reverse()
+        update_rules(project.dru_path, iter_rule_strings(class_names, edit_sets[0]))
+
+    def update_unchanged():
+        update_rules(project.dru_path, iter_rule_strings(class_names, cells))
+
+    # Switching between separate and grouped rules rewrites every rule of the section
+    compact_modes = [False, True]
+
+    def rewrite_file():
+        compact_modes.reverse()
+        update_rules(project.dru_path, iter_rule_strings(class_names, cells, compact_modes[0]))
+
+    def stream_rules():
+        cell_sets.reverse()
+        write_rules(project.dru_path, iter_rule_strings(class_names, cell_sets[0]))
+
+    return {
+        "generate_coords": lambda: generate_coords(size),
+        "parse_dru": lambda: parse_dru(data),
+        "get_class_val_dict": lambda: get_class_val_dict(dru),
+        "load_matrix": load_matrix,
+        "load_store": load_store,
+        "parse_values": lambda: parse_cell_values(texts),
+        "pair_baselines": lambda: pair_baselines(get_class_clearances(net_classes)),
+        "get_rule_strings": lambda: get_rule_strings(class_names, cells),
+        "get_rule_strings_compact": lambda: get_rule_strings(class_names, cells, True),
+        "update_unchanged": update_unchanged,
+        "update_rewrite": rewrite_file,
+        "write_rules": stream_rules,
+        "update_one_rule": update_one_rule,
+        "audit_board": lambda: audit_clearances(items, size, reach),
+        "audit_cell": audit_cell,
+        "edit_cell": edit_cell,
+        "grid_layout": lambda: get_grid_layout(class_names, measure, 100, 12, 25),
+        "check_all_cells": check_all_cells,
+    }
+
+
+def get_commit() -> Optional[str]:
+    """Get the commit the benchmarks are run on.
+
+    :return: Commit hash, None outside of a git checkout.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return result.stdout.strip()
+
+
+def run(sizes: list[int], repeat: int, names: Optional[list[str]] = None) -> dict:
+    """Run the benchmarks for every class count.
+
+    :param sizes: Class counts to run at.
+    :param repeat: Number of samples per benchmark.
+    :param names: Benchmarks to run, all by default.
+    :return: Results in the JSON format.
+    """
+    results = []
+    if not names or STARTUP in names:
+        results.append(get_result(STARTUP, 0, measure_startup(repeat)))
+
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="nccm-bench-") as directory:
+            # Keep the matrix stores of the generated projects out of the user's cache
+            os.environ[CACHE_DIR_ENV] = os.path.join(directory, "cache")
+            for name, func in get_benchmarks(directory, size).items():
+                if names and name not in names:
+                    continue
+                results.append(get_result(name, size, measure(func, repeat)))
+
+    if cache_dir is None:
+        del os.environ[CACHE_DIR_ENV]
+    else:
+        os.environ[CACHE_DIR_ENV] = cache_dir
+
+    return {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> list[str]:
+    """Compare two runs by their fastest samples.
+
+    :param baseline: Results to compare against.
+    :param current: New results.
+    :param threshold: Slowdown ratio counted as a regression.
+    :return: Lines of the comparison, regressions marked with "!".
+    """
+    baseline_times = {
+        (result["name"], result["n"]): result["min_s"] for result in baseline["results"]
+    }
+
+    lines = []
+    for result in current["results"]:
+        before = baseline_times.get((result["name"], result["n"]))
+        if not before:
+            continue
+        ratio = result["min_s"] / before
+        mark = "!" if ratio > threshold else " "
+        lines.append(f"{mark} {result['name']:<26}N={result['n']:<6}{ratio:>8.2f}x")
+
+    return lines
+
+
+def main(argv: list[str] = None) -> int:
+    """Run the benchmarks from the command line.
+
+    :param argv: Arguments to use instead of the ones of the process.
+    :return: Exit code, 1 if --compare found a regression.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=SIZES,
+        help="Comma separated class counts.",
+    )
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Samples per benchmark.")
+    parser.add_argument("--only", nargs="+", help="Names of the benchmarks to run.")
+    parser.add_argument("-o", "--output", help="File to write the JSON results to.")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with.")
+    parser.add_argument(
+        "--threshold", type=float, default=THRESHOLD, help="Slowdown counted as a regression."
+    )
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.repeat, args.only)
+
+    if args.output:
+        f_write = open(args.output, "w", encoding="utf-8")
+        json.dump(current, f_write, indent=2)
+        f_write.close()
+    else:
+        print(json.dumps(current, indent=2))
+
+    if not args.compare:
+        return 0
+
+    f_read = open(args.compare, "r", encoding="utf-8")
+    baseline = json.load(f_read)
+    f_read.close()
+
+    lines = compare(baseline, current, args.threshold)
+    print("\n".join(lines), file=sys.stderr)
+    return 1 if any(line.startswith("!") for line in lines) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
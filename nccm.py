@@ -0,0 +1,226 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Command line interface of the NCCM, working on project directories without KiCad.
+
+    python -m nccm export PROJECT [-o MATRIX]
+    python -m nccm apply PROJECT MATRIX [--compact]
+    python -m nccm clear PROJECT
+    python -m nccm batch MATRIX PROJECT... [--compact] [--map MAP] [--jobs N]
+"""
+
+import argparse
+import json
+import sys
+
+from nccm_core import (
+    FAILED,
+    NccmError,
+    Project,
+    apply_matrix,
+    apply_to_projects,
+    clear_matrix,
+    export_matrix,
+    find_projects,
+    read_matrix_file,
+    write_matrix_file,
+)
+from nccm_dru import CREATED, UNCHANGED, UPDATED, DruSyntaxError
+
+
+def warn_missing(project: Project, missing: list[tuple]):
+    """Print the class pairs that name classes missing from a project.
+
+    :param project: Project the pairs were matched against.
+    :param missing: Class pairs naming missing classes.
+    """
+    for class_a, class_b in missing:
+        print(
+            f"{project.name}: skipped {class_a} to {class_b}, class not in project",
+            file=sys.stderr,
+        )
+
+
+def export_command(args: argparse.Namespace) -> int:
+    """Export the matrix held in a project's custom rules.
+
+    :param args: Parsed command line arguments.
+    :return: Exit code.
+    """
+    project = Project(args.project)
+    class_names, cells, missing = export_matrix(project)
+    warn_missing(project, missing)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "json" if args.output and args.output.lower().endswith(".json") else "csv"
+
+    if args.output:
+        f_write = open(args.output, "w", encoding="utf-8", newline="")
+        write_matrix_file(f_write, class_names, cells, fmt)
+        f_write.close()
+    else:
+        write_matrix_file(sys.stdout, class_names, cells, fmt)
+
+    return 0
+
+
+def apply_command(args: argparse.Namespace) -> int:
+    """Write a matrix file to a project's custom rules.
+
+    :param args: Parsed command line arguments.
+    :return: Exit code.
+    """
+    project = Project(args.project)
+    class_val_dict = read_matrix_file(args.matrix)
+    status, rule_count, missing = apply_matrix(project, class_val_dict, args.compact)
+    warn_missing(project, missing)
+
+    print(f"{project.name}: {status} ({rule_count} rules)")
+    return 0
+
+
+def clear_command(args: argparse.Namespace) -> int:
+    """Remove the NCCM section from a project's custom rules.
+
+    :param args: Parsed command line arguments.
+    :return: Exit code.
+    """
+    project = Project(args.project)
+    if clear_matrix(project):
+        print(f"{project.name}: cleared")
+    else:
+        print(f"{project.name}: no NCCM section")
+
+    return 0
+
+
+def batch_command(args: argparse.Namespace) -> int:
+    """Write a matrix file to the custom rules of many projects in parallel.
+
+    :param args: Parsed command line arguments.
+    :return: Exit code, 1 if any project failed.
+    """
+    class_val_dict = read_matrix_file(args.matrix)
+
+    class_map = None
+    if args.map:
+        try:
+            f_read = open(args.map, "r", encoding="utf-8")
+            class_map = json.load(f_read)
+            f_read.close()
+        except ValueError as err:
+            raise NccmError(f"Invalid class map {args.map}: {err}")
+
+    paths = find_projects(args.projects)
+    if not paths:
+        raise NccmError("No projects found")
+
+    results = apply_to_projects(paths, class_val_dict, args.compact, class_map, args.jobs)
+
+    counts = {CREATED: 0, UPDATED: 0, UNCHANGED: 0, FAILED: 0}
+    for result in results:
+        counts[result.status] += 1
+        if result.status == FAILED:
+            print(f"{result.path}: {FAILED}, {result.error}", file=sys.stderr)
+            continue
+        for class_a, class_b in result.missing:
+            print(
+                f"{result.path}: skipped {class_a} to {class_b}, class not in project",
+                file=sys.stderr,
+            )
+        print(f"{result.path}: {result.status} ({result.rule_count} rules)")
+
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    return 1 if counts[FAILED] else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Get the parser of the command line arguments.
+
+    :return: Argument parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="nccm", description="Net Class Clearance Matrix for KiCad projects."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export the matrix of a project's custom rules to CSV or JSON."
+    )
+    export_parser.add_argument("project", help="Project directory or .kicad_pro file.")
+    export_parser.add_argument("-o", "--output", help="File to write, stdout by default.")
+    export_parser.add_argument("--format", choices=["csv", "json"])
+    export_parser.set_defaults(func=export_command)
+
+    apply_parser = subparsers.add_parser(
+        "apply", help="Write a CSV or JSON matrix to a project's custom rules."
+    )
+    apply_parser.add_argument("project", help="Project directory or .kicad_pro file.")
+    apply_parser.add_argument("matrix", help="Matrix .csv or .json file.")
+    apply_parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Group the class pairs sharing a clearance into as few rules as possible.",
+    )
+    apply_parser.set_defaults(func=apply_command)
+
+    clear_parser = subparsers.add_parser(
+        "clear", help="Remove the NCCM section from a project's custom rules."
+    )
+    clear_parser.add_argument("project", help="Project directory or .kicad_pro file.")
+    clear_parser.set_defaults(func=clear_command)
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Write a CSV or JSON matrix to the custom rules of many projects."
+    )
+    batch_parser.add_argument("matrix", help="Matrix .csv or .json template.")
+    batch_parser.add_argument(
+        "projects", nargs="+", help="Project directories, .kicad_pro files or globs of either."
+    )
+    batch_parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Group the class pairs sharing a clearance into as few rules as possible.",
+    )
+    batch_parser.add_argument(
+        "--map", help="JSON file mapping template class names to project class names."
+    )
+    batch_parser.add_argument(
+        "-j", "--jobs", type=int, help="Number of worker processes, one per CPU by default."
+    )
+    batch_parser.set_defaults(func=batch_command)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    """Run the command line interface.
+
+    :param argv: Arguments to use instead of the ones of the process.
+    :return: Exit code.
+    """
+    args = get_parser().parse_args(argv)
+
+    try:
+        return args.func(args)
+    except (NccmError, DruSyntaxError, OSError) as err:
+        print(f"nccm: {err}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,33 +15,79 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
-import re
+import threading
+from typing import Iterator, Optional
 
-import kipy
-from kipy import errors
 import wx
+import wx.grid
 from wx import PyEventBinder
 
 from nccm_gui import NetClassClearanceMatrixDialog, InfoDialog
+from nccm_audit import AuditCache, get_reach, read_board_copper
+from nccm_dru import (
+    CLEARANCE,
+    CONSTRAINTS,
+    CREATED,
+    UNCHANGED,
+    DruSyntaxError,
+    iter_rule_strings,
+    remove_section_from_file,
+    update_rules,
+)
+from nccm_core import (
+    MAX,
+    MIN,
+    NccmError,
+    convert_to_float,
+    copy_cells,
+    fill_cells,
+    generate_coords,
+    get_block_cells,
+    get_class_cells,
+    get_class_clearances,
+    iter_effective_layer_cells,
+    merge_cells,
+    missing_class_message,
+    parse_cell_value,
+    parse_tsv,
+    paste_cells,
+)
+from nccm_layout import ExtentCache, get_grid_layout
+from nccm_matrix import CellValues, ClearanceMatrix, MatrixStack, PairBaselines, pair_baselines
+import nccm_profile
+from nccm_profile import phase, profiled
+from nccm_netclass import KiCadProvider, ProjectFileProvider, get_file_key, get_net_classes
+from nccm_store import load_matrix, save_matrix
+from nccm_units import format_mm
+from nccm_watch import get_watcher, read_section_matrix
 
 __version__ = "0.1.2"
 __author__ = "Yiannis Michael (ymich9963)"
 __license__ = "GNU General Public License v3.0 only"
 
 # Numeric constants
-MIN = 0.000000
-MAX = 999.999999
-DP = 6
 COL_WIDTH = 100
 MAX_CHAR_COL_LABEL = 12
+REFRESH_DELAY_MS = 150
+WATCH_INTERVAL_MS = 500
 
-# Section strings
-SECTION_START_STR = "### 4E43434D NCCM SECTION START ###\n"
-SECTION_END_STR = "### 4E43434D NCCM SECTION END ###\n"
+# Background of the cells also changed in the custom rules file
+CONFLICT_COLOUR = wx.Colour(255, 200, 120)
 
-# Rule strings
-START_OF_RULE_NAME = 'rule "CLR_'
-START_OF_CLEARANCE = "  (constraint clearance (min "
+# Backgrounds of the cells closer on the board than their clearance, from barely to far
+HEAT_COLOURS = [
+    wx.Colour(255, 225, 225),
+    wx.Colour(255, 190, 190),
+    wx.Colour(250, 150, 150),
+    wx.Colour(240, 110, 110),
+]
+
+# Title shown while the board is being read
+LOADING_TITLE_SUFFIX = " - Loading..."
+
+# Environment variable selecting the KiCad stand-in, nccm_fake.FAKE_KICAD_ENV, read here
+# so that the stand-in is only imported when it is used
+FAKE_KICAD_ENV = "NCCM_FAKE_KICAD"
 
 
 class NetClassClearanceMatrix(NetClassClearanceMatrixDialog):
@@ -52,42 +98,161 @@ class NetClassClearanceMatrix(NetClassClearanceMatrixDialog):
     :param project: The project that the board is a part of.
     :param net_classes: A list of the board net classes.
     :param class_count: Number of net classes.
-    :param valid_coords: List containing the valid coordinates of the table.
-    :param invalid_coords: List containing the invalid coordinates of the table.
-    :param coord_val_dict: Dictionary containing coordinates and their value as key-value pairs.
+    :param layers: Packed layer of the values of every constraint type.
+    :param constraint: Constraint type of the layer shown in the grid.
+    :param matrix: Packed store of the values shown in the grid, the selected layer.
+    :param baselines: Packed clearances each pair already gets from its net classes.
+    :param table: Virtual grid table reading from the matrix.
+    :param valid_coords: Sequence of the valid coordinates of the table.
+    :param invalid_coords: Sequence of the invalid coordinates of the table.
+    :param coord_val_dict: Coordinates and their value as key-value pairs, read from the matrix.
     :param class_val_dict: Dictionary containing the two classes and their value as key-value pairs.
-    :param rule_strings: List of the rule strings to be used.
+    :param rule_count: Number of rules last written.
+    :param refresh_timer: Pending debounced call to refresh_sizes, if any.
+    :param missing_class_rules: Class pairs of loaded rules naming classes not on the board.
+    :param disk_layers: Values of the NCCM section when it was last loaded or saved.
+    :param layer_conflicts: Cells of each layer also changed in the custom rules file.
+    :param section_digest: SHA-256 of the NCCM section then, None if there was none.
+    :param watcher: Watcher of the custom rules file, polled by watch_timer.
+    :param audit_cache: Clearances measured on the board by the last audit, if any.
+    :param extent_cache: Extents of the label texts, measured once per font.
+    :param background: Read the board on a worker thread, after the dialog has been shown.
     """
 
-    def __init__(self):
+    def __init__(self, background: bool = False):
         super(NetClassClearanceMatrix, self).__init__(None)
-        self.kicad = kipy.KiCad()
+        self.kicad = None
+        self.board = None
+        self.project = None
+        self.net_classes = []
+        self.class_count = 0
+        self.layers = MatrixStack(0, CONSTRAINTS)
+        self.constraint = CLEARANCE
+        self.matrix = self.layers.layer(self.constraint)
+        self.baselines = pair_baselines([])
+        self.table = None
+        self.valid_coords = []
+        self.invalid_coords = []
+        self.coord_val_dict = CellValues(self.matrix)
+        self.class_val_dict = {}
+        self.rule_count = 0
+        self.refresh_timer = None
+        self.missing_class_rules = []
+        self.disk_layers = MatrixStack(0, CONSTRAINTS)
+        self.layer_conflicts = {constraint: set() for constraint in CONSTRAINTS}
+        self.section_digest = None
+        self.watcher = None
+        self.watch_timer = None
+        self.audit_cache = None
+        self.extent_cache = ExtentCache()
+
+        # The grid starts out empty and is filled once the board has been read
+        self.init_grid()
+
+        if background:
+            self.set_loading(True)
+            threading.Thread(target=self.load_in_background, daemon=True).start()
+        else:
+            self.loaded(self.connect())
+
+    def connect(self) -> str:
+        """Connect to KiCad and get the board, its project and the net classes. Only IPC
+        and file reads are done here so that it can run off the main thread, and kipy
+        is imported here as it takes a good part of the start up time. The net classes
+        come from the project file, or its cache, unless only KiCad can provide them.
+        The stand-in of nccm_fake is used instead of kipy when NCCM_FAKE_KICAD is set.
+
+        :return: Message explaining why KiCad could not be used, or an empty string.
+        """
+        with phase("kipy_connect"):
+            if os.environ.get(FAKE_KICAD_ENV):
+                try:
+                    import nccm_fake as kipy
+                    from nccm_fake import errors
+                except ImportError:
+                    return f"{FAKE_KICAD_ENV} is set but the KiCad stand-in is not installed."
+            else:
+                import kipy
+                from kipy import errors
+
+            try:
+                self.kicad = kipy.KiCad()
+                self.board = self.kicad.get_board()
+            except errors.ConnectionError:
+                return "Please open KiCad before using the NCCM plugin."
+            except errors.ApiError:
+                return "Unable to connect to a board file.\nPlease make sure one is open."
+            except NccmError as err:
+                # Raised by the stand-in for a project it cannot find
+                return f"Unable to open the board.\n{err}"
 
+        self.project = self.board.get_project()
+        nccm_profile.set_report_dir(self.project.path)
+
+        pro_path = os.path.join(self.project.path, self.project.name + ".kicad_pro")
         try:
-            self.board = self.kicad.get_board()
-        except errors.ConnectionError:
-            self.show_dialog("Please open KiCad before using the NCCM plugin.")
-            wx.Exit()
-        except errors.ApiError:
-            self.show_dialog(
-                "Unable to connect to a board file.\nPlease make sure one is open."
-            )
+            with phase("get_net_classes"):
+                self.net_classes = get_net_classes(
+                    pro_path, [ProjectFileProvider(), KiCadProvider(self.project)]
+                )
+        except NccmError as err:
+            return f"Unable to get the net classes.\n{err}"
+
+        return ""
+
+    def load_in_background(self):
+        """Connect to KiCad on a worker thread and hand the result to the main thread."""
+        wx.CallAfter(self.loaded, self.connect())
+
+    @profiled
+    def loaded(self, error: str):
+        """Fill the dialog with the board read by connect.
+
+        :param error: Message returned by connect.
+        """
+        # The dialog may have been closed while the board was being read
+        if not self:
+            return
+
+        if error:
+            self.show_dialog(error)
             wx.Exit()
+            return
 
-        self.project = self.board.get_project()
-        self.net_classes = self.project.get_net_classes()
         self.class_count = len(self.net_classes)
-        self.valid_coords = []
-        self.invalid_coords = []
-        self.coord_val_dict = {}
-        self.class_val_dict = {}
-        self.rule_strings = []
+        self.layers = MatrixStack(self.class_count, CONSTRAINTS)
+        self.matrix = self.layers.layer(self.constraint)
+        self.coord_val_dict = CellValues(self.matrix)
+        self.baselines = pair_baselines(get_class_clearances(self.net_classes))
 
         self.generate_coords("top")
-        self.init_grid()
+        class_names = [net_class.name for net_class in self.net_classes]
+        self.table.reset(self.matrix, class_names, self.get_layer_baselines())
+        self.size_grid()
+        self.disk_layers = MatrixStack(self.class_count, CONSTRAINTS)
         self.get_existing_data()
+        self.set_loading(False)
         self.refresh_sizes()
+        self.start_watching()
 
+    def set_loading(self, loading: bool):
+        """Show or clear the loading state, in which nothing can be written.
+
+        :param loading: True while the board is being read.
+        """
+        title = self.GetTitle().removesuffix(LOADING_TITLE_SUFFIX)
+        self.SetTitle(title + LOADING_TITLE_SUFFIX if loading else title)
+
+        for control in (
+            self.btnUpdateCR,
+            self.btnRemoveFromCR,
+            self.chkCompact,
+            self.btnAudit,
+            self.choiceConstraint,
+        ):
+            control.Enable(not loading)
+
+    @profiled
     def get_existing_data(self) -> int:
         """Get data from the existing project kicad_dru file.
 
@@ -95,39 +260,34 @@ class NetClassClearanceMatrix(NetClassClearanceMatrixDialog):
         """
         dru_file = self.project.name + ".kicad_dru"
 
-        if dru_file in os.listdir(self.project.path):
-            # Open the file to read its contents
-            f_read = open(os.path.join(self.project.path, dru_file), "r")
-            file_contents = f_read.readlines()
-            f_read.close()
+        if dru_file not in os.listdir(self.project.path):
+            return 1
 
-            # Extract the NCCM section
-            section_lines = get_or_remove_section(file_contents, "get")
-        else:
+        # Add matrix data to the grid, which only redraws once the batch ends. An
+        # unchanged section is loaded from its store without parsing the rules.
+        self.gridNCCM.BeginBatch()
+        try:
+            loaded = load_matrix(
+                os.path.join(self.project.path, dru_file), self.layers, self.table.class_names
+            )
+        except (DruSyntaxError, OSError) as err:
+            self.show_dialog(f"Unable to read the custom rules file.\n{err}")
             return 1
+        finally:
+            self.gridNCCM.EndBatch()
 
         # If no section is found then just return
-        if not section_lines:
+        if loaded is None:
             return 1
 
-        self.class_val_dict = get_class_val_dict_from_section(section_lines)
-
-        # regex to get the number from the string
-        reg_float = re.compile(r"^\d+[.,]?\d*")
-
-        # Add matrix data to the grid
-        for c in range(self.class_count):
-            col = self.gridNCCM.GetColLabelValue(c)
-            for r in range(self.class_count):
-                row = self.gridNCCM.GetRowLabelValue(r)
-                for val, _ in self.class_val_dict.items():
-                    if val == (col, row):
-                        value_float = reg_float.findall(self.class_val_dict[(col, row)])
-                        self.gridNCCM.SetCellValue(
-                            (c, r), value_float[0] + " mm"
-                        )
-
+        self.class_val_dict = loaded.class_val_dict
+        self.missing_class_rules = loaded.missing
+        self.chkCompact.SetValue(loaded.compact)
+        self.disk_layers = self.layers.copy()
+        self.section_digest = loaded.digest
 
+        if self.missing_class_rules:
+            self.show_dialog(missing_class_message(self.missing_class_rules))
 
         self.refresh_sizes()
 
@@ -138,113 +298,341 @@ class NetClassClearanceMatrix(NetClassClearanceMatrixDialog):
 
         :param use_top_bot: Use the top or bottom diagonal table section for the valid coords.
         """
+        self.valid_coords, self.invalid_coords = generate_coords(self.class_count, use_top_bot)
 
-        # Get all the coords
-        coords_list = list()
-        for col in range(self.class_count):
-            for row in range(self.class_count):
-                coords_list.append((row, col))
-
-        # Use the section from the top of the diagonal or the bottom
-        if use_top_bot == "top":
-            # Get the valid coords that will have data
-            for col in range(self.class_count):
-                for row in range(self.class_count):
-                    self.valid_coords.append((row, col))
-                    if row == col:
-                        break
-        elif use_top_bot == "bot":
-            for row in range(self.class_count):
-                for col in range(self.class_count):
-                    self.valid_coords.append((row, col))
-                    if row == col:
-                        break
-
-        # Get the difference between the two lists to get the invalid coords
-        self.invalid_coords = list(set(coords_list) ^ set(self.valid_coords))
+    def get_layer_baselines(self) -> PairBaselines:
+        """Get the values the pairs already get for the constraint type shown. Only the
+        clearance is given by the net classes, the other constraints start from nothing.
 
+        :return: Packed baselines of the pairs.
+        """
+        if self.constraint == CLEARANCE:
+            return self.baselines
+        return pair_baselines([0.0] * self.class_count)
+
+    def select_constraint(self, event: wx.CommandEvent):
+        """Show the layer of the constraint type chosen in the selector.
+
+        :param event: wxWidgets choice event.
+        """
+        self.show_layer(CONSTRAINTS[self.choiceConstraint.GetSelection()])
+
+    def show_layer(self, constraint: str):
+        """Show the layer of a constraint type in the grid. Edits, bulk edits and the
+        clipboard work on the layer shown, the audit only on the clearance.
+
+        :param constraint: Constraint type of the layer.
+        """
+        self.constraint = constraint
+        self.matrix = self.layers.layer(constraint)
+        self.coord_val_dict = CellValues(self.matrix)
+
+        self.table.matrix = self.matrix
+        self.table.baselines = self.get_layer_baselines()
+        self.table.conflicts = self.layer_conflicts[constraint]
+        if self.audit_cache is not None and constraint == CLEARANCE:
+            self.table.audit = self.audit_cache.audit
+        else:
+            self.table.audit = None
+        self.txtAudit.SetLabel("")
+        self.gridNCCM.ForceRefresh()
+
+    @profiled
     def check_cells(self, event: PyEventBinder):
-        """Check that all cells in the valid coordinates are the correct value.
+        """Refresh after cells have been edited. The table has already converted the
+        entered text into the matrix and coord_val_dict reads straight from it, so
+        there is nothing left to collect.
 
         :param event: wxWidgets PyEventBinder.
         """
-        for invalid_coord in self.invalid_coords:
-            self.gridNCCM.SetCellValue(invalid_coord, "-")
 
-        # Create a dict to relate the value to the coordinate
-        cell_value_dict = {key: float() for key in self.valid_coords}
+        # Refresh the table and window size so that new data is visible
+        self.schedule_refresh()
 
-        # regex to get the number from the string
-        reg_float = re.compile(r"^\d+[.,]?\d*")
+    def editor_created(self, event: wx.grid.GridEditorCreatedEvent):
+        """Check the value being typed against the audit of the board as it changes.
 
-        # Check all cells for valid numbers, store them, and add 'mm' at the end
-        for valid_coord in self.valid_coords:
-            cell_value_str = self.gridNCCM.GetCellValue(valid_coord)
+        :param event: wxWidgets grid editor created event.
+        """
+        event.GetControl().Bind(wx.EVT_TEXT, self.editor_text)
+        event.Skip()
 
-            cell_value_float = reg_float.findall(cell_value_str)
+    def editor_text(self, event: wx.CommandEvent):
+        """Show how many violations the value being typed in a cell would create.
 
-            # Get only the results with values
-            if cell_value_float and len(cell_value_float) == 1:
-                value_float = convert_to_float(cell_value_float[0])
-                cell_value_dict[valid_coord] = value_float
-                self.gridNCCM.SetCellValue(valid_coord, str(value_float) + " mm")
-            else:
-                self.gridNCCM.SetCellValue(valid_coord, "")
+        :param event: wxWidgets text event of the cell editor.
+        """
+        row = self.gridNCCM.GetGridCursorRow()
+        col = self.gridNCCM.GetGridCursorCol()
+        self.preview_value(row, col, event.GetString())
+        event.Skip()
+
+    def preview_value(self, row: int, col: int, text: str) -> Optional[int]:
+        """Count the pairs of board items of a class pair that would be closer than the
+        clearance a value gives it. Only the items of the two classes are measured, and
+        only when the value is further than they were measured before.
+
+        :param row: Row of the cell.
+        :param col: Column of the cell.
+        :param text: Value entered in the cell.
+        :return: Number of violations, None if the board has not been audited.
+        """
+        if self.constraint != CLEARANCE:
+            return None
+        if not self.check_audit() or not self.matrix.is_valid(row, col):
+            return None
+
+        clearance = max(parse_cell_value(text), self.baselines.get(row, col))
+        count = self.audit_cache.count_violations(row, col, clearance)
+        class_a, class_b = self.table.class_names[row], self.table.class_names[col]
+        self.txtAudit.SetLabel(
+            f"{class_a} / {class_b} at {format_mm(clearance)} mm: {count} violations"
+        )
+        self.Layout()
+        return count
+
+    def grid_key_down(self, event: wx.KeyEvent):
+        """Copy and paste blocks of cells with Ctrl+C and Ctrl+V.
+
+        :param event: wxWidgets key event.
+        """
+        if event.ControlDown() and event.GetKeyCode() == ord("C"):
+            self.copy_selection()
+        elif event.ControlDown() and event.GetKeyCode() == ord("V"):
+            self.paste_clipboard()
+        else:
+            event.Skip()
 
-        # Extract the non-zero values
-        self.coord_val_dict = {
-            key: val for key, val in cell_value_dict.items() if val != 0
-        }
+    def show_grid_menu(self, event: wx.grid.GridEvent):
+        """Show the menu of the bulk edits on a right clicked cell.
 
-        # Refresh the table and window size so that new data is visible
-        self.refresh_sizes()
+        :param event: wxWidgets grid event.
+        """
+        row = event.GetRow()
+        col = event.GetCol()
+        if not self.gridNCCM.IsInSelection(row, col):
+            self.gridNCCM.ClearSelection()
+            self.gridNCCM.SetGridCursor(row, col)
+
+        menu = wx.Menu()
+        items = [
+            ("Copy\tCtrl+C", lambda _: self.copy_selection()),
+            ("Paste\tCtrl+V", lambda _: self.paste_clipboard()),
+            (None, None),
+            ("Fill Selection...", lambda _: self.fill_selection()),
+            (f"Fill Row {self.table.class_names[row]}...", lambda _: self.fill_class(row)),
+            (f"Fill Column {self.table.class_names[col]}...", lambda _: self.fill_class(col)),
+        ]
+        for label, handler in items:
+            if label is None:
+                menu.AppendSeparator()
+                continue
+            item = menu.Append(wx.ID_ANY, label)
+            menu.Bind(wx.EVT_MENU, handler, item)
+
+        self.PopupMenu(menu)
+        menu.Destroy()
+
+    def get_selection_bounds(self) -> tuple[int, int, int, int]:
+        """Get the block around the selected cells, or the cursor cell if none are.
+
+        :return: Top row, left column, bottom row and right column.
+        """
+        blocks = list(self.gridNCCM.GetSelectedBlocks())
+        if not blocks:
+            row = max(self.gridNCCM.GetGridCursorRow(), 0)
+            col = max(self.gridNCCM.GetGridCursorCol(), 0)
+            return row, col, row, col
+
+        return (
+            min(block.GetTopRow() for block in blocks),
+            min(block.GetLeftCol() for block in blocks),
+            max(block.GetBottomRow() for block in blocks),
+            max(block.GetRightCol() for block in blocks),
+        )
+
+    def get_selected_cells(self) -> set[tuple[int, int]]:
+        """Get the valid cells of the class pairs selected, or of the cursor cell if no
+        cells are selected.
+
+        :return: Valid cells.
+        """
+        cells = set()
+        for block in self.gridNCCM.GetSelectedBlocks():
+            cells |= get_block_cells(
+                self.class_count,
+                block.GetTopRow(),
+                block.GetLeftCol(),
+                block.GetBottomRow(),
+                block.GetRightCol(),
+            )
+        if not cells:
+            cells = get_block_cells(self.class_count, *self.get_selection_bounds())
 
-    def init_grid(self):
-        """Initialise the grid by adding class names, refreshing size, setting default
-        column header size, and setting the invalid coords to have the dash and colouring."""
+        return cells
 
-        # Adds the class names to the grid
-        for pos, net_class in enumerate(self.net_classes):
-            self.gridNCCM.AppendRows(1, True)
-            self.gridNCCM.SetRowLabelValue(pos, net_class.name)
-            self.gridNCCM.AppendCols(1, True)
-            self.gridNCCM.SetColLabelValue(pos, net_class.name)
+    def apply_bulk_edit(self, edit) -> int:
+        """Apply an edit of many cells to the matrix in one batch, redrawing and
+        relayouting the grid once at the end.
 
-        # Set the column headers to be the same size as other cells
-        self.gridNCCM.SetColLabelSize(self.gridNCCM.GetRowSize(0))
-
-        # Set the default column width
-        for col in range(self.class_count):
-            self.gridNCCM.SetColSize(col, COL_WIDTH)
-            if len(self.gridNCCM.GetColLabelValue(col)) > MAX_CHAR_COL_LABEL:
-                self.gridNCCM.AutoSizeColumn(col)
-
-        self.auto_size_row_labels_width()
-
-        # Set the invalid coords to have dashes
-        for invalid_coord in self.invalid_coords:
-            self.gridNCCM.SetCellValue(invalid_coord, "-")
-            self.gridNCCM.SetCellBackgroundColour(
-                invalid_coord[0],
-                invalid_coord[1],
-                wx.SystemSettings.GetColour(wx.SYS_COLOUR_SCROLLBAR),
-            )
+        :param edit: Function making the edit and returning the number of cells written.
+        :return: Number of cells written.
+        """
+        self.gridNCCM.BeginBatch()
+        try:
+            count = edit()
+        finally:
+            self.gridNCCM.EndBatch()
+
+        self.schedule_refresh()
+        return count
+
+    def ask_fill_value(self) -> Optional[float]:
+        """Ask for the clearance to fill cells with.
+
+        :return: The clearance, None if cancelled.
+        """
+        dialog = wx.TextEntryDialog(self, "Clearance (mm):", "Fill", "")
+        try:
+            if dialog.ShowModal() != wx.ID_OK:
+                return None
+            return parse_cell_value(dialog.GetValue())
+        finally:
+            dialog.Destroy()
+
+    def copy_selection(self):
+        """Copy the selected block to the clipboard as tab separated text."""
+        if self.class_count == 0:
+            return
+
+        text = copy_cells(self.matrix, *self.get_selection_bounds())
+        if wx.TheClipboard.Open():
+            wx.TheClipboard.SetData(wx.TextDataObject(text))
+            wx.TheClipboard.Close()
+
+    @profiled
+    def paste_clipboard(self):
+        """Paste tab separated text from the clipboard, such as cells copied from a
+        spreadsheet, with its first cell at the top left of the selection."""
+        if self.class_count == 0 or not wx.TheClipboard.Open():
+            return
+
+        data = wx.TextDataObject()
+        try:
+            has_text = wx.TheClipboard.GetData(data)
+        finally:
+            wx.TheClipboard.Close()
+
+        if has_text:
+            self.paste_text(data.GetText())
 
-    def auto_size_row_labels_width(self):
-        """Adjust row label width to fit the longest label."""
-        dc = wx.ClientDC(self.gridNCCM)
-        dc.SetFont(self.gridNCCM.GetLabelFont())
+    def paste_text(self, text: str) -> int:
+        """Paste tab separated text with its first cell at the top left of the selection.
 
-        max_width = 0
-        for row in range(self.gridNCCM.GetNumberRows()):
-            label = self.gridNCCM.GetRowLabelValue(row)
-            width, _ = dc.GetTextExtent(label)
-            max_width = max(max_width, width)
+        :param text: Tab separated text.
+        :return: Number of cells written.
+        """
+        top, left, _, _ = self.get_selection_bounds()
+        rows = parse_tsv(text)
+
+        return self.apply_bulk_edit(lambda: paste_cells(self.matrix, top, left, rows))
+
+    @profiled
+    def fill_selection(self, value: Optional[float] = None) -> int:
+        """Set every selected class pair to the same clearance.
+
+        :param value: Clearance to set, asked for if not given.
+        :return: Number of cells written.
+        """
+        if value is None:
+            value = self.ask_fill_value()
+        if value is None or self.class_count == 0:
+            return 0
+
+        cells = self.get_selected_cells()
+        return self.apply_bulk_edit(lambda: fill_cells(self.matrix, cells, value))
+
+    @profiled
+    def fill_class(self, index: int, value: Optional[float] = None) -> int:
+        """Set every pair of one class, its whole row and column, to the same clearance.
+
+        :param index: Row/column of the class.
+        :param value: Clearance to set, asked for if not given.
+        :return: Number of cells written.
+        """
+        if value is None:
+            value = self.ask_fill_value()
+        if value is None:
+            return 0
+
+        cells = get_class_cells(self.class_count, index)
+        return self.apply_bulk_edit(lambda: fill_cells(self.matrix, cells, value))
 
-        # Add padding (e.g., 10 pixels)
-        self.gridNCCM.SetRowLabelSize(max_width + 10)
+    @profiled
+    def init_grid(self):
+        """Initialise the grid by attaching the virtual table and setting the default
+        column header size. The invalid coords get their dash and colouring from
+        the table itself."""
+
+        # The table serves the class names and cell values straight from the matrix
+        class_names = [net_class.name for net_class in self.net_classes]
+        self.table = ClearanceTable(self.matrix, class_names, self.baselines)
+        self.table.conflicts = self.layer_conflicts[self.constraint]
+        self.gridNCCM.SetTable(self.table, True)
+
+        # Set the column headers to be the same size as other cells
+        self.gridNCCM.SetColLabelSize(self.gridNCCM.GetDefaultRowSize())
+
+    @profiled
+    def size_grid(self):
+        """Size the columns and labels to the net class names. The names are measured
+        through the extent cache, and the sizes are applied in one batch with every
+        column given the same width."""
+        grid = self.gridNCCM
+        font = grid.GetLabelFont()
+        font_key = f"{font.GetNativeFontInfoDesc()}@{grid.GetContentScaleFactor()}"
+        dc = None
+
+        def get_extent(text: str) -> tuple[int, int]:
+            # Only texts missing from the cache need a device context to be measured
+            nonlocal dc
+            if dc is None:
+                dc = wx.ClientDC(grid)
+                dc.SetFont(font)
+            return dc.GetTextExtent(text)
+
+        layout = get_grid_layout(
+            self.table.class_names,
+            lambda texts: self.extent_cache.measure(font_key, texts, get_extent),
+            COL_WIDTH,
+            MAX_CHAR_COL_LABEL,
+            grid.GetDefaultRowSize(),
+        )
+        self.table.col_labels = layout.col_labels
+
+        grid.BeginBatch()
+        grid.SetColLabelTextOrientation(wx.VERTICAL if layout.vertical else wx.HORIZONTAL)
+        grid.SetDefaultColSize(layout.col_width, True)
+        grid.SetColLabelSize(layout.col_label_height)
+        grid.SetRowLabelSize(layout.row_label_width)
+        grid.EndBatch()
+
+
+    def schedule_refresh(self):
+        """Request a refresh_sizes call. Requests arriving within REFRESH_DELAY_MS of
+        each other are coalesced so that a burst of edits only relayouts once."""
+        if self.refresh_timer is not None and self.refresh_timer.IsRunning():
+            self.refresh_timer.Restart(REFRESH_DELAY_MS)
+        else:
+            self.refresh_timer = wx.CallLater(REFRESH_DELAY_MS, self.delayed_refresh)
 
+    def delayed_refresh(self):
+        """Run the refresh requested by schedule_refresh, unless the window is gone."""
+        self.refresh_timer = None
+        if self:
+            self.refresh_sizes()
 
+    @profiled
     def refresh_sizes(self):
         """Refresh the window when new data is added to the matrix"""
 
@@ -262,99 +650,245 @@ class NetClassClearanceMatrix(NetClassClearanceMatrixDialog):
 
         :param event: wxWidgets PyEventBinder.
         """
+        self.stop_watching()
+        nccm_profile.stop()
         wx.Exit()
 
-    def update_custom_rules(self, event: PyEventBinder):
-        """Update the custom rules file.
-
-        :param event: wxWidgets PyEventBinder.
+    def start_watching(self):
+        """Start polling the custom rules file for changes made outside of the plugin."""
+        dru_path = os.path.join(self.project.path, self.project.name + ".kicad_dru")
+        self.watcher = get_watcher(dru_path)
+
+        self.watch_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.check_file, self.watch_timer)
+        self.watch_timer.Start(WATCH_INTERVAL_MS)
+
+    def stop_watching(self):
+        """Stop polling the custom rules file."""
+        if self.watch_timer is not None:
+            self.watch_timer.Stop()
+            self.watch_timer = None
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+
+    def check_file(self, event: wx.TimerEvent):
+        """Merge the custom rules file into the grid if it changed since the last poll, and
+        drop the audit if the board has been saved since.
+
+        :param event: wxWidgets timer event.
         """
-        dru_file = self.project.name + ".kicad_dru"
-        file_created = False
+        self.sync_file()
+        self.check_audit()
 
-        # Check if it exists and if it doesn't create it and add the necessary version string
-        # If it does exist then remove the previously inserted section
-        if dru_file in os.listdir(self.project.path):
-            # Open the file to read its contents
-            f_read = open(os.path.join(self.project.path, dru_file), "r")
-            file_contents = f_read.readlines()
-            f_read.close()
+    def get_board_revision(self) -> Optional[tuple[int, int]]:
+        """Get the revision of the board. The KiCad API has no revision of the open board,
+        so the board file is used and changes count once they are saved.
 
-            # Open the file and write to it its old contents minus the NCCM section
-            f_write = open(os.path.join(self.project.path, dru_file), "w")
+        :return: Modification time and size of the board file, None if it is missing.
+        """
+        return get_file_key(os.path.join(self.project.path, os.path.basename(self.board.name)))
 
-            # First check if the version string is there
-            found_version = False
-            for line in file_contents:
-                if "(version 1)" in line.strip():
-                    found_version = True
-                    break
+    def check_audit(self) -> bool:
+        """Drop the audit if it was made on an earlier revision of the board.
 
-            if not found_version:
-                f_write.write("(version 1)\n")
+        :return: True if there is an audit of the current revision.
+        """
+        if self.audit_cache is None:
+            return False
+        if self.audit_cache.is_current(self.get_board_revision()):
+            return True
+
+        self.audit_cache = None
+        self.table.audit = None
+        self.txtAudit.SetLabel("The board changed, audit it again.")
+        self.gridNCCM.ForceRefresh()
+        return False
 
-            file_contents = get_or_remove_section(file_contents, "remove")
+    @profiled
+    def sync_file(self) -> int:
+        """Merge the changes made to the NCCM section outside of the plugin into the grid.
+        Cells left alone in the grid take the new values, cells that were changed in both
+        places keep the value of the grid and are highlighted as conflicts.
+
+        :return: Number of new conflicts.
+        """
+        if self.watcher is None or not self.watcher.changed():
+            return 0
 
-            for line in file_contents:
-                f_write.write(line)
+        dru_path = os.path.join(self.project.path, self.project.name + ".kicad_dru")
+        try:
+            section = read_section_matrix(
+                dru_path, self.table.class_names, self.section_digest
+            )
+        except (DruSyntaxError, OSError):
+            # The file may be half written, it is read again on its next change
+            return 0
+        if section is None:
+            return 0
+
+        updated_count = 0
+        conflict_count = 0
+        for constraint in self.layers.constraints:
+            matrix = self.layers.layer(constraint)
+            disk = section.layers.layer(constraint)
+            updated, conflicts = merge_cells(matrix, self.disk_layers.layer(constraint), disk)
+
+            # Cells that now agree with the file are no longer in conflict
+            self.layer_conflicts[constraint] = {
+                cell
+                for cell in self.layer_conflicts[constraint]
+                if matrix.get(*cell) != disk.get(*cell)
+            }
+            self.layer_conflicts[constraint].update(conflicts)
+            updated_count += len(updated)
+            conflict_count += len(conflicts)
+
+        self.disk_layers = section.layers
+        self.section_digest = section.digest
+        self.table.conflicts = self.layer_conflicts[self.constraint]
+
+        if updated_count or conflict_count:
+            self.schedule_refresh()
+
+        return conflict_count
+
+    @profiled
+    def audit_board(self, event: PyEventBinder):
+        """Measure the clearances the copper on the board already achieves between the
+        class pairs, and shade the cells of the pairs that are closer than their clearance.
 
-            f_write.close()
+        :param event: wxWidgets PyEventBinder.
+        """
+        if os.environ.get(FAKE_KICAD_ENV):
+            from nccm_fake import errors, is_copper_layer
         else:
-            file_created = True
-            f_write = open(os.path.join(self.project.path, dru_file), "w")
-            f_write.write("(version 1)\n")
-            f_write.close()
+            from kipy import errors
+            from kipy.util.board_layer import is_copper_layer
 
-        # Write custom rules to file
-        f_write = open(os.path.join(self.project.path, dru_file), "a")
-        self.rule_strings = self.get_rule_strings()
+        # Only the copper within the largest clearance of the matrix needs measuring
+        clearances = self.layers.layer(CLEARANCE)
+        reach = get_reach(clearances, self.baselines)
+        revision = self.get_board_revision()
+        try:
+            with wx.BusyCursor():
+                items = read_board_copper(self.board, self.table.class_names, is_copper_layer)
+                self.audit_cache = AuditCache(items, self.class_count, revision, reach)
+        except (errors.ConnectionError, errors.ApiError) as err:
+            self.show_dialog(f"Unable to read the board.\n{err}")
+            return
+        if self.constraint == CLEARANCE:
+            self.table.audit = self.audit_cache.audit
+        self.txtAudit.SetLabel("")
+        self.gridNCCM.ForceRefresh()
 
-        f_write.write(SECTION_START_STR)
+        violations = list(self.audit_cache.audit.iter_violations(clearances, self.baselines))
+        if violations:
+            message = (
+                f"{len(violations)} class pairs are already closer on the board than their"
+                " clearance and are shaded by how much."
+            )
+        else:
+            message = "No class pair is closer on the board than its clearance."
+        self.show_dialog(f"{message}\n{len(items)} copper items were checked.")
 
-        for rule in self.rule_strings:
-            f_write.write(rule)
+    @profiled
+    def update_custom_rules(self, event: PyEventBinder):
+        """Update the custom rules file.
 
-        f_write.write(SECTION_END_STR)
-        f_write.close()
+        :param event: wxWidgets PyEventBinder.
+        """
+        dru_path = os.path.join(self.project.path, self.project.name + ".kicad_dru")
 
-        if file_created:
+        # Changes made to the file since the last poll are merged before writing over it
+        conflict_count = self.sync_file()
+        if conflict_count:
             self.show_dialog(
-                "No custom rules file (.kicad_dru) was found,\ntherefore one was created."
+                f"{conflict_count} cells were also changed in the custom rules file and"
+                " are highlighted.\nClick Update Custom Rules again to keep the values"
+                " in the grid."
             )
+            return
+
+        # The rules are streamed to the file and only the ones that changed are rewritten
+        try:
+            status, changes = update_rules(dru_path, self.iter_rule_strings())
+        except DruSyntaxError as err:
+            self.show_dialog(f"Unable to read the custom rules file.\n{err}")
+            return
+        except OSError as err:
+            self.show_dialog(f"Unable to write the custom rules file.\n{err}")
+            return
+        self.rule_count = changes.rule_count
+
+        # Keep the store in step with the section so that the next load skips parsing it,
+        # and remember what was written so that the watcher does not merge it back
+        if status != UNCHANGED:
+            store = save_matrix(
+                dru_path,
+                self.table.class_names,
+                self.iter_effective_cells(),
+                self.chkCompact.GetValue(),
+            )
+            if store is not None:
+                self.disk_layers = MatrixStack.from_values(
+                    self.class_count, store.constraints, store.values
+                )
+                self.section_digest = store.digest
+        for conflicts in self.layer_conflicts.values():
+            conflicts.clear()
+        self.gridNCCM.ForceRefresh()
+
+        if status == CREATED:
+            message = "No custom rules file (.kicad_dru) was found,\ntherefore one was created."
+        elif status == UNCHANGED:
+            message = "Custom rules are already up to date."
         else:
-            self.show_dialog("Updated custom rules.")
+            message = f"Updated custom rules: {changes.summary()}."
+
+        # Report the pairs left to the net classes and how many rules the grouping saved
+        pair_count = sum(1 for _ in self.iter_effective_cells())
+        skipped_count = self.layers.count_nonzero() - pair_count
+        if skipped_count:
+            message += (
+                f"\n{skipped_count} class pairs at or below their net class"
+                " clearance were skipped."
+            )
+        if self.chkCompact.GetValue():
+            message += f"\n{pair_count} class pairs written as {self.rule_count} rules."
+
+        self.show_dialog(message)
 
+    @profiled
     def remove_from_custom_rules(self, event: PyEventBinder):
         """Remove the NCCM entry from the custom rules file,
         and also empty the table.
 
         :param event: wxWidgets PyEventBinder.
         """
-        dru_file = self.project.name + ".kicad_dru"
+        dru_path = os.path.join(self.project.path, self.project.name + ".kicad_dru")
 
         # If the file doesn't exist simply return from the function.
-        if dru_file in os.listdir(self.project.path):
-            # Open the file to read its contents
-            f_read = open(os.path.join(self.project.path, dru_file), "r")
-            file_contents = f_read.readlines()
-            f_read.close()
-
-            # Open the file and write to it its old contents minus the NCCM section
-            f_write = open(os.path.join(self.project.path, dru_file), "w")
-
-            file_contents = get_or_remove_section(file_contents, "remove")
-
-            for line in file_contents:
-                f_write.write(line)
-
-            f_write.close()
-        else:
+        if not os.path.isfile(dru_path):
             self.show_dialog("No custom rules file detected.")
             return
 
+        try:
+            remove_section_from_file(dru_path)
+        except DruSyntaxError as err:
+            self.show_dialog(f"Unable to read the custom rules file.\n{err}")
+            return
+        except OSError as err:
+            self.show_dialog(f"Unable to write the custom rules file.\n{err}")
+            return
+
         # Empty the table
-        for valid_coord in self.valid_coords:
-            self.gridNCCM.SetCellValue(valid_coord, "")
+        self.layers.clear()
+        self.disk_layers = MatrixStack(self.class_count, CONSTRAINTS)
+        self.section_digest = None
+        for conflicts in self.layer_conflicts.values():
+            conflicts.clear()
+        self.gridNCCM.ForceRefresh()
 
         self.show_dialog("Removed NCCM entry from the custom rules file.")
 
@@ -366,21 +900,25 @@ class NetClassClearanceMatrix(NetClassClearanceMatrixDialog):
         info = Info(text)
         info.ShowModal()
 
-    def get_rule_strings(self) -> list[str]:
-        """Get the rule strings based on the table data.
+    def iter_rule_strings(self) -> Iterator[str]:
+        """Generate the rule strings based on the table data, one rule per pair holding
+        the constraints of every layer. A clearance not above the one the pair gets from
+        its net classes would not change anything, so it is left out.
 
-        :return: List of rule strings.
+        :return: Iterator of rule strings.
         """
-        rule_strings = []
-        for key, val in self.coord_val_dict.items():
-            col_class = self.gridNCCM.GetColLabelValue(key[0])
-            row_class = self.gridNCCM.GetRowLabelValue(key[1])
+        return iter_rule_strings(
+            self.table.class_names,
+            self.iter_effective_cells(),
+            self.chkCompact.GetValue(),
+        )
 
-            # Create the rule and add it to a list containing all the necessary rules
-            rule_string = f"\n(rule \"CLR_{col_class}_to_{row_class}\"\n  (severity error)\n  (condition \"A.NetClass == '{col_class}' && B.NetClass == '{row_class}'\")\n  (constraint clearance (min {val}mm))\n)\n"
-            rule_strings.append(rule_string)
+    def iter_effective_cells(self) -> Iterator[tuple[tuple[int, int], tuple]]:
+        """Generate the cells with a constraint worth writing in any layer.
 
-        return rule_strings
+        :return: Iterator of ((row, col), ((constraint, value), ...)) pairs.
+        """
+        return iter_effective_layer_cells(self.layers.nonzero(), self.baselines)
 
 
 class Info(InfoDialog):
@@ -398,91 +936,208 @@ class Info(InfoDialog):
         self.Destroy()
 
 
-def get_or_remove_section(file_contents: list[str], mode: str) -> list[str]:
-    """Get the NCCM section or get the file contents without the section.
-
-    :param file_contents: Read file contents.
-    :param mode: Specify between "get" or "remove".
-    :return: File or section contents.
-    """
-    check = True
-    if mode == "get":
-        check = True
-    elif mode == "remove":
-        check = False
-
-    found_section = False
-    content_lines = []
-    for line in file_contents:
-        if line.find(SECTION_START_STR.strip("\n")) != -1:
-            found_section = True
-        if line.find(SECTION_END_STR.strip("\n")) != -1:
-            found_section = False
-            continue
-        if found_section is check:
-            content_lines.append(line)
-
-    return content_lines
-
-
-def get_class_val_dict_from_section(section_lines: list[str]) -> dict[tuple, str]:
-    """Get the class_val_dict from the NCCM section
-
-    :param section_lines: Lines of the NCCM section.
-    :return: A dict with the classes and their corresponding value as key-value pairs.
+class ClearanceTable(wx.grid.GridTableBase):
+    """Virtual grid table that reads and writes the cells of a ClearanceMatrix.
+
+    The grid only asks for the cells it is drawing, so opening and scrolling the
+    dialog does not depend on the total number of cells. Cells outside of the
+    upper triangle are not stored, they are given a dash and a read-only
+    attribute whenever the grid asks for them.
+
+    Cells at or below the clearance the pair already gets from its net classes are
+    greyed out, and the inherited clearance is shown in them while they are empty.
+
+    :param matrix: Matrix holding the clearance values.
+    :param class_names: Net class names, used for the row labels.
+    :param col_labels: Column labels, the class names shortened once the grid is sized.
+    :param baselines: Packed clearances each pair already gets from its net classes.
+    :param invalid_attr: Attribute shared by all the invalid cells.
+    :param inherited_attr: Attribute shared by all the cells using the inherited clearance.
+    :param conflict_attr: Attribute of the cells also changed in the custom rules file.
+    :param conflicts: Cells also changed in the custom rules file since they were edited.
+    :param heat_attrs: Attributes of the cells closer on the board than their clearance,
+        by the level of HEAT_COLOURS and whether the cell uses the inherited clearance.
+    :param audit: Clearances last measured on the board, None before the board is audited.
     """
-    classes = ()
-    clearance = ""
-    rule_name_found = False
-    clearance_found = False
-    matrix_data_dict = {}
-
-    # Populate the data dict
-    for line in section_lines:
-        if line.find(START_OF_RULE_NAME) != -1:
-            classes = tuple(
-                line[len(START_OF_RULE_NAME) + 1 : len(line) - 2].split("_to_")
-            )
-            rule_name_found = True
-        if line.find(START_OF_CLEARANCE) != -1:
-            clearance = line[len(START_OF_CLEARANCE) : len(line) - 3]
-            clearance_found = True
-        if rule_name_found and clearance_found:
-            matrix_data_dict[classes] = clearance
-            rule_name_found = False
-            clearance_found = False
 
-    return matrix_data_dict
+    def __init__(
+        self, matrix: ClearanceMatrix, class_names: list[str], baselines: PairBaselines
+    ):
+        super(ClearanceTable, self).__init__()
+        self.matrix = matrix
+        self.class_names = class_names
+        self.col_labels = class_names
+        self.baselines = baselines
+
+        self.invalid_attr = wx.grid.GridCellAttr()
+        self.invalid_attr.SetBackgroundColour(
+            wx.SystemSettings.GetColour(wx.SYS_COLOUR_SCROLLBAR)
+        )
+        self.invalid_attr.SetReadOnly(True)
+
+        self.inherited_attr = wx.grid.GridCellAttr()
+        self.inherited_attr.SetTextColour(
+            wx.SystemSettings.GetColour(wx.SYS_COLOUR_GRAYTEXT)
+        )
+        self.inherited_attr.SetRenderer(InheritedValueRenderer(self))
+
+        self.conflict_attr = wx.grid.GridCellAttr()
+        self.conflict_attr.SetBackgroundColour(CONFLICT_COLOUR)
+        self.conflicts = set()
+
+        self.heat_attrs = {}
+        for level, colour in enumerate(HEAT_COLOURS):
+            for inherited in (False, True):
+                attr = self.inherited_attr.Clone() if inherited else wx.grid.GridCellAttr()
+                attr.SetBackgroundColour(colour)
+                self.heat_attrs[level, inherited] = attr
+        self.audit = None
+
+    def reset(
+        self, matrix: ClearanceMatrix, class_names: list[str], baselines: PairBaselines
+    ):
+        """Serve another matrix, telling the grid how many rows and columns came or went.
+
+        :param matrix: Matrix holding the clearance values.
+        :param class_names: Net class names, used for the row labels.
+        :param baselines: Packed clearances each pair already gets from its net classes.
+        """
+        old_size = self.matrix.size
+        self.matrix = matrix
+        self.class_names = class_names
+        self.col_labels = class_names
+        self.baselines = baselines
+        self.audit = None
+
+        grid = self.GetView()
+        if grid is None or matrix.size == old_size:
+            return
 
+        grid.BeginBatch()
+        for deleted, appended in (
+            (wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED),
+            (wx.grid.GRIDTABLE_NOTIFY_COLS_DELETED, wx.grid.GRIDTABLE_NOTIFY_COLS_APPENDED),
+        ):
+            if matrix.size < old_size:
+                message = wx.grid.GridTableMessage(
+                    self, deleted, matrix.size, old_size - matrix.size
+                )
+            else:
+                message = wx.grid.GridTableMessage(self, appended, matrix.size - old_size)
+            grid.ProcessTableMessage(message)
+        grid.EndBatch()
+
+    def GetNumberRows(self) -> int:
+        return self.matrix.size
+
+    def GetNumberCols(self) -> int:
+        return self.matrix.size
+
+    def GetRowLabelValue(self, row: int) -> str:
+        return self.class_names[row]
+
+    def GetColLabelValue(self, col: int) -> str:
+        return self.col_labels[col]
+
+    def IsEmptyCell(self, row: int, col: int) -> bool:
+        return self.GetValue(row, col) == ""
+
+    def GetValue(self, row: int, col: int) -> str:
+        if not self.matrix.is_valid(row, col):
+            return "-"
+
+        value = self.matrix.get(row, col)
+        if value == 0:
+            return ""
+
+        return format_mm(value) + " mm"
+
+    def SetValue(self, row: int, col: int, value: str):
+        # The invalid cells are read-only but can still be reached programmatically
+        if self.matrix.is_valid(row, col):
+            self.matrix.set(row, col, parse_cell_value(value))
+            self.conflicts.discard((row, col))
+
+    def GetAttr(self, row: int, col: int, kind: int) -> wx.grid.GridCellAttr:
+        if (row, col) in self.conflicts:
+            attr = self.conflict_attr
+        elif self.matrix.is_valid(row, col):
+            baseline = self.get_baseline(row, col)
+            inherited = baseline != 0 and self.matrix.get(row, col) <= baseline
+            level = self.get_heat_level(row, col)
+            if level is not None:
+                attr = self.heat_attrs[level, inherited]
+            elif inherited:
+                attr = self.inherited_attr
+            else:
+                return None
+        else:
+            attr = self.invalid_attr
 
-def convert_to_float(val: str) -> float:
-    """Convert a string value to a float with an amount of decimal points
-    determined by the constant DP. Also check it is withing MIN and MAX.
+        # The grid releases a reference to the attribute once it is done with it
+        attr.IncRef()
+        return attr
 
-    :param val: String value to convert to float.
-    :return: Float value.
-    """
-    try:
-        val_float = float(val)
-    except ValueError:
-        val_float = float(MIN)
+    def get_baseline(self, row: int, col: int) -> float:
+        """Get the clearance a valid cell already gets from its net classes.
 
-    if val_float < MIN:
-        val_float = MIN
+        :param row: Row of the cell.
+        :param col: Column of the cell.
+        :return: Inherited clearance in mm.
+        """
+        return self.baselines.get(row, col)
 
-    if val_float > MAX:
-        val_float = MAX
+    def get_heat_level(self, row: int, col: int) -> Optional[int]:
+        """Get how much closer on the board a valid cell is than its clearance, which is
+        worked out as it is drawn so that the shading follows the values as they are edited.
 
-    # Truncate by converting to string and then back to float
-    val_str_list = str(val_float).split(".")
-    val_str_list[1] = val_str_list[1][0:DP]
-    val_str = ".".join(val_str_list)
+        :param row: Row of the cell.
+        :param col: Column of the cell.
+        :return: Level of HEAT_COLOURS, None if the cell is not violated or not audited.
+        """
+        if self.audit is None:
+            return None
+
+        achieved = self.audit.get(row, col)
+        required = max(self.matrix.get(row, col), self.get_baseline(row, col))
+        if achieved >= required:
+            return None
+
+        return min(int((1 - achieved / required) * len(HEAT_COLOURS)), len(HEAT_COLOURS) - 1)
+
+
+class InheritedValueRenderer(wx.grid.GridCellStringRenderer):
+    """Cell renderer drawing the clearance a pair inherits from its net classes
+    in the cells that are left empty.
+
+    :param table: Table to get the inherited clearances from.
+    """
+
+    def __init__(self, table: ClearanceTable):
+        super(InheritedValueRenderer, self).__init__()
+        self.table = table
+
+    def Draw(self, grid, attr, dc, rect, row, col, isSelected):
+        super(InheritedValueRenderer, self).Draw(
+            grid, attr, dc, rect, row, col, isSelected
+        )
+
+        if grid.GetCellValue(row, col) == "":
+            horiz, vert = attr.GetAlignment()
+            dc.SetFont(attr.GetFont())
+            dc.SetTextForeground(attr.GetTextColour())
+            grid.DrawTextRectangle(
+                dc, format_mm(self.table.get_baseline(row, col)) + " mm", rect, horiz, vert
+            )
 
-    return float(val_str)
+    def Clone(self):
+        return InheritedValueRenderer(self.table)
 
 
 if __name__ == "__main__":
-    app = wx.App()
-    nccm = NetClassClearanceMatrix()
-    nccm.Show()
+    with phase("startup"):
+        app = wx.App()
+        nccm = NetClassClearanceMatrix(background=True)
+        nccm.Show()
     app.MainLoop()
+    nccm_profile.stop()
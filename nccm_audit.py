@@ -0,0 +1,773 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Audit of the clearances the copper already on the board achieves between every pair of
+net classes, so that the cells a matrix would violate can be seen before it is written.
+
+Every copper item is reduced to a capsule, a segment swept by a radius:
+
+    tracks      the track, half its width
+    arcs        the two chords through the middle of the arc, half its width
+    vias        a point, half the diameter, on every copper layer
+    pads        the long axis of the pad, half its short side
+    zones       the edges of the filled areas, no radius
+
+so the distance between two items is the distance between their segments less both radii.
+Rectangular pads lose their corners and the inside of zone fills is not copper here, which
+DRC already reports as shorts. The items are placed in a uniform grid and only the items
+sharing a cell are measured. NumPy measures the pairs in batches when it is installed,
+otherwise they are measured one by one. It is only imported once a board is audited, as
+importing it takes longer than the plugin takes to show its window.
+"""
+
+import functools
+import math
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional
+
+from nccm_core import DEFAULT_CLASS, NM_PER_MM
+from nccm_matrix import (
+    ClearanceMatrix,
+    PairBaselines,
+    packed_index,
+    packed_length,
+    unpack_index,
+)
+
+# Layer mask of the items on every copper layer
+ALL_LAYERS = -1
+
+# Cells of the grid an item may be placed in on average before the cells are made larger
+MAX_CELLS_PER_ITEM = 8
+
+# Item pairs measured per NumPy batch
+PAIR_BATCH = 1 << 20
+
+
+@dataclass
+class CopperItems:
+    """Copper of a board as capsules, one entry per item in each array. Coordinates
+    and radii are in nm.
+
+    :param x1: X of the start of the segment of each item.
+    :param y1: Y of the start of the segment of each item.
+    :param x2: X of the end of the segment of each item.
+    :param y2: Y of the end of the segment of each item.
+    :param radius: Distance the copper reaches around the segment of each item.
+    :param layers: Bit mask of the copper layers of each item.
+    :param nets: Net of each item, items of the same net are not measured.
+    :param classes: Row/column of the net class of each item.
+    :param ids: Board item ID of each item.
+    """
+
+    x1: array = field(default_factory=lambda: array("d"))
+    y1: array = field(default_factory=lambda: array("d"))
+    x2: array = field(default_factory=lambda: array("d"))
+    y2: array = field(default_factory=lambda: array("d"))
+    radius: array = field(default_factory=lambda: array("d"))
+    layers: array = field(default_factory=lambda: array("q"))
+    nets: array = field(default_factory=lambda: array("q"))
+    classes: array = field(default_factory=lambda: array("q"))
+    ids: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(
+        self,
+        start: tuple[float, float],
+        end: tuple[float, float],
+        radius: float,
+        layers: int,
+        net: int,
+        class_index: int,
+        item_id: str = "",
+    ):
+        """Add an item.
+
+        :param start: Start of the segment in nm.
+        :param end: End of the segment in nm, the same as start for round items.
+        :param radius: Distance the copper reaches around the segment in nm.
+        :param layers: Bit mask of the copper layers of the item.
+        :param net: Net of the item.
+        :param class_index: Row/column of the net class of the item.
+        :param item_id: Board item ID of the item.
+        """
+        self.x1.append(start[0])
+        self.y1.append(start[1])
+        self.x2.append(end[0])
+        self.y2.append(end[1])
+        self.radius.append(radius)
+        self.layers.append(layers)
+        self.nets.append(net)
+        self.classes.append(class_index)
+        self.ids.append(item_id)
+
+    def subset(self, indices: Iterable[int]) -> "CopperItems":
+        """Get some of the items.
+
+        :param indices: Indices of the items.
+        :return: The items, in the order of the indices.
+        """
+        subset = CopperItems()
+        for name in ("x1", "y1", "x2", "y2", "radius", "layers", "nets", "classes"):
+            values = getattr(self, name)
+            getattr(subset, name).extend(values[index] for index in indices)
+        subset.ids = [self.ids[index] for index in indices]
+        return subset
+
+
+@dataclass
+class ClearanceAudit:
+    """Smallest copper to copper distance between the items of each pair of net classes.
+
+    :param achieved: Packed distances in mm, inf where no items of the pair are within reach.
+    :param reach: Distance in mm beyond which items were not measured.
+    """
+
+    achieved: array
+    reach: float
+
+    def get(self, row: int, col: int) -> float:
+        """Get the distance achieved by a class pair.
+
+        :param row: Row of the cell of the pair.
+        :param col: Column of the cell of the pair.
+        :return: Distance in mm, inf if no items of the pair are within reach.
+        """
+        return self.achieved[packed_index(row, col)]
+
+    def iter_violations(
+        self, matrix: ClearanceMatrix, baselines: PairBaselines
+    ) -> Iterator[tuple[tuple[int, int], float, float]]:
+        """Generate the class pairs that are closer on the board than their clearance,
+        which is the larger of their cell and the clearance of their net classes.
+
+        :param matrix: Matrix holding the clearance values.
+        :param baselines: Packed clearances each pair already gets from its net classes.
+        :return: Iterator of ((row, col), clearance, achieved) of the pairs.
+        """
+        for index, achieved in enumerate(self.achieved):
+            if achieved == math.inf:
+                continue
+            row, col = unpack_index(index)
+            required = max(matrix.values[index], baselines.get(row, col))
+            if achieved < required:
+                yield (row, col), required, achieved
+
+
+def get_reach(matrix: ClearanceMatrix, baselines: PairBaselines) -> float:
+    """Get the largest clearance any class pair asks for, the distance the audit has to
+    look at to find every violation.
+
+    :param matrix: Matrix holding the clearance values.
+    :param baselines: Packed clearances each pair already gets from its net classes.
+    :return: Clearance in mm.
+    """
+    return max(max(matrix.values, default=0), max(baselines.clearances, default=0))
+
+
+def get_layer_mask(layers: Iterable[int]) -> int:
+    """Get the bit mask of some copper layers, as used by CopperItems.
+
+    :param layers: Layer numbers, as the BoardLayer values of the KiCad API.
+    :return: Bit mask with the bit of each layer set.
+    """
+    mask = 0
+    for layer in layers:
+        mask |= 1 << layer
+    return mask
+
+
+def get_pad_capsule(
+    x: float, y: float, width: float, height: float, degrees: float
+) -> tuple[tuple[float, float], tuple[float, float], float]:
+    """Get the capsule of a pad, its long axis swept by half its short side.
+
+    :param x: X of the centre of the pad.
+    :param y: Y of the centre of the pad.
+    :param width: Size of the pad along its X axis.
+    :param height: Size of the pad along its Y axis.
+    :param degrees: Rotation of the pad, counterclockwise as in KiCad.
+    :return: Start and end of the segment and the radius.
+    """
+    radius = min(width, height) / 2
+    half_length = abs(width - height) / 2
+    angle = math.radians(degrees if width >= height else degrees + 90)
+
+    # The Y axis of the board points down
+    dx = half_length * math.cos(angle)
+    dy = -half_length * math.sin(angle)
+    return (x - dx, y - dy), (x + dx, y + dy), radius
+
+
+def segment_distance(
+    ax1: float, ay1: float, ax2: float, ay2: float,
+    bx1: float, by1: float, bx2: float, by2: float,
+) -> float:
+    """Get the distance between two segments, 0 if they cross.
+
+    :return: Distance in the unit of the coordinates.
+    """
+    cross_a1 = (bx2 - bx1) * (ay1 - by1) - (by2 - by1) * (ax1 - bx1)
+    cross_a2 = (bx2 - bx1) * (ay2 - by1) - (by2 - by1) * (ax2 - bx1)
+    cross_b1 = (ax2 - ax1) * (by1 - ay1) - (ay2 - ay1) * (bx1 - ax1)
+    cross_b2 = (ax2 - ax1) * (by2 - ay1) - (ay2 - ay1) * (bx2 - ax1)
+    if cross_a1 * cross_a2 < 0 and cross_b1 * cross_b2 < 0:
+        return 0.0
+
+    return min(
+        point_distance(ax1, ay1, bx1, by1, bx2, by2),
+        point_distance(ax2, ay2, bx1, by1, bx2, by2),
+        point_distance(bx1, by1, ax1, ay1, ax2, ay2),
+        point_distance(bx2, by2, ax1, ay1, ax2, ay2),
+    )
+
+
+def point_distance(px: float, py: float, x1: float, y1: float, x2: float, y2: float) -> float:
+    """Get the distance between a point and a segment.
+
+    :return: Distance in the unit of the coordinates.
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    length2 = dx * dx + dy * dy
+    t = 0.0
+    if length2 > 0:
+        t = min(max(((px - x1) * dx + (py - y1) * dy) / length2, 0.0), 1.0)
+    return math.hypot(px - x1 - t * dx, py - y1 - t * dy)
+
+
+@functools.lru_cache(maxsize=None)
+def get_numpy():
+    """Import NumPy the first time it is needed.
+
+    :return: The numpy module, None if it is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
+def segment_distances(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    """Get the distances between segments, as segment_distance does for one pair.
+
+    :return: NumPy array of the distances.
+    """
+    numpy = get_numpy()
+    cross_a1 = (bx2 - bx1) * (ay1 - by1) - (by2 - by1) * (ax1 - bx1)
+    cross_a2 = (bx2 - bx1) * (ay2 - by1) - (by2 - by1) * (ax2 - bx1)
+    cross_b1 = (ax2 - ax1) * (by1 - ay1) - (ay2 - ay1) * (bx1 - ax1)
+    cross_b2 = (ax2 - ax1) * (by2 - ay1) - (ay2 - ay1) * (bx2 - ax1)
+    crossing = (cross_a1 * cross_a2 < 0) & (cross_b1 * cross_b2 < 0)
+
+    distances = numpy.minimum(
+        numpy.minimum(
+            point_distances(ax1, ay1, bx1, by1, bx2, by2),
+            point_distances(ax2, ay2, bx1, by1, bx2, by2),
+        ),
+        numpy.minimum(
+            point_distances(bx1, by1, ax1, ay1, ax2, ay2),
+            point_distances(bx2, by2, ax1, ay1, ax2, ay2),
+        ),
+    )
+    distances[crossing] = 0
+    return distances
+
+
+def point_distances(px, py, x1, y1, x2, y2):
+    """Get the distances between points and segments, as point_distance does for one.
+
+    :return: NumPy array of the distances.
+    """
+    numpy = get_numpy()
+    dx = x2 - x1
+    dy = y2 - y1
+    length2 = dx * dx + dy * dy
+    dot = (px - x1) * dx + (py - y1) * dy
+    t = numpy.clip(numpy.divide(dot, length2, out=numpy.zeros_like(dot), where=length2 > 0), 0, 1)
+    return numpy.hypot(px - x1 - t * dx, py - y1 - t * dy)
+
+
+@dataclass
+class Grid:
+    """Uniform grid of the boxes of the items, grown by half the reach so that the boxes
+    of two items within reach of each other overlap.
+
+    :param cell: Size of a cell in nm.
+    :param left: Left edge of the box of each item.
+    :param top: Top edge of the box of each item.
+    :param right: Right edge of the box of each item.
+    :param bottom: Bottom edge of the box of each item.
+    """
+
+    cell: float
+    left: list[float]
+    top: list[float]
+    right: list[float]
+    bottom: list[float]
+
+    def get_span(self, item: int) -> tuple[int, int, int, int]:
+        """Get the cells covered by the box of an item.
+
+        :param item: Index of the item.
+        :return: First and last column and row.
+        """
+        cell = self.cell
+        return (
+            math.floor(self.left[item] / cell),
+            math.floor(self.top[item] / cell),
+            math.floor(self.right[item] / cell),
+            math.floor(self.bottom[item] / cell),
+        )
+
+
+def get_grid(items: CopperItems, reach: float) -> Grid:
+    """Place the items in a grid whose cells are about the size of the items, made larger
+    if the items would otherwise be spread over too many cells.
+
+    :param items: Copper of the board.
+    :param reach: Distance in nm beyond which items are not measured.
+    :return: The grid.
+    """
+    grow = [radius + reach / 2 for radius in items.radius]
+    left = [min(a, b) - g for a, b, g in zip(items.x1, items.x2, grow)]
+    top = [min(a, b) - g for a, b, g in zip(items.y1, items.y2, grow)]
+    right = [max(a, b) + g for a, b, g in zip(items.x1, items.x2, grow)]
+    bottom = [max(a, b) + g for a, b, g in zip(items.y1, items.y2, grow)]
+
+    sizes = sorted(max(r - l, b - t) for l, t, r, b in zip(left, top, right, bottom))
+    grid = Grid(max(sizes[len(sizes) // 2], 1.0), left, top, right, bottom)
+    while True:
+        cell_count = 0
+        for item in range(len(items)):
+            col_1, row_1, col_2, row_2 = grid.get_span(item)
+            cell_count += (col_2 - col_1 + 1) * (row_2 - row_1 + 1)
+        if cell_count <= MAX_CELLS_PER_ITEM * len(items):
+            return grid
+        grid.cell *= 2
+
+
+def iter_close_pairs(
+    items: CopperItems, reach: float, use_numpy: Optional[bool] = None
+) -> Iterator[tuple]:
+    """Generate the pairs of items closer than the reach. Items of the same net or with
+    no copper layer in common are not measured.
+
+    :param items: Copper of the board.
+    :param reach: Distance in nm beyond which items are not measured.
+    :param use_numpy: Measure with NumPy, by default if it is installed.
+    :return: Iterator of batches of the first items, second items and their distances in
+        nm, as NumPy arrays when measured with NumPy and lists otherwise.
+    """
+    if len(items) < 2:
+        return iter(())
+
+    grid = get_grid(items, reach)
+    if use_numpy is None:
+        use_numpy = get_numpy() is not None
+    measure = measure_numpy if use_numpy else measure_python
+    return measure(items, grid, reach)
+
+
+def audit_clearances(
+    items: CopperItems, class_count: int, reach: float, use_numpy: Optional[bool] = None
+) -> ClearanceAudit:
+    """Measure the smallest distance between the copper of every pair of net classes,
+    up to the reach.
+
+    :param items: Copper of the board.
+    :param class_count: Number of net classes.
+    :param reach: Distance in mm beyond which items are not measured.
+    :param use_numpy: Measure with NumPy, by default if it is installed.
+    :return: The distances achieved.
+    """
+    numpy = get_numpy()
+    if use_numpy is None:
+        use_numpy = numpy is not None
+
+    achieved = array("d", [math.inf]) * packed_length(class_count)
+    classes = numpy.asarray(items.classes) if use_numpy else items.classes
+    packed = numpy.asarray(achieved) if use_numpy else achieved
+    for a, b, distances in iter_close_pairs(items, reach * NM_PER_MM, use_numpy):
+        if use_numpy:
+            class_a, class_b = classes[a], classes[b]
+            row, col = numpy.minimum(class_a, class_b), numpy.maximum(class_a, class_b)
+            numpy.minimum.at(packed, col * (col + 1) // 2 + row, distances)
+            continue
+
+        for item_a, item_b, distance in zip(a, b, distances):
+            index = packed_index(*sorted((classes[item_a], classes[item_b])))
+            if distance < achieved[index]:
+                achieved[index] = distance
+
+    for index, distance in enumerate(achieved):
+        if distance != math.inf:
+            achieved[index] = distance / NM_PER_MM
+    return ClearanceAudit(achieved, reach)
+
+
+def iter_cell_items(items: CopperItems, grid: Grid) -> Iterator[tuple[int, int, list[int]]]:
+    """Generate the items of every cell of the grid that has more than one.
+
+    :param items: Copper of the board.
+    :param grid: Grid of the items.
+    :return: Iterator of the column, row and items of each cell.
+    """
+    cells = {}
+    for item in range(len(items)):
+        col_1, row_1, col_2, row_2 = grid.get_span(item)
+        for row in range(row_1, row_2 + 1):
+            for col in range(col_1, col_2 + 1):
+                cells.setdefault((col, row), []).append(item)
+
+    for (col, row), cell_items in cells.items():
+        if len(cell_items) > 1:
+            yield col, row, cell_items
+
+
+def measure_python(
+    items: CopperItems, grid: Grid, reach: float
+) -> Iterator[tuple[list[int], list[int], list[float]]]:
+    """Measure the item pairs sharing a cell one by one.
+
+    :param items: Copper of the board.
+    :param grid: Grid of the items.
+    :param reach: Distance in nm beyond which items are not measured.
+    :return: Iterator of the pairs closer than the reach in each cell, as iter_close_pairs.
+    """
+    x1, y1, x2, y2 = items.x1, items.y1, items.x2, items.y2
+    radius, layers, nets = items.radius, items.layers, items.nets
+    spans = [grid.get_span(item) for item in range(len(items))]
+
+    for col, row, cell_items in iter_cell_items(items, grid):
+        first, second, distances = [], [], []
+        for pos, a in enumerate(cell_items):
+            for b in cell_items[pos + 1 :]:
+                if nets[a] == nets[b] or not layers[a] & layers[b]:
+                    continue
+                if not is_owner(grid, spans, a, b, col, row):
+                    continue
+
+                distance = segment_distance(
+                    x1[a], y1[a], x2[a], y2[a], x1[b], y1[b], x2[b], y2[b]
+                )
+                distance = max(distance - radius[a] - radius[b], 0.0)
+                if distance <= reach:
+                    first.append(a)
+                    second.append(b)
+                    distances.append(distance)
+
+        if first:
+            yield first, second, distances
+
+
+def is_owner(grid: Grid, spans: list, a: int, b: int, col: int, row: int) -> bool:
+    """Check if a cell is the one a pair of items is measured in, the cell at the top
+    left of the overlap of their boxes, so that pairs sharing many cells are measured once.
+
+    :param grid: Grid of the items.
+    :param spans: Cells covered by the box of each item.
+    :param a: Index of the first item.
+    :param b: Index of the second item.
+    :param col: Column of the cell.
+    :param row: Row of the cell.
+    :return: True if the pair is measured in this cell and their boxes overlap.
+    """
+    if grid.left[a] > grid.right[b] or grid.left[b] > grid.right[a]:
+        return False
+    if grid.top[a] > grid.bottom[b] or grid.top[b] > grid.bottom[a]:
+        return False
+    return col == max(spans[a][0], spans[b][0]) and row == max(spans[a][1], spans[b][1])
+
+
+def measure_numpy(items: CopperItems, grid: Grid, reach: float) -> Iterator[tuple]:
+    """Measure the item pairs sharing a cell in batches of PAIR_BATCH pairs.
+
+    :param items: Copper of the board.
+    :param grid: Grid of the items.
+    :param reach: Distance in nm beyond which items are not measured.
+    :return: Iterator of the pairs closer than the reach in each batch, as iter_close_pairs.
+    """
+    np = get_numpy()
+    x1, y1 = np.asarray(items.x1), np.asarray(items.y1)
+    x2, y2 = np.asarray(items.x2), np.asarray(items.y2)
+    radius = np.asarray(items.radius)
+    layers, nets = np.asarray(items.layers), np.asarray(items.nets)
+    left, top = np.asarray(grid.left), np.asarray(grid.top)
+    right, bottom = np.asarray(grid.right), np.asarray(grid.bottom)
+
+    col_1 = np.floor(left / grid.cell).astype(np.int64)
+    row_1 = np.floor(top / grid.cell).astype(np.int64)
+    cols = np.floor(right / grid.cell).astype(np.int64) - col_1 + 1
+    rows = np.floor(bottom / grid.cell).astype(np.int64) - row_1 + 1
+
+    # One entry per cell covered by each item, sorted by cell
+    counts = cols * rows
+    entry_item = np.repeat(np.arange(len(items)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    entry_col = col_1[entry_item] + offset % cols[entry_item]
+    entry_row = row_1[entry_item] + offset // cols[entry_item]
+    width = int(entry_col.max() - entry_col.min()) + 1
+    entry_cell = (entry_row - entry_row.min()) * width + (entry_col - entry_col.min())
+    order = np.argsort(entry_cell, kind="stable")
+    entry_item, entry_col, entry_row = entry_item[order], entry_col[order], entry_row[order]
+    entry_cell = entry_cell[order]
+
+    # Each entry is paired with the entries after it in the same cell
+    boundaries = np.flatnonzero(np.diff(entry_cell)) + 1
+    cell_ends = np.append(boundaries, len(entry_cell))
+    ends = np.repeat(cell_ends, np.diff(np.concatenate(([0], cell_ends))))
+    after = ends - np.arange(len(entry_cell)) - 1
+    pair_ends = np.cumsum(after)
+
+    start = 0
+    while start < len(entry_cell):
+        base = pair_ends[start] - after[start]
+        stop = int(np.searchsorted(pair_ends, base + PAIR_BATCH, side="right"))
+        stop = min(max(stop, start + 1), len(entry_cell))
+        first = np.repeat(np.arange(start, stop), after[start:stop])
+        pair_starts = np.repeat(pair_ends[start:stop] - after[start:stop], after[start:stop])
+        second = first + 1 + base + np.arange(len(first)) - pair_starts
+        start = stop
+        if len(first) == 0:
+            continue
+
+        a, b = entry_item[first], entry_item[second]
+        keep = (nets[a] != nets[b]) & (layers[a] & layers[b] != 0)
+        keep &= (left[a] <= right[b]) & (left[b] <= right[a])
+        keep &= (top[a] <= bottom[b]) & (top[b] <= bottom[a])
+        keep &= entry_col[first] == np.maximum(col_1[a], col_1[b])
+        keep &= entry_row[first] == np.maximum(row_1[a], row_1[b])
+        a, b = a[keep], b[keep]
+
+        distances = segment_distances(x1[a], y1[a], x2[a], y2[a], x1[b], y1[b], x2[b], y2[b])
+        distances = np.maximum(distances - radius[a] - radius[b], 0)
+        near = distances <= reach
+        if near.any():
+            yield a[near], b[near], distances[near]
+
+
+@dataclass
+class PairMeasure:
+    """Distances between the items of one class pair, up to a reach.
+
+    :param reach: Distance in mm beyond which items were not measured.
+    :param distances: Distance of each pair of items in mm, smallest first.
+    :param item_ids: Board item IDs of each pair of items, in the order of the distances.
+    """
+
+    reach: float
+    distances: array = field(default_factory=lambda: array("d"))
+    item_ids: list[tuple[str, str]] = field(default_factory=list)
+
+    def count_closer(self, clearance: float) -> int:
+        """Count the pairs of items closer than a clearance within the reach.
+
+        :param clearance: Clearance in mm.
+        :return: Number of pairs.
+        """
+        return bisect_left(self.distances, clearance)
+
+
+class AuditCache:
+    """Audit of a board kept together with the copper it was measured on, so that a single
+    class pair can be checked at another clearance without measuring the whole board.
+    The items of each class pair closer than its clearance are kept per pair once they
+    are asked for, and only the items of the two classes are measured again when a larger
+    clearance is asked for. Nothing is kept once the board has another revision.
+
+    :param items: Copper of the board.
+    :param class_count: Number of net classes.
+    :param revision: Revision of the board the items were read from.
+    :param use_numpy: Measure with NumPy, by default if it is installed.
+    :param audit: Smallest distance of every class pair, kept up to date as pairs are
+        measured further.
+    :param pairs: Measured item pairs of each class pair, by packed index.
+    :param class_items: Indices of the items of each class, built on first use.
+    """
+
+    def __init__(
+        self,
+        items: CopperItems,
+        class_count: int,
+        revision,
+        reach: float,
+        use_numpy: Optional[bool] = None,
+    ):
+        self.items = items
+        self.class_count = class_count
+        self.revision = revision
+        self.use_numpy = use_numpy
+        self.audit = audit_clearances(items, class_count, reach, use_numpy)
+        self.pairs = {}
+        self.class_items = None
+
+    def is_current(self, revision) -> bool:
+        """Check if the audit was made on a revision of the board.
+
+        :param revision: Revision of the board.
+        :return: True if the audit is of that revision.
+        """
+        return revision == self.revision
+
+    def count_violations(self, row: int, col: int, clearance: float) -> int:
+        """Count the pairs of items of a class pair closer than a clearance.
+
+        :param row: Row of the cell of the pair.
+        :param col: Column of the cell of the pair.
+        :param clearance: Clearance in mm.
+        :return: Number of pairs of items.
+        """
+        index = packed_index(row, col)
+        measure = self.pairs.get(index)
+        if measure is None or measure.reach < clearance:
+            measure = self.measure_pair(row, col, max(clearance, self.audit.reach))
+            self.pairs[index] = measure
+            if measure.distances:
+                self.audit.achieved[index] = min(self.audit.achieved[index], measure.distances[0])
+
+        return measure.count_closer(clearance)
+
+    def measure_pair(self, row: int, col: int, reach: float) -> PairMeasure:
+        """Measure the items of one class pair, looking only at the items of the two classes.
+
+        :param row: Row of the cell of the pair.
+        :param col: Column of the cell of the pair.
+        :param reach: Distance in mm beyond which items are not measured.
+        :return: Item pairs of the class pair within the reach.
+        """
+        if self.class_items is None:
+            self.class_items = [[] for _ in range(self.class_count)]
+            for item, class_index in enumerate(self.items.classes):
+                self.class_items[class_index].append(item)
+
+        indices = self.class_items[row]
+        if row != col:
+            indices = indices + self.class_items[col]
+        subset = self.items.subset(indices)
+        numpy = get_numpy()
+        use_numpy = self.use_numpy if self.use_numpy is not None else numpy is not None
+        classes = numpy.asarray(subset.classes) if use_numpy else subset.classes
+
+        # Pairs within one of the classes are left out unless that is the pair measured
+        found = []
+        for a, b, distances in iter_close_pairs(subset, reach * NM_PER_MM, use_numpy):
+            if use_numpy:
+                keep = (classes[a] != classes[b]) | (row == col)
+                a, b, distances = a[keep].tolist(), b[keep].tolist(), distances[keep].tolist()
+            for item_a, item_b, distance in zip(a, b, distances):
+                if row == col or classes[item_a] != classes[item_b]:
+                    found.append((distance / NM_PER_MM, subset.ids[item_a], subset.ids[item_b]))
+
+        found.sort()
+        return PairMeasure(
+            reach,
+            array("d", [distance for distance, _, _ in found]),
+            [(id_a, id_b) for _, id_a, id_b in found],
+        )
+
+
+def read_board_copper(
+    board, class_names: list[str], is_copper_layer: Callable[[int], bool]
+) -> CopperItems:
+    """Read the tracks, vias, pads and zone fills of a board from the KiCad API.
+
+    :param board: Board open in KiCad, as kipy.board.Board.
+    :param class_names: Net class names indexed by row/column.
+    :param is_copper_layer: Check if a layer of the KiCad API is a copper layer.
+    :return: Copper of the board. Items of nets in no known class are in the Default class,
+        or left out if there is none.
+    """
+    tracks = board.get_tracks()
+    vias = board.get_vias()
+    pads = board.get_pads()
+    zones = [zone for zone in board.get_zones() if not zone.is_rule_area()]
+
+    # The net classes are asked for once for all the nets with copper
+    nets = {}
+    for item in (*tracks, *vias, *pads, *zones):
+        net = item.net
+        if net is not None and net.name:
+            nets.setdefault(net.name, net)
+    class_of_net = {}
+    if nets:
+        class_of_net = {
+            name: net_class.name
+            for name, net_class in board.get_netclass_for_nets(list(nets.values())).items()
+        }
+
+    class_index = {name: pos for pos, name in enumerate(class_names)}
+    default_index = class_index.get(DEFAULT_CLASS)
+    net_index = {name: pos for pos, name in enumerate(nets)}
+    items = CopperItems()
+
+    def get_net(item) -> tuple[int, Optional[int]]:
+        # Items without a net are only connected to themselves
+        name = item.net.name if item.net is not None else ""
+        if not name:
+            return -1 - len(items), default_index
+        return net_index[name], class_index.get(class_of_net.get(name), default_index)
+
+    def add(start, end, radius, layers, item):
+        net, class_pos = get_net(item)
+        if class_pos is not None and layers:
+            items.add(start, end, radius, layers, net, class_pos, item.id.value)
+
+    for track in tracks:
+        layers = get_layer_mask([track.layer])
+        start = (track.start.x, track.start.y)
+        end = (track.end.x, track.end.y)
+        if hasattr(track, "mid"):
+            mid = (track.mid.x, track.mid.y)
+            add(start, mid, track.width / 2, layers, track)
+            add(mid, end, track.width / 2, layers, track)
+        else:
+            add(start, end, track.width / 2, layers, track)
+
+    for via in vias:
+        position = (via.position.x, via.position.y)
+        add(position, position, via.diameter / 2, ALL_LAYERS, via)
+
+    for pad in pads:
+        copper = [layer for layer in pad.padstack.layers if is_copper_layer(layer)]
+        copper_layers = pad.padstack.copper_layers
+        if not copper or not copper_layers:
+            continue
+        size = copper_layers[0].size
+        start, end, radius = get_pad_capsule(
+            pad.position.x, pad.position.y, size.x, size.y, pad.padstack.angle.degrees
+        )
+        add(start, end, radius, get_layer_mask(copper), pad)
+
+    for zone in zones:
+        for layer, polygons in zone.filled_polygons.items():
+            if not is_copper_layer(layer):
+                continue
+            for polygon in polygons:
+                for outline in (polygon.outline, *polygon.holes):
+                    points = [
+                        (node.point.x, node.point.y) for node in outline.nodes if node.has_point
+                    ]
+                    for start, end in zip(points, points[1:] + points[:1]):
+                        add(start, end, 0, get_layer_mask([layer]), zone)
+
+    return items
@@ -0,0 +1,820 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import csv
+import glob
+import json
+import os
+from dataclasses import dataclass, field
+from itertools import compress
+from typing import Iterable, Iterator, Optional, TextIO
+
+from nccm_dru import (
+    CLEARANCE,
+    CONSTRAINTS,
+    DruSyntaxError,
+    get_class_val_dict,
+    get_layer_val_dicts,
+    iter_rule_strings,
+    read_dru,
+    remove_section_from_file,
+    write_rules,
+)
+from nccm_matrix import (
+    ClearanceMatrix,
+    CoordView,
+    InvalidCoordView,
+    MatrixStack,
+    PairBaselines,
+    packed_index,
+    pair_baselines,
+    unpack_index,
+)
+from nccm_units import NM_PER_MM, format_mm, nm_to_mm, parse_nm
+
+# Numeric constants
+MIN = 0.000000
+MAX = 999.999999
+MIN_NM = round(MIN * NM_PER_MM)
+MAX_NM = round(MAX * NM_PER_MM)
+
+# Class whose clearance applies to classes without their own
+DEFAULT_CLASS = "Default"
+
+# Version of the JSON matrix format
+MATRIX_JSON_VERSION = 1
+
+# Outcome of a project that could not be updated
+FAILED = "failed"
+
+
+class NccmError(Exception):
+    """Raised when a project or matrix file cannot be used."""
+
+
+class NetClass:
+    """Net class read from a project file, offering the same fields as the KiCad API.
+
+    :param name: Name of the class.
+    :param clearance: Clearance of the class in nm, None if it uses the default.
+    """
+
+    def __init__(self, name: str, clearance: Optional[int] = None):
+        self.name = name
+        self.clearance = clearance
+
+
+class Project:
+    """KiCad project on disk, offering the same fields as the KiCad API project.
+
+    :param path: Directory of the project.
+    :param name: Name of the project, which is the name of its .kicad_pro file.
+    """
+
+    def __init__(self, path: str):
+        path = os.path.abspath(path)
+
+        if os.path.isfile(path) and path.endswith(".kicad_pro"):
+            self.path = os.path.dirname(path)
+            self.name = os.path.basename(path)[: -len(".kicad_pro")]
+            return
+
+        if not os.path.isdir(path):
+            raise NccmError(f"{path} is not a KiCad project or project directory")
+
+        pro_files = [f for f in os.listdir(path) if f.endswith(".kicad_pro")]
+        if len(pro_files) != 1:
+            raise NccmError(
+                f"Expected one .kicad_pro file in {path}, found {len(pro_files)}"
+            )
+
+        self.path = path
+        self.name = pro_files[0][: -len(".kicad_pro")]
+
+    @property
+    def pro_path(self) -> str:
+        return os.path.join(self.path, self.name + ".kicad_pro")
+
+    @property
+    def dru_path(self) -> str:
+        return os.path.join(self.path, self.name + ".kicad_dru")
+
+    def get_net_classes(self) -> list[NetClass]:
+        """Get the net classes from the net_settings of the project file.
+
+        :return: List of the net classes in the order of the project file.
+        """
+        try:
+            f_read = open(self.pro_path, "r", encoding="utf-8")
+            settings = json.load(f_read)
+            f_read.close()
+        except (OSError, ValueError) as err:
+            raise NccmError(f"Unable to read {self.pro_path}: {err}")
+
+        net_classes = []
+        for net_class in settings.get("net_settings", {}).get("classes", []):
+            clearance = net_class.get("clearance")
+            if clearance is not None:
+                clearance = round(clearance * NM_PER_MM)
+            net_classes.append(NetClass(net_class["name"], clearance))
+
+        return net_classes
+
+
+def get_class_clearances(net_classes: list) -> list[float]:
+    """Get the clearance of each net class in mm. Classes without their own
+    clearance use the one of the Default class.
+
+    :param net_classes: Net classes from the KiCad API or a project file.
+    :return: List of clearances in the same order as the classes.
+    """
+    clearances = [getattr(net_class, "clearance", None) for net_class in net_classes]
+
+    default_clearance = 0
+    for net_class, clearance in zip(net_classes, clearances):
+        if net_class.name == DEFAULT_CLASS and clearance is not None:
+            default_clearance = clearance
+
+    return [
+        (clearance if clearance is not None else default_clearance) / NM_PER_MM
+        for clearance in clearances
+    ]
+
+
+def fill_matrix(
+    matrix: ClearanceMatrix, class_names: list[str], class_val_dict: dict[tuple, str]
+) -> tuple[dict[tuple, float], list[tuple]]:
+    """Write the clearance of each class pair into its cell of the matrix.
+
+    :param matrix: Matrix to write to.
+    :param class_names: Net class names indexed by row/column.
+    :param class_val_dict: Class pairs and their clearance as key-value pairs.
+    :return: The non-zero values written by coordinate, and the class pairs naming
+        classes that are not in class_names.
+    """
+    # Look up the position of every class once instead of searching the names
+    class_index = {name: pos for pos, name in enumerate(class_names)}
+    placed = {}
+    missing = []
+
+    # The values repeat across pairs, so they are parsed in one batch
+    items = list(class_val_dict.items())
+    values = parse_cell_values([value for _, value in items])
+
+    for ((class_a, class_b), _), value_float in zip(items, values):
+        pos_a = class_index.get(class_a)
+        pos_b = class_index.get(class_b)
+        if pos_a is None or pos_b is None:
+            missing.append((class_a, class_b))
+            continue
+
+        # Pairs can name the classes in either order but only the top is valid
+        row, col = min(pos_a, pos_b), max(pos_a, pos_b)
+        matrix.set(row, col, value_float)
+        if value_float != 0:
+            placed[(row, col)] = value_float
+        else:
+            placed.pop((row, col), None)
+
+    return placed, missing
+
+
+def fill_layers(
+    stack: MatrixStack, class_names: list[str], layer_val_dicts: dict[str, dict[tuple, str]]
+) -> list[tuple]:
+    """Write the value of each class pair into its cell of the layer of each constraint.
+
+    :param stack: Layers to write to.
+    :param class_names: Net class names indexed by row/column.
+    :param layer_val_dicts: Constraint type mapped to the class pairs and their value.
+    :return: The class pairs naming classes that are not in class_names, once each.
+    """
+    missing = {}
+    for constraint, class_val_dict in layer_val_dicts.items():
+        if constraint not in stack.layers:
+            continue
+        _, layer_missing = fill_matrix(stack.layer(constraint), class_names, class_val_dict)
+        missing.update(dict.fromkeys(layer_missing))
+
+    return list(missing)
+
+
+def generate_coords(size: int, use_top_bot: str = "top") -> tuple[CoordView, InvalidCoordView]:
+    """Get both valid and invalid coordinates of a square grid. Neither is stored, they
+    are worked out from the size of the grid when looked at.
+
+    :param size: Number of rows/columns of the grid.
+    :param use_top_bot: Use the top or bottom diagonal table section for the valid coords.
+    :return: Valid coordinates column by column (row by row for the bottom section),
+        and the invalid coordinates.
+    """
+    valid_coords = CoordView(size, transpose=use_top_bot == "bot")
+
+    return valid_coords, InvalidCoordView(valid_coords)
+
+
+def get_effective_cells(
+    cells: Iterable[tuple[tuple[int, int], float]], baselines: PairBaselines
+) -> list[tuple[tuple[int, int], float]]:
+    """Get the cells whose value is above the clearance of their net classes,
+    in the packed order of the matrix.
+
+    :param cells: ((row, col), value) pairs.
+    :param baselines: Packed clearances each pair already gets from its net classes.
+    :return: List of ((row, col), value) pairs.
+    """
+    effective = []
+    for coord, value in cells:
+        if value > baselines.get(*coord):
+            effective.append((packed_index(*coord), coord, value))
+    effective.sort()
+
+    return [(coord, value) for _, coord, value in effective]
+
+
+def iter_effective_layer_cells(
+    cells: Iterable[tuple[tuple[int, int], tuple]], baselines: PairBaselines
+) -> Iterator[tuple[tuple[int, int], tuple[tuple[str, float], ...]]]:
+    """Generate the cells of a stack of layers with the constraints worth writing. Only
+    the clearance has a baseline from the net classes, a clearance at or below it is left
+    out and so is a cell left with no constraint.
+
+    :param cells: ((row, col), ((constraint, value), ...)) pairs, as MatrixStack.nonzero
+        gives them.
+    :param baselines: Packed clearances each pair already gets from its net classes.
+    :return: Iterator of ((row, col), ((constraint, value), ...)) pairs.
+    """
+    for coord, constraints in cells:
+        effective = tuple(
+            (constraint, value)
+            for constraint, value in constraints
+            if constraint != CLEARANCE or value > baselines.get(*coord)
+        )
+        if effective:
+            yield coord, effective
+
+
+def missing_class_message(class_pairs: list[tuple], limit: int = 10) -> str:
+    """Get the message reporting rules that name classes missing from the board.
+
+    :param class_pairs: Class pairs of the rules that could not be placed in the matrix.
+    :param limit: Maximum number of rules to list.
+    :return: Message text.
+    """
+    lines = [
+        f"{len(class_pairs)} NCCM rule(s) name net classes that are not on the board",
+        "and will be dropped on the next update:",
+    ]
+    for class_a, class_b in class_pairs[:limit]:
+        lines.append(f"  {class_a} to {class_b}")
+    if len(class_pairs) > limit:
+        lines.append(f"  ...and {len(class_pairs) - limit} more")
+
+    return "\n".join(lines)
+
+
+def read_matrix_file(path: str) -> dict[tuple, str]:
+    """Read the clearances of a matrix exported to CSV or JSON.
+
+    A CSV file holds a square table with the class names along the first row and
+    column. Empty cells and cells holding "-" are skipped, and either triangle can
+    be used. A JSON file holds {"clearances": [{"a": .., "b": .., "clearance": ..}]}.
+
+    :param path: Path to a .csv or .json file.
+    :return: Class pairs and their clearance as key-value pairs.
+    """
+    try:
+        f_read = open(path, "r", encoding="utf-8", newline="")
+        if path.lower().endswith(".json"):
+            class_val_dict = read_matrix_json(f_read)
+        else:
+            class_val_dict = read_matrix_csv(f_read)
+        f_read.close()
+    except OSError as err:
+        raise NccmError(f"Unable to read {path}: {err}")
+
+    return class_val_dict
+
+
+def read_matrix_csv(stream: TextIO) -> dict[tuple, str]:
+    """Read the clearances of a matrix from CSV.
+
+    :param stream: Open CSV file.
+    :return: Class pairs and their clearance as key-value pairs.
+    """
+    rows = list(csv.reader(stream))
+    if not rows:
+        return {}
+
+    col_names = [name.strip() for name in rows[0][1:]]
+    class_val_dict = {}
+    for row in rows[1:]:
+        if not row:
+            continue
+        row_name = row[0].strip()
+        for col_name, value in zip(col_names, row[1:]):
+            value = value.strip()
+            if value in ("", "-"):
+                continue
+            add_class_pair(class_val_dict, row_name, col_name, value)
+
+    return class_val_dict
+
+
+def read_matrix_json(stream: TextIO) -> dict[tuple, str]:
+    """Read the clearances of a matrix from JSON.
+
+    :param stream: Open JSON file.
+    :return: Class pairs and their clearance as key-value pairs.
+    """
+    try:
+        data = json.load(stream)
+        class_val_dict = {}
+        for entry in data["clearances"]:
+            value = entry["clearance"]
+            if isinstance(value, (int, float)):
+                value = f"{float(value):.12f}"
+            add_class_pair(class_val_dict, entry["a"], entry["b"], str(value))
+    except (ValueError, KeyError, TypeError) as err:
+        raise NccmError(f"Invalid matrix file: {err}")
+
+    return class_val_dict
+
+
+def add_class_pair(class_val_dict: dict[tuple, str], class_a: str, class_b: str, value: str):
+    """Add the clearance of a pair read from a matrix file, checking that the pair
+    does not already have a different clearance in the other order.
+
+    :param class_val_dict: Class pairs read so far.
+    :param class_a: First class of the pair.
+    :param class_b: Second class of the pair.
+    :param value: Clearance of the pair.
+    """
+    other = class_val_dict.get((class_b, class_a))
+    if class_a != class_b and other is not None:
+        if parse_cell_value(other) != parse_cell_value(value):
+            raise NccmError(
+                f"Conflicting clearances for {class_a} and {class_b}: {other} and {value}"
+            )
+        return
+
+    class_val_dict[(class_a, class_b)] = value
+
+
+def write_matrix_file(
+    stream: TextIO, class_names: list[str], cells: Iterable[tuple[tuple[int, int], float]], fmt: str
+):
+    """Write the clearances of a matrix as CSV or JSON.
+
+    :param stream: Open file to write to.
+    :param class_names: Net class names indexed by row/column.
+    :param cells: ((row, col), value) pairs of the non-zero cells.
+    :param fmt: "csv" or "json".
+    """
+    if fmt == "json":
+        json.dump(
+            {
+                "version": MATRIX_JSON_VERSION,
+                "unit": "mm",
+                "classes": class_names,
+                "clearances": [
+                    {"a": class_names[row], "b": class_names[col], "clearance": value}
+                    for (row, col), value in cells
+                ],
+            },
+            stream,
+            indent=4,
+        )
+        stream.write("\n")
+        return
+
+    values = dict(cells)
+    writer = csv.writer(stream, lineterminator="\n")
+    writer.writerow([""] + class_names)
+    for row, row_name in enumerate(class_names):
+        line = [row_name]
+        for col in range(len(class_names)):
+            if row > col:
+                line.append("-")
+            elif (row, col) in values:
+                line.append(format_mm(values[(row, col)]))
+            else:
+                line.append("")
+        writer.writerow(line)
+
+
+def export_matrix(project: Project) -> tuple[list[str], list[tuple], list[tuple]]:
+    """Get the matrix held in the NCCM section of a project's custom rules.
+
+    :param project: Project to read.
+    :return: The class names, the ((row, col), value) pairs of the non-zero cells in
+        packed order, and the class pairs naming classes not in the project.
+    """
+    class_names = [net_class.name for net_class in project.get_net_classes()]
+    matrix = ClearanceMatrix(len(class_names))
+
+    if not os.path.isfile(project.dru_path):
+        return class_names, [], []
+
+    _, dru = read_dru(project.dru_path)
+    _, missing = fill_matrix(matrix, class_names, get_class_val_dict(dru))
+
+    return class_names, list(matrix.nonzero()), missing
+
+
+def map_class_names(
+    class_val_dict: dict[tuple, str], class_names: list[str], class_map: Optional[dict] = None
+) -> dict[tuple, str]:
+    """Map the class names of a matrix template onto the net classes of a project.
+    A name is first translated through class_map, then matched exactly, and failing
+    that matched ignoring case. Names that match nothing are left as they are.
+
+    :param class_val_dict: Class pairs and their clearance as key-value pairs.
+    :param class_names: Net class names of the project.
+    :param class_map: Template class names mapped to project class names.
+    :return: The class pairs renamed to the project classes.
+    """
+    class_map = class_map or {}
+    names = set(class_names)
+    folded_names = {}
+    for name in class_names:
+        folded_names.setdefault(name.casefold(), name)
+
+    mapped_names = {}
+
+    def map_name(name: str) -> str:
+        mapped = mapped_names.get(name)
+        if mapped is None:
+            mapped = class_map.get(name, name)
+            if mapped not in names:
+                mapped = folded_names.get(mapped.casefold(), mapped)
+            mapped_names[name] = mapped
+        return mapped
+
+    return {
+        (map_name(class_a), map_name(class_b)): value
+        for (class_a, class_b), value in class_val_dict.items()
+    }
+
+
+def apply_matrix(
+    project: Project,
+    class_val_dict: dict[tuple, str],
+    compact: bool = False,
+    class_map: Optional[dict] = None,
+) -> tuple[str, int, list[tuple]]:
+    """Write the clearances of a matrix to the NCCM section of a project's custom rules.
+    The other constraints already in the section are written back with them.
+
+    :param project: Project to write to.
+    :param class_val_dict: Class pairs and their clearance as key-value pairs.
+    :param compact: Group the pairs sharing a clearance into as few rules as possible.
+    :param class_map: Matrix class names mapped to project class names.
+    :return: CREATED, UPDATED or UNCHANGED, the number of rules written, and the class
+        pairs naming classes not in the project.
+    """
+    net_classes = project.get_net_classes()
+    class_names = [net_class.name for net_class in net_classes]
+    class_val_dict = map_class_names(class_val_dict, class_names, class_map)
+    stack = MatrixStack(len(class_names), CONSTRAINTS)
+
+    # Matrix files only hold clearances, the other constraints of the section are kept
+    if os.path.isfile(project.dru_path):
+        _, dru = read_dru(project.dru_path)
+        layer_val_dicts = get_layer_val_dicts(dru)
+        del layer_val_dicts[CLEARANCE]
+        fill_layers(stack, class_names, layer_val_dicts)
+    _, missing = fill_matrix(stack.layer(CLEARANCE), class_names, class_val_dict)
+
+    # The rules are written as they are generated, straight from the layers
+    baselines = pair_baselines(get_class_clearances(net_classes))
+    cells = iter_effective_layer_cells(stack.nonzero(), baselines)
+    status, rule_count = write_rules(
+        project.dru_path, iter_rule_strings(class_names, cells, compact)
+    )
+
+    return status, rule_count, missing
+
+
+@dataclass
+class BatchResult:
+    """Outcome of applying a matrix to one project of a batch.
+
+    :param path: Project directory or file as given.
+    :param status: CREATED, UPDATED, UNCHANGED or FAILED.
+    :param rule_count: Number of rules written.
+    :param missing: Class pairs naming classes not in the project.
+    :param error: Reason for the failure, if it failed.
+    """
+
+    path: str
+    status: str
+    rule_count: int = 0
+    missing: list[tuple] = field(default_factory=list)
+    error: str = ""
+
+
+def find_projects(patterns: list[str]) -> list[str]:
+    """Expand project directories, .kicad_pro files and glob patterns of either.
+
+    :param patterns: Paths or glob patterns.
+    :return: Matching paths in the order given, without duplicates.
+    """
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path.endswith(".kicad_pro") or os.path.isdir(path):
+                paths.append(path)
+
+    return list(dict.fromkeys(paths))
+
+
+def apply_to_project(
+    path: str, class_val_dict: dict[tuple, str], compact: bool, class_map: Optional[dict]
+) -> BatchResult:
+    """Apply a matrix to one project of a batch, catching its failure.
+
+    :param path: Project directory or .kicad_pro file.
+    :param class_val_dict: Class pairs and their clearance as key-value pairs.
+    :param compact: Group the pairs sharing a clearance into as few rules as possible.
+    :param class_map: Matrix class names mapped to project class names.
+    :return: Outcome for the project.
+    """
+    try:
+        status, rule_count, missing = apply_matrix(
+            Project(path), class_val_dict, compact, class_map
+        )
+    except (NccmError, DruSyntaxError, OSError) as err:
+        return BatchResult(path, FAILED, error=str(err))
+
+    return BatchResult(path, status, rule_count, missing)
+
+
+def apply_to_projects(
+    paths: list[str],
+    class_val_dict: dict[tuple, str],
+    compact: bool = False,
+    class_map: Optional[dict] = None,
+    jobs: Optional[int] = None,
+) -> list[BatchResult]:
+    """Apply a matrix to many projects, each in a worker process of its own.
+
+    :param paths: Project directories or .kicad_pro files.
+    :param class_val_dict: Class pairs and their clearance as key-value pairs.
+    :param compact: Group the pairs sharing a clearance into as few rules as possible.
+    :param class_map: Matrix class names mapped to project class names.
+    :param jobs: Number of worker processes, one per CPU by default.
+    :return: Outcome for each project, in the order of paths.
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+
+    # Starting workers is not worth it for a single project
+    if jobs <= 1:
+        return [apply_to_project(path, class_val_dict, compact, class_map) for path in paths]
+
+    # Only batches need the process pool, so it is kept out of the start up imports
+    from concurrent.futures import ProcessPoolExecutor
+
+    count = len(paths)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(
+            executor.map(
+                apply_to_project,
+                paths,
+                [class_val_dict] * count,
+                [compact] * count,
+                [class_map] * count,
+                chunksize=max(1, count // (jobs * 4)),
+            )
+        )
+
+
+def clear_matrix(project: Project) -> bool:
+    """Remove the NCCM section from a project's custom rules.
+
+    :param project: Project to clear.
+    :return: True if a section was found and removed.
+    """
+    if not os.path.isfile(project.dru_path):
+        return False
+
+    return remove_section_from_file(project.dru_path)
+
+
+def get_pair_cell(row: int, col: int) -> tuple[int, int]:
+    """Get the valid cell of the class pair a cell stands for. A cell below the diagonal
+    is the same pair as its mirror above it.
+
+    :param row: Row of the cell.
+    :param col: Column of the cell.
+    :return: Row and column of the valid cell.
+    """
+    return (row, col) if row <= col else (col, row)
+
+
+def parse_tsv(text: str) -> list[list[str]]:
+    """Split tab separated text, as copied from a spreadsheet, into rows of cells.
+
+    :param text: Clipboard text.
+    :return: Cell texts row by row.
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+
+    return [line.split("\t") for line in lines]
+
+
+def paste_cells(matrix: ClearanceMatrix, top: int, left: int, rows: list[list[str]]) -> int:
+    """Write a block of cell texts into the matrix with its first cell at (top, left).
+    The values of cells below the diagonal go to their mirror above it, unless the block
+    also has that cell. Cells past the edge of the matrix and dashes are skipped.
+
+    :param matrix: Matrix to write to.
+    :param top: Row of the first cell of the block.
+    :param left: Column of the first cell of the block.
+    :param rows: Cell texts row by row.
+    :return: Number of cells written.
+    """
+    size = matrix.size
+    upper = {}
+    lower = {}
+    for row, line in zip(range(top, size), rows):
+        for col, text in zip(range(left, size), line):
+            text = text.strip()
+            if text == "-":
+                continue
+            if row <= col:
+                upper[(row, col)] = text
+            else:
+                lower[(col, row)] = text
+
+    lower.update(upper)
+    for (row, col), value in zip(lower, parse_cell_values(lower.values())):
+        matrix.set(row, col, value)
+
+    return len(lower)
+
+
+def get_block_cells(
+    size: int, top: int, left: int, bottom: int, right: int
+) -> set[tuple[int, int]]:
+    """Get the valid cells of the class pairs within a block of the grid.
+
+    :param size: Number of rows/columns of the grid.
+    :param top: First row of the block.
+    :param left: First column of the block.
+    :param bottom: Last row of the block.
+    :param right: Last column of the block.
+    :return: Valid cells of the pairs.
+    """
+    return {
+        get_pair_cell(row, col)
+        for row in range(max(top, 0), min(bottom, size - 1) + 1)
+        for col in range(max(left, 0), min(right, size - 1) + 1)
+    }
+
+
+def get_class_cells(size: int, index: int) -> list[tuple[int, int]]:
+    """Get the valid cells of every pair a class is part of, which is the whole row
+    and column of the class.
+
+    :param size: Number of rows/columns of the grid.
+    :param index: Row/column of the class.
+    :return: Valid cells of the pairs.
+    """
+    return [get_pair_cell(index, other) for other in range(size)]
+
+
+def fill_cells(matrix: ClearanceMatrix, cells, value: float) -> int:
+    """Set many valid cells of the matrix to the same value.
+
+    :param matrix: Matrix to write to.
+    :param cells: Valid cells to set.
+    :param value: Value to set them to.
+    :return: Number of cells written.
+    """
+    count = 0
+    for row, col in cells:
+        matrix.set(row, col, value)
+        count += 1
+
+    return count
+
+
+def copy_cells(matrix: ClearanceMatrix, top: int, left: int, bottom: int, right: int) -> str:
+    """Get a block of the grid as tab separated text for a spreadsheet. Cells below the
+    diagonal are given the value of their mirror above it, so a copied matrix is complete.
+
+    :param matrix: Matrix to read from.
+    :param top: First row of the block.
+    :param left: First column of the block.
+    :param bottom: Last row of the block.
+    :param right: Last column of the block.
+    :return: Tab separated text, one line per row.
+    """
+    lines = []
+    for row in range(top, bottom + 1):
+        values = [matrix.get(*get_pair_cell(row, col)) for col in range(left, right + 1)]
+        lines.append("\t".join(format_mm(value) if value != 0 else "" for value in values))
+
+    return "\n".join(lines) + "\n"
+
+
+def merge_cells(
+    matrix: ClearanceMatrix, base: ClearanceMatrix, disk: ClearanceMatrix
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """Merge the values read back from the custom rules file into the matrix. Only the
+    cells the file changed since base are looked at. A cell that was not edited since
+    base takes the value from the file, while one edited to something else keeps its
+    value and is returned as a conflict.
+
+    :param matrix: Matrix being edited, updated in place.
+    :param base: Values of the file when it was last loaded or saved.
+    :param disk: Values of the file now.
+    :return: Cells updated from the file, and conflicting cells.
+    """
+    values, base_values, disk_values = matrix.values, base.values, disk.values
+    indices = range(len(values))
+    changed = set(compress(indices, base_values))
+    changed.update(compress(indices, disk_values))
+
+    updated = []
+    conflicts = []
+    for index in sorted(changed):
+        disk_value = disk_values[index]
+        if disk_value == base_values[index] or disk_value == values[index]:
+            continue
+        if values[index] == base_values[index]:
+            values[index] = disk_value
+            updated.append(unpack_index(index))
+        else:
+            conflicts.append(unpack_index(index))
+
+    return updated, conflicts
+
+
+def parse_cell_nm(text: str) -> int:
+    """Get the clearance entered in a cell in nanometres, ignoring any text following
+    the number and its unit.
+
+    :param text: Text entered in the cell, in mm unless it gives another unit.
+    :return: Clearance in nm within MIN and MAX, MIN if no number could be found.
+    """
+    nm = parse_nm(text, MIN_NM, MAX_NM)
+    return MIN_NM if nm is None else nm
+
+
+def parse_cell_value(text: str) -> float:
+    """Get the clearance entered in a cell, ignoring any text following the number and
+    its unit.
+
+    :param text: Text entered in the cell, in mm unless it gives another unit.
+    :return: Clearance in mm exact to the nanometre, or MIN if no number could be found.
+    """
+    return nm_to_mm(parse_cell_nm(text))
+
+
+def parse_cell_values(texts: Iterable[str]) -> list[float]:
+    """Get the clearances of many cells at once, such as the whole grid or the values of
+    the rules. Each distinct text is only parsed once.
+
+    :param texts: Texts entered in the cells.
+    :return: Clearance of each cell in mm, as parse_cell_value gives it.
+    """
+    parsed = {}
+    values = []
+    for text in texts:
+        value = parsed.get(text)
+        if value is None:
+            value = parsed[text] = nm_to_mm(parse_cell_nm(text))
+        values.append(value)
+
+    return values
+
+
+def convert_to_float(val: str) -> float:
+    """Convert a string value to a float, truncated to whole nanometres, which is 6
+    decimal places of a mm. Also check it is within MIN and MAX.
+
+    :param val: String value to convert to float.
+    :return: Float value.
+    """
+    return parse_cell_value(val)
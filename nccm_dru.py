@@ -0,0 +1,1028 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import re
+import stat
+import tempfile
+from array import array
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from nccm_units import VALUE_RE, format_mm
+
+# Section strings
+SECTION_START_STR = "### 4E43434D NCCM SECTION START ###\n"
+SECTION_END_STR = "### 4E43434D NCCM SECTION END ###\n"
+VERSION_STR = "(version 1)\n"
+
+# Outcomes of writing the NCCM section to a file
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+
+# Markers as they appear in the comment tokens of the file
+SECTION_START = SECTION_START_STR.strip().encode()
+SECTION_END = SECTION_END_STR.strip().encode()
+
+# A token is a bracket, a quoted string, a comment running to the end of the line, or an atom
+TOKEN_RE = re.compile(rb'[()]|"[^"\\]*(?:\\.[^"\\]*)*"|#[^\n]*|[^\s()"#][^\s()"]*')
+
+# Top level item, either a comment or a rule laid out the way NCCM writes them. Any other
+# form is left for the general tokenizer. Whitespace is free between all the tokens.
+TOP_LEVEL_RE = re.compile(
+    rb"""\s*(?:
+    (\#[^\n]*)
+    |
+    (\(\s*rule\s+("[^"\\]*(?:\\.[^"\\]*)*"|[^\s()"\#]+)
+    (?:\s*\(\s*severity\s+([^\s()"\#]+)\s*\))?
+    \s*\(\s*condition\s+("[^"\\]*(?:\\.[^"\\]*)*")\s*\)
+    ((?:\s*\(\s*constraint\s+[^\s()"\#]+(?:\s*\(\s*[^\s()"\#]+\s+[^\s()"\#]+\s*\))*\s*\))+)
+    \s*\))
+    )?""",
+    re.X,
+)
+CONSTRAINT_RE = re.compile(
+    rb'\(\s*constraint\s+([^\s()"]+)((?:\s*\(\s*[^\s()"]+\s+[^\s()"]+\s*\))*)\s*\)'
+)
+ARGUMENT_RE = re.compile(rb'\(\s*([^\s()"]+)\s+([^\s()"]+)\s*\)')
+
+# Condition written by NCCM, each side being one class or several OR-ed together
+CLASS_NAME = r"'[^'\\]*(?:\\.[^'\\]*)*'"
+CLASS_SET = (
+    r"\(?\s*{0}\.NetClass\s*==\s*" + CLASS_NAME
+    + r"(?:\s*\|\|\s*{0}\.NetClass\s*==\s*" + CLASS_NAME + r")*\s*\)?"
+)
+CONDITION_RE = re.compile(
+    r"^\s*(" + CLASS_SET.format("A") + r")\s*&&\s*(" + CLASS_SET.format("B") + r")\s*$"
+)
+CLASS_NAME_RE = re.compile(r"'([^'\\]*(?:\\.[^'\\]*)*)'")
+
+# Constraint types the matrix has a layer for, written together in the rule of each pair
+CLEARANCE = "clearance"
+CONSTRAINTS = (CLEARANCE, "hole_clearance", "physical_clearance", "physical_hole_clearance")
+
+# Value of a cell, either its clearance or every (constraint type, minimum) of its pair
+CellValue = Union[float, tuple[tuple[str, float], ...]]
+
+# Rule names
+RULE_PREFIX = "CLR_"
+COMPACT_RULE_PREFIX = "CLR_GROUP_"
+
+# Name at the start of a rule string, and its condition
+RULE_NAME_RE = re.compile(r'\s*\(\s*rule\s+("[^"\\]*(?:\\.[^"\\]*)*")')
+RULE_CONDITION_RE = re.compile(r'\(\s*condition\s+("[^"\\]*(?:\\.[^"\\]*)*")')
+
+# Size of the buffer the rules are written through
+WRITE_BUFFER_SIZE = 1 << 20
+
+OPEN = ord("(")
+CLOSE = ord(")")
+QUOTE = ord('"')
+HASH = ord("#")
+
+
+class DruSyntaxError(ValueError):
+    """Raised when a custom rules file is not a valid s-expression.
+
+    :param offset: Byte offset of the offending token.
+    """
+
+    def __init__(self, message: str, offset: int):
+        super(DruSyntaxError, self).__init__(f"{message} at byte {offset}")
+        self.offset = offset
+
+
+@dataclass
+class DruRule:
+    """A (rule ...) form of a custom rules file.
+
+    :param name: Name of the rule.
+    :param span: Byte offsets of the start and end of the form.
+    :param severity: Severity of the rule, if it has one.
+    :param condition: Condition string of the rule, if it has one.
+    :param constraints: Constraint type mapped to its {"min"/"opt"/"max": value} arguments.
+    :param class_sets: The A and B net classes of an NCCM style condition.
+    """
+
+    name: str
+    span: tuple[int, int]
+    severity: Optional[str] = None
+    condition: Optional[str] = None
+    constraints: dict[str, dict[str, str]] = field(default_factory=dict)
+    class_sets: Optional[tuple[tuple[str, ...], tuple[str, ...]]] = None
+
+    @property
+    def class_pair(self) -> Optional[tuple[str, str]]:
+        """The two net classes of a rule naming a single pair."""
+        if self.class_sets is None:
+            return None
+
+        classes_a, classes_b = self.class_sets
+        if len(classes_a) != 1 or len(classes_b) != 1:
+            return None
+
+        return classes_a[0], classes_b[0]
+
+    def class_pairs(self) -> list[tuple[str, str]]:
+        """Every pair of net classes the rule applies to.
+
+        :return: List of (A, B) class pairs.
+        """
+        if self.class_sets is None:
+            return []
+
+        classes_a, classes_b = self.class_sets
+        return [(class_a, class_b) for class_a in classes_a for class_b in classes_b]
+
+    @property
+    def key(self) -> tuple[str, Optional[str]]:
+        """What the rule is matched to a new rule string by, as get_rule_key gives it."""
+        return self.name, self.condition
+
+    @property
+    def clearance(self) -> Optional[tuple[str, str]]:
+        """Minimum clearance of the rule split into its number and unit."""
+        return self.get_min(CLEARANCE)
+
+    def get_min(self, constraint: str) -> Optional[tuple[str, str]]:
+        """Get the minimum of one of the constraints of the rule.
+
+        :param constraint: Constraint type, such as "hole_clearance".
+        :return: Minimum split into its number and unit, None if the rule has none.
+        """
+        value = self.constraints.get(constraint, {}).get("min")
+        if value is None:
+            return None
+
+        match = VALUE_RE.fullmatch(value)
+        if not match:
+            return None
+
+        return match.group(1), match.group(2) or ""
+
+
+@dataclass
+class DruFile:
+    """Parsed contents of a custom rules file.
+
+    :param version: Version number of the file, if it declares one.
+    :param section_span: Byte offsets of the NCCM section, marker lines included.
+    :param nccm_rules: Rules found in the NCCM section.
+    :param other_rules: Every rule outside of the NCCM section.
+    """
+
+    version: Optional[int] = None
+    section_span: Optional[tuple[int, int]] = None
+    nccm_rules: list[DruRule] = field(default_factory=list)
+    other_rules: list[DruRule] = field(default_factory=list)
+
+
+def unquote(token: bytes) -> str:
+    """Decode a quoted string token.
+
+    :param token: Token including the surrounding quotes.
+    :return: String contents.
+    """
+    text = token[1:-1].decode("utf-8")
+    if "\\" in text:
+        text = re.sub(r"\\(.)", r"\1", text)
+    return text
+
+
+def parse_dru(data: bytes) -> DruFile:
+    """Parse the contents of a custom rules file in a single pass. Rules in the layout
+    NCCM writes are matched as a whole, every other form goes through the tokenizer.
+
+    :param data: Raw file contents.
+    :return: The parsed file.
+    """
+    dru = DruFile()
+    section_start = None
+    rules = dru.other_rules
+    size = len(data)
+    pos = 0
+
+    # Severities, constraint types and values repeat across rules so are only decoded once
+    atoms = {}
+
+    while True:
+        match = TOP_LEVEL_RE.match(data, pos)
+        pos = match.end()
+
+        comment, name, severity, condition, constraints = match.group(1, 3, 4, 5, 6)
+        if comment is not None:
+            if comment.startswith(SECTION_START) and section_start is None:
+                section_start = data.rfind(b"\n", 0, match.start(1)) + 1
+                rules = dru.nccm_rules
+            elif comment.startswith(SECTION_END) and section_start is not None:
+                end = data.find(b"\n", pos)
+                end = size if end == -1 else end + 1
+                if dru.section_span is None:
+                    dru.section_span = (section_start, end)
+                section_start = None
+                rules = dru.other_rules
+            continue
+
+        if name is not None:
+            rule = DruRule(
+                name=unquote(name) if name[0] == QUOTE else name.decode("utf-8"),
+                span=match.span(2),
+            )
+            if severity is not None:
+                rule.severity = atoms.get(severity) or atoms.setdefault(
+                    severity, severity.decode("utf-8")
+                )
+            set_condition(rule, unquote(condition))
+            for constraint_type, arguments in CONSTRAINT_RE.findall(constraints):
+                args = {}
+                for key, value in ARGUMENT_RE.findall(arguments):
+                    args[atoms.get(key) or atoms.setdefault(key, key.decode("utf-8"))] = (
+                        atoms.get(value) or atoms.setdefault(value, value.decode("utf-8"))
+                    )
+                rule.constraints[
+                    atoms.get(constraint_type)
+                    or atoms.setdefault(constraint_type, constraint_type.decode("utf-8"))
+                ] = args
+            rules.append(rule)
+            continue
+
+        if pos >= size:
+            break
+
+        if data[pos] != OPEN:
+            raise DruSyntaxError("Unexpected token outside of a form", pos)
+
+        form, span = tokenize_form(data, pos)
+        add_form(dru, form, span, section_start)
+        pos = span[1]
+
+    # An unterminated section runs to the end of the file
+    if section_start is not None and dru.section_span is None:
+        dru.section_span = (section_start, size)
+
+    return dru
+
+
+def tokenize_form(data: bytes, pos: int) -> tuple[list, tuple[int, int]]:
+    """Tokenize the form starting at an opening bracket into nested lists.
+
+    :param data: Raw file contents.
+    :param pos: Offset of the opening bracket.
+    :return: The form and its byte offsets.
+    """
+    stack = []
+    current = None
+
+    for match in TOKEN_RE.finditer(data, pos):
+        token = match.group()
+        first = token[0]
+
+        if first == OPEN:
+            if current is not None:
+                stack.append(current)
+            current = []
+        elif first == CLOSE:
+            if not stack:
+                return current, (pos, match.end())
+            parent = stack.pop()
+            parent.append(current)
+            current = parent
+        elif first == HASH:
+            continue
+        elif first == QUOTE:
+            current.append(unquote(token))
+        else:
+            current.append(token.decode("utf-8"))
+
+    raise DruSyntaxError("Unterminated form", pos)
+
+
+def add_form(dru: DruFile, form: list, span: tuple[int, int], section_start: Optional[int]):
+    """Add a tokenized top level form to the parsed file.
+
+    :param dru: File being parsed.
+    :param form: Nested list of the form tokens.
+    :param span: Byte offsets of the form.
+    :param section_start: Start of the NCCM section if the form is inside of it.
+    """
+    if not form:
+        return
+
+    if form[0] == "version" and len(form) > 1:
+        try:
+            dru.version = int(form[1])
+        except (TypeError, ValueError):
+            raise DruSyntaxError("Invalid version", span[0])
+    elif form[0] == "rule" and len(form) > 1:
+        rule = DruRule(name=str(form[1]), span=span)
+        for item in form[2:]:
+            if not isinstance(item, list) or not item:
+                continue
+            if item[0] == "severity" and len(item) > 1:
+                rule.severity = item[1]
+            elif item[0] == "condition" and len(item) > 1:
+                set_condition(rule, item[1])
+            elif item[0] == "constraint" and len(item) > 1:
+                rule.constraints[item[1]] = {
+                    arg[0]: arg[1]
+                    for arg in item[2:]
+                    if isinstance(arg, list) and len(arg) > 1
+                }
+        add_rule(dru, rule, section_start)
+
+
+def set_condition(rule: DruRule, condition: str):
+    """Set the condition of a rule and the class pair it names, if it has the NCCM layout.
+
+    :param rule: Rule to set the condition of.
+    :param condition: Condition string.
+    """
+    rule.condition = condition
+    match = CONDITION_RE.match(condition)
+    if match:
+        rule.class_sets = (
+            tuple(unescape_class(name) for name in CLASS_NAME_RE.findall(match.group(1))),
+            tuple(unescape_class(name) for name in CLASS_NAME_RE.findall(match.group(2))),
+        )
+
+
+def unescape_class(name: str) -> str:
+    """Remove the escaping from a class name in a condition.
+
+    :param name: Class name as it appears between the quotes.
+    :return: Class name.
+    """
+    if "\\" in name:
+        name = re.sub(r"\\(.)", r"\1", name)
+    return name
+
+
+def add_rule(dru: DruFile, rule: DruRule, section_start: Optional[int]):
+    """Add a rule to the NCCM or to the other rules of the file.
+
+    :param dru: File being parsed.
+    :param rule: Parsed rule.
+    :param section_start: Start of the NCCM section if the rule is inside of it.
+    """
+    if section_start is not None:
+        dru.nccm_rules.append(rule)
+    else:
+        dru.other_rules.append(rule)
+
+
+def get_class_val_dict(dru: DruFile, constraint: str = CLEARANCE) -> dict[tuple, str]:
+    """Get the class pairs and their clearance value from the NCCM section.
+
+    :param dru: Parsed custom rules file.
+    :param constraint: Constraint type to read the minimum of.
+    :return: A dict with the classes and their corresponding value as key-value pairs.
+    """
+    class_val_dict = {}
+    for rule in dru.nccm_rules:
+        value = rule.get_min(constraint)
+        if value is None:
+            continue
+        for class_pair in rule.class_pairs():
+            class_val_dict[class_pair] = value[0] + value[1]
+
+    return class_val_dict
+
+
+def get_layer_val_dicts(
+    dru: DruFile, constraints: Iterable[str] = CONSTRAINTS
+) -> dict[str, dict[tuple, str]]:
+    """Get the class pairs and their value for every constraint type from the NCCM
+    section, in a single pass over its rules.
+
+    :param dru: Parsed custom rules file.
+    :param constraints: Constraint types to read the minimum of.
+    :return: Constraint type mapped to the class pairs and their value, as given by
+        get_class_val_dict.
+    """
+    layer_val_dicts = {constraint: {} for constraint in constraints}
+    for rule in dru.nccm_rules:
+        class_pairs = None
+        for constraint, class_val_dict in layer_val_dicts.items():
+            value = rule.get_min(constraint)
+            if value is None:
+                continue
+            if class_pairs is None:
+                class_pairs = rule.class_pairs()
+            for class_pair in class_pairs:
+                class_val_dict[class_pair] = value[0] + value[1]
+
+    return layer_val_dicts
+
+
+def remove_section(data: bytes, dru: DruFile) -> bytes:
+    """Get the file contents without the NCCM section.
+
+    :param data: Raw file contents.
+    :param dru: Parsed file contents.
+    :return: File contents minus the section.
+    """
+    if dru.section_span is None:
+        return data
+
+    start, end = dru.section_span
+    return data[:start] + data[end:]
+
+
+def read_dru(path: str) -> tuple[bytes, DruFile]:
+    """Read and parse a custom rules file.
+
+    :param path: Path to the .kicad_dru file.
+    :return: Raw file contents and the parsed file.
+    """
+    f_read = open(path, "rb")
+    data = f_read.read()
+    f_read.close()
+
+    return data, parse_dru(data)
+
+
+def get_rule_string(name: str, condition: str, value: CellValue) -> str:
+    """Get the string of a single rule, holding one constraint clause per constraint
+    type so that a pair needs a single rule whatever the number of its constraints.
+
+    :param name: Name of the rule.
+    :param condition: Condition of the rule.
+    :param value: Minimum clearance in mm, or (constraint type, minimum in mm) pairs.
+    :return: Rule string.
+    """
+    if not isinstance(value, tuple):
+        value = ((CLEARANCE, value),)
+    constraints = "".join(
+        f"  (constraint {constraint} (min {format_mm(minimum)}mm))\n"
+        for constraint, minimum in value
+    )
+    return f"\n(rule \"{name}\"\n  (severity error)\n  (condition \"{condition}\")\n{constraints})\n"
+
+
+def escape_quoted(text: str) -> str:
+    """Escape text to be placed between double quotes, the inverse of unquote.
+
+    :param text: Text to escape.
+    :return: Escaped text.
+    """
+    if "\\" in text or '"' in text:
+        text = text.replace("\\", "\\\\").replace('"', '\\"')
+    return text
+
+
+def escape_class(name: str) -> str:
+    """Escape a class name to be placed between the single quotes of a condition, the
+    inverse of unescape_class.
+
+    :param name: Class name.
+    :return: Escaped class name.
+    """
+    if "\\" in name or "'" in name:
+        name = name.replace("\\", "\\\\").replace("'", "\\'")
+    return name
+
+
+def get_class_condition(letter: str, class_names: list[str]) -> str:
+    """Get the part of a condition matching one of the two items against a set of classes.
+
+    :param letter: "A" or "B".
+    :param class_names: Classes any of which the item can belong to, already escaped.
+    :return: Condition string.
+    """
+    tests = [f"{letter}.NetClass == '{name}'" for name in class_names]
+    if len(tests) == 1:
+        return tests[0]
+
+    return "(" + " || ".join(tests) + ")"
+
+
+def iter_rule_strings(
+    class_names: list[str],
+    cells: Iterable[tuple[tuple[int, int], CellValue]],
+    compact: bool = False,
+) -> Iterator[str]:
+    """Generate the rule strings for the non-zero cells of the matrix one at a time. The
+    class names are escaped once each rather than once per pair.
+
+    :param class_names: Net class names indexed by row/column.
+    :param cells: ((row, col), value) pairs of the cells to write, each value being a
+        clearance or every (constraint type, minimum) pair of the cell.
+    :param compact: Group the pairs sharing a clearance into as few rules as possible.
+    :return: Iterator of rule strings.
+    """
+    if compact:
+        yield from iter_compact_rule_strings(class_names, cells)
+        return
+
+    names = [escape_quoted(name) for name in class_names]
+    conditions = [escape_quoted(escape_class(name)) for name in class_names]
+    for (row, col), value in cells:
+        yield get_rule_string(
+            f"{RULE_PREFIX}{names[row]}_to_{names[col]}",
+            f"A.NetClass == '{conditions[row]}' && B.NetClass == '{conditions[col]}'",
+            value,
+        )
+
+
+def get_rule_strings(
+    class_names: list[str],
+    cells: Iterable[tuple[tuple[int, int], CellValue]],
+    compact: bool = False,
+) -> list[str]:
+    """Get the rule strings for the non-zero cells of the matrix all at once, for the
+    tests and benchmarks. The plugin streams them from iter_rule_strings.
+
+    :param class_names: Net class names indexed by row/column.
+    :param cells: ((row, col), value) pairs of the cells to write.
+    :param compact: Group the pairs sharing a clearance into as few rules as possible.
+    :return: List of rule strings.
+    """
+    return list(iter_rule_strings(class_names, cells, compact))
+
+
+def iter_compact_rule_strings(
+    class_names: list[str], cells: Iterable[tuple[tuple[int, int], CellValue]]
+) -> Iterator[str]:
+    """Generate the rule strings with the pairs sharing a clearance grouped together.
+    Pairs with several constraints are only grouped with pairs having the same ones.
+
+    For each clearance the classes are grouped two ways, keeping whichever gives fewer
+    rules. Either the rows with the same set of columns share a rule, or, as pairs are
+    unordered, the classes with the same set of partner classes share one. Every pair
+    a condition matches is a cell with that clearance, so reading the rules back gives
+    the same matrix.
+
+    :param class_names: Net class names indexed by row/column.
+    :param cells: ((row, col), value) pairs of the cells to write.
+    :return: Iterator of rule strings.
+    """
+    conditions = [escape_quoted(escape_class(name)) for name in class_names]
+
+    # Clearance -> row -> columns with that clearance, in order of appearance
+    value_rows = {}
+    for (row, col), value in cells:
+        value_rows.setdefault(value, {}).setdefault(row, []).append(col)
+
+    rule_count = 0
+    for value, rows in value_rows.items():
+        # Rows sharing the exact same columns
+        row_groups = {}
+        for row, cols in rows.items():
+            row_groups.setdefault(tuple(sorted(cols)), []).append(row)
+
+        # Classes sharing the exact same partners, looking at both sides of each pair
+        partners = {}
+        for row, cols in rows.items():
+            for col in cols:
+                partners.setdefault(row, set()).add(col)
+                partners.setdefault(col, set()).add(row)
+        partner_groups = {}
+        for pos in sorted(partners):
+            partner_groups.setdefault(tuple(sorted(partners[pos])), []).append(pos)
+
+        groups = partner_groups if len(partner_groups) < len(row_groups) else row_groups
+        for cols, group_rows in groups.items():
+            condition = (
+                get_class_condition("A", [conditions[row] for row in group_rows])
+                + " && "
+                + get_class_condition("B", [conditions[col] for col in cols])
+            )
+            rule_count += 1
+            yield get_rule_string(f"{COMPACT_RULE_PREFIX}{rule_count}", condition, value)
+
+
+def is_compact(dru: DruFile) -> bool:
+    """Check if the NCCM section was written with grouped rules.
+
+    :param dru: Parsed custom rules file.
+    :return: True if any rule of the section is a group.
+    """
+    return any(rule.name.startswith(COMPACT_RULE_PREFIX) for rule in dru.nccm_rules)
+
+
+def iter_section(rule_strings: Iterable[str]) -> Iterator[bytes]:
+    """Generate the NCCM section from its rules, piece by piece.
+
+    :param rule_strings: Rule strings to place in the section.
+    :return: Iterator of the encoded marker lines and rules.
+    """
+    yield SECTION_START_STR.encode("utf-8")
+    for rule_string in rule_strings:
+        yield rule_string.encode("utf-8")
+    yield SECTION_END_STR.encode("utf-8")
+
+
+def build_section(rule_strings: Iterable[str]) -> bytes:
+    """Build the NCCM section from its rules, for the tests and benchmarks to compare a
+    file with. The plugin writes the section rule by rule with update_rules.
+
+    :param rule_strings: Rule strings to place in the section.
+    :return: Section contents, marker lines included.
+    """
+    return b"".join(iter_section(rule_strings))
+
+
+def find_section(data: bytes) -> Optional[tuple[int, int]]:
+    """Find the NCCM section of a custom rules file without parsing the rest of it.
+
+    :param data: Raw file contents.
+    :return: Byte offsets of the section as parse_dru gives them, None if there is none.
+    """
+    start = data.find(SECTION_START)
+    if start == -1:
+        return None
+
+    end = data.find(SECTION_END, start)
+    if end == -1:
+        return data.rfind(b"\n", 0, start) + 1, len(data)
+
+    end = data.find(b"\n", end)
+    return data.rfind(b"\n", 0, start) + 1, len(data) if end == -1 else end + 1
+
+
+def write_atomic(path: str, data: bytes):
+    """Write a file in one go through a temporary file that then replaces it, so that
+    the file is either fully written or left as it was.
+
+    :param path: Path of the file to write.
+    :param data: New file contents.
+    """
+    write_chunks_atomic(path, [data])
+
+
+def get_new_file_mode() -> int:
+    """Get the permissions open() gives a new file, those of the umask of the process.
+
+    :return: Permission bits.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_chunks_atomic(
+    path: str, chunks: Iterable[bytes], is_unchanged: Optional[Callable[[], bool]] = None
+) -> bool:
+    """Write a file piece by piece through a buffered temporary file that then replaces
+    it, so that the file is either fully written or left as it was. The pieces are never
+    all held in memory at once. A symbolic link is followed so that the file it points
+    to is the one replaced, and the file keeps its permissions.
+
+    :param path: Path of the file to write.
+    :param chunks: New file contents, piece by piece.
+    :param is_unchanged: Called once all pieces are written, the file is left as it was
+        if it returns True.
+    :return: True if the file was replaced.
+    """
+    path = os.path.realpath(path)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = get_new_file_mode()
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix="." + os.path.basename(path), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb", buffering=WRITE_BUFFER_SIZE) as f_write:
+            for chunk in chunks:
+                f_write.write(chunk)
+
+            keep = is_unchanged is not None and is_unchanged()
+            if not keep:
+                f_write.flush()
+                os.fsync(f_write.fileno())
+
+        if keep:
+            os.remove(temp_path)
+            return False
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return True
+
+
+class SectionComparer:
+    """Compares the pieces of a new section with the old section as they go past,
+    without keeping them.
+
+    :param old: Old section contents.
+    :param pos: Length of the new section so far.
+    :param same: False once the new section differs from the old one.
+    """
+
+    def __init__(self, old: Optional[bytes]):
+        self.old = old
+        self.pos = 0
+        self.same = old is not None
+
+    def compare(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass the pieces of the new section through, comparing them on the way.
+
+        :param chunks: New section contents piece by piece.
+        :return: Iterator of the same pieces.
+        """
+        for chunk in chunks:
+            if self.same:
+                self.same = self.old[self.pos : self.pos + len(chunk)] == chunk
+            self.pos += len(chunk)
+            yield chunk
+
+    def is_unchanged(self) -> bool:
+        """Check if the new section turned out the same as the old one.
+
+        :return: True if both are the same.
+        """
+        return self.same and self.pos == len(self.old)
+
+
+@dataclass
+class RuleChanges:
+    """Rules of the NCCM section touched by an update.
+
+    :param added: Rules that were not in the section.
+    :param changed: Rules rewritten in place with new contents.
+    :param removed: Rules no longer generated.
+    :param kept: Rules left exactly as they were.
+    """
+
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    kept: int = 0
+
+    @property
+    def rule_count(self) -> int:
+        """Number of rules in the section after the update."""
+        return self.added + self.changed + self.kept
+
+    def summary(self) -> str:
+        """Describe the changes for the user.
+
+        :return: Counts of the added, changed and removed rules.
+        """
+        return f"{self.added} added, {self.changed} changed, {self.removed} removed"
+
+
+def get_rule_key(rule_string: str) -> tuple[str, Optional[str]]:
+    """Get what a rule string is matched to the rules on disk by, as DruRule.key gives it.
+    That is its name and its condition. The condition is unique to each class pair or
+    group, while two pairs can share a name, such as A with B_to_C and A_to_B with C.
+
+    :param rule_string: Rule string, such as one of iter_rule_strings.
+    :return: Name and condition of the rule, None for a rule without a condition.
+    """
+    match = RULE_NAME_RE.match(rule_string)
+    if match is None:
+        raise ValueError(f"Not a rule: {rule_string[:40]!r}")
+
+    name = unquote(match.group(1).encode("utf-8"))
+    condition = RULE_CONDITION_RE.search(rule_string, match.end())
+    if condition is None:
+        return name, None
+    return name, unquote(condition.group(1).encode("utf-8"))
+
+
+def write_rules(path: str, rule_strings: Iterable[str]) -> tuple[str, int]:
+    """Stream rules into the NCCM section of a custom rules file as they are generated,
+    rewriting only the rules that changed, as update_rules does.
+
+    :param path: Path to the .kicad_dru file.
+    :param rule_strings: Rule strings, such as those of iter_rule_strings.
+    :return: CREATED, UPDATED or UNCHANGED, and the number of rules written.
+    """
+    status, changes = update_rules(path, rule_strings)
+    return status, changes.rule_count
+
+
+def update_rules(path: str, rule_strings: Iterable[str]) -> tuple[str, RuleChanges]:
+    """Update the NCCM section of a custom rules file rule by rule. Rules are matched to
+    the ones on disk by name and condition, see get_rule_key. The bytes of the rules that are the same are copied as they
+    are, changed rules are rewritten where they stand and new ones go at the end of the
+    section, so the file only differs where the rules did. The file is still replaced
+    as a whole, and not at all when no rule changed.
+
+    :param path: Path to the .kicad_dru file.
+    :param rule_strings: Rule strings, such as those of iter_rule_strings.
+    :return: CREATED, UPDATED or UNCHANGED, and the rules touched.
+    """
+    changes = RuleChanges()
+
+    def counted() -> Iterator[str]:
+        for rule_string in rule_strings:
+            changes.added += 1
+            yield rule_string
+
+    if not os.path.exists(path):
+        write_chunks_atomic(path, chain([VERSION_STR.encode()], iter_section(counted())))
+        return CREATED, changes
+
+    data, dru = read_dru(path)
+
+    # Without a complete section to patch the whole section is written as before
+    end_line = get_section_end_line(data, dru)
+    if end_line is None:
+        changes.removed = len(dru.nccm_rules)
+        return replace_section(data, dru, path, iter_section(counted())), changes
+
+    old_rules = dru.nccm_rules
+    old_index = {}
+    for index, rule in enumerate(old_rules):
+        old_index.setdefault(rule.key, index)
+
+    kept = bytearray(len(old_rules))
+    changed = array("q", [-1]) * (2 * len(old_rules))
+    added = array("q")
+
+    # The new text of the changed and added rules can be as large as the section, so it
+    # waits on disk past a point, and only its place in the file is kept
+    spool = tempfile.SpooledTemporaryFile(max_size=WRITE_BUFFER_SIZE)
+    try:
+        for rule_string in rule_strings:
+            index = old_index.pop(get_rule_key(rule_string), None)
+            if index is None:
+                start = spool.tell()
+                spool.write(rule_string.encode("utf-8"))
+                # Runs of added rules are kept as one span
+                if added and added[-1] == start:
+                    added[-1] = spool.tell()
+                else:
+                    added.extend((start, spool.tell()))
+                changes.added += 1
+                continue
+
+            start, end = old_rules[index].span
+            text = rule_string.strip().encode("utf-8")
+            if end - start == len(text) and data.startswith(text, start):
+                kept[index] = 1
+                changes.kept += 1
+            else:
+                changed[2 * index] = spool.tell()
+                spool.write(text)
+                changed[2 * index + 1] = spool.tell()
+                changes.changed += 1
+
+        changes.removed = len(old_rules) - changes.kept - changes.changed
+        if dru.version is not None and not (changes.added or changes.changed or changes.removed):
+            return UNCHANGED, changes
+
+        chunks = iter_patched_section(data, dru, end_line, kept, spool, changed, added)
+        if dru.version is None:
+            chunks = chain([VERSION_STR.encode()], chunks)
+        write_chunks_atomic(path, chunks)
+    finally:
+        spool.close()
+
+    return UPDATED, changes
+
+
+def get_section_end_line(data: bytes, dru: DruFile) -> Optional[int]:
+    """Find the start of the end marker line of the NCCM section, if the section can be
+    patched rule by rule.
+
+    :param data: Raw file contents.
+    :param dru: Parsed file contents.
+    :return: Offset of the end marker line, None if there is no section, it has no end
+        marker or NCCM rules lie outside of it.
+    """
+    if dru.section_span is None:
+        return None
+
+    start, end = dru.section_span
+    marker = data.rfind(SECTION_END, start, end)
+    if marker == -1:
+        return None
+
+    end_line = data.rfind(b"\n", start, marker) + 1
+    if any(rule.span[0] < start or rule.span[1] > end_line for rule in dru.nccm_rules):
+        return None
+
+    return end_line
+
+
+def iter_spooled(spool, start: int, end: int) -> Iterator[bytes]:
+    """Read part of a file in pieces of at most WRITE_BUFFER_SIZE bytes.
+
+    :param spool: File to read.
+    :param start: Offset of the part.
+    :param end: Offset of the end of the part.
+    :return: Iterator of the pieces of the part.
+    """
+    while start < end:
+        spool.seek(start)
+        chunk = spool.read(min(end - start, WRITE_BUFFER_SIZE))
+        if not chunk:
+            return
+        start += len(chunk)
+        yield chunk
+
+
+def iter_patched_section(
+    data: bytes,
+    dru: DruFile,
+    end_line: int,
+    kept: bytearray,
+    spool,
+    changed: array,
+    added: array,
+) -> Iterator[bytes]:
+    """Generate the file with its NCCM section patched, copying everything else.
+
+    :param data: Raw file contents.
+    :param dru: Parsed file contents.
+    :param end_line: Offset of the end marker line of the section.
+    :param kept: 1 for each NCCM rule to keep as it is.
+    :param spool: File holding the new text of the changed and added rules.
+    :param changed: Start and end in spool of the new text of each NCCM rule, -1 for the
+        rules that did not change.
+    :param added: Starts and ends in spool of the runs of new rules, to place at the end
+        of the section.
+    :return: Iterator of the pieces of the file.
+    """
+    view = memoryview(data)
+    pos = 0
+    for index, rule in enumerate(dru.nccm_rules):
+        start, end = rule.span
+        # A rule owns the line break after it, so removing it leaves no blank line
+        line_end = end + 1 if data[end : end + 1] == b"\n" else end
+
+        if kept[index]:
+            yield view[pos:line_end]
+        elif changed[2 * index] != -1:
+            yield view[pos:start]
+            yield from iter_spooled(spool, changed[2 * index], changed[2 * index + 1])
+            yield view[end:line_end]
+        else:
+            # Only the blank lines before a removed rule go with it, comments stay
+            gap_end = pos + len(data[pos:start].rstrip())
+            if gap_end > pos:
+                newline = data.find(b"\n", gap_end, start)
+                yield view[pos : gap_end if newline == -1 else newline + 1]
+        pos = line_end
+
+    yield view[pos:end_line]
+    for run in range(0, len(added), 2):
+        yield from iter_spooled(spool, added[run], added[run + 1])
+    yield view[end_line:]
+
+
+def replace_section(data: bytes, dru: DruFile, path: str, section_chunks: Iterable[bytes]) -> str:
+    """Write a file with its NCCM section replaced where it is, or appended at the end of
+    the file if it has none. Nothing is written when the section comes out the same.
+
+    :param data: Raw file contents.
+    :param dru: Parsed file contents.
+    :param path: Path to the .kicad_dru file.
+    :param section_chunks: New section contents piece by piece, marker lines included.
+    :return: UPDATED or UNCHANGED.
+    """
+    prefix = b"" if dru.version is not None else VERSION_STR.encode()
+    if dru.section_span is None:
+        old = None
+        before, after = prefix + data, b""
+        if before and not before.endswith(b"\n"):
+            before += b"\n"
+    else:
+        start, end = dru.section_span
+        old = data[start:end] if dru.version is not None else None
+        before, after = prefix + data[:start], data[end:]
+
+    comparer = SectionComparer(old)
+    chunks = chain([before], comparer.compare(section_chunks), [after])
+    if write_chunks_atomic(path, chunks, comparer.is_unchanged):
+        return UPDATED
+    return UNCHANGED
+
+
+def remove_section_from_file(path: str) -> bool:
+    """Remove the NCCM section from a custom rules file.
+
+    :param path: Path to the .kicad_dru file.
+    :return: True if a section was found and removed.
+    """
+    data, dru = read_dru(path)
+    if dru.section_span is None:
+        return False
+
+    write_atomic(path, remove_section(data, dru))
+    return True
@@ -0,0 +1,405 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Stand-in for the parts of kipy used by the NCCM, serving projects from disk so that
+the dialog can be driven without KiCad running. It is used instead of kipy when
+NCCM_FAKE_KICAD is set to one of:
+
+    path/to/project         a project directory or .kicad_pro file
+    synthetic:N             a generated project of N net classes, in a temporary directory
+    synthetic:N:R           the same with R clearance rules already in its custom rules
+    synthetic:N:R:T         the same with T random tracks on its board
+    no-kicad                KiCad is not running
+    no-board                KiCad is running without a board open
+
+Every call that would go to KiCad sleeps for NCCM_FAKE_LATENCY_MS first. The board only
+has the tracks and vias of the .kicad_pcb file, its pads and zones are left out.
+"""
+
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+from nccm_core import DEFAULT_CLASS, NM_PER_MM, Project as ProjectFile
+from nccm_dru import iter_rule_strings, write_atomic, write_rules
+
+FAKE_KICAD_ENV = "NCCM_FAKE_KICAD"
+FAKE_LATENCY_ENV = "NCCM_FAKE_LATENCY_MS"
+SYNTHETIC_PREFIX = "synthetic:"
+NO_KICAD = "no-kicad"
+NO_BOARD = "no-board"
+SYNTHETIC_NAME = "synthetic"
+
+# Layer numbers of the copper layers of the board, inner layer n being F_CU + n
+F_CU = 3
+B_CU = 34
+
+# Size of the synthetic board per track, in mm
+SYNTHETIC_AREA_PER_TRACK = 4.0
+
+# Top level net declarations, tracks and vias of a .kicad_pcb file
+PCB_NET_RE = re.compile(rb'^\s*\(net (\d+) "((?:[^"\\]|\\.)*)"\)', re.MULTILINE)
+PCB_TRACK_RE = re.compile(
+    rb"\((segment|arc)\s+\(start ([-\d.]+) ([-\d.]+)\)\s*(?:\(mid ([-\d.]+) ([-\d.]+)\)\s*)?"
+    rb'\(end ([-\d.]+) ([-\d.]+)\)\s*\(width ([\d.]+)\)\s*\(layer "([^"]+)"\)\s*'
+    rb'\(net (\d+)\)\s*\(uuid "([^"]+)"\)'
+)
+PCB_VIA_RE = re.compile(
+    rb"\(via\s+\(at ([-\d.]+) ([-\d.]+)\)\s*\(size ([\d.]+)\)(?:\s*\((?!net )[^()]*\))*\s*"
+    rb'\(net (\d+)\)\s*\(uuid "([^"]+)"\)'
+)
+
+
+class ConnectionError(Exception):
+    """Raised when KiCad is not running, as kipy.errors.ConnectionError."""
+
+
+class ApiError(Exception):
+    """Raised when KiCad cannot answer a request, as kipy.errors.ApiError."""
+
+
+# Same layout as kipy, so that "from nccm_fake import errors" matches "from kipy import errors"
+errors = SimpleNamespace(ConnectionError=ConnectionError, ApiError=ApiError)
+
+# Generated projects by their NCCM_FAKE_KICAD value, so each is only generated once
+synthetic_projects = {}
+
+
+def is_enabled() -> bool:
+    """Check if the stand-in should be used instead of kipy.
+
+    :return: True if NCCM_FAKE_KICAD is set.
+    """
+    return bool(os.environ.get(FAKE_KICAD_ENV))
+
+
+def simulate_latency():
+    """Wait as long as a round trip to KiCad is set to take."""
+    latency_ms = float(os.environ.get(FAKE_LATENCY_ENV) or 0)
+    if latency_ms > 0:
+        time.sleep(latency_ms / 1000)
+
+
+def write_synthetic_project(
+    directory: str, class_count: int, rule_count: int = 0, track_count: int = 0, seed: int = 0
+) -> str:
+    """Generate a project of class_count net classes, the first being the Default class.
+    Every fourth class has a clearance of its own and rule_count random class pairs
+    get an NCCM rule. Each class has a net of its own, and the board has track_count
+    random tracks of these nets and a via for every tenth track.
+
+    :param directory: Directory to write the project to, created if needed.
+    :param class_count: Number of net classes.
+    :param rule_count: Number of class pairs with a rule.
+    :param track_count: Number of tracks on the board.
+    :param seed: Seed of the random clearances and tracks.
+    :return: Path of the .kicad_pro file.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    classes = [{"name": "Default", "clearance": 0.2}]
+    for index in range(1, class_count):
+        net_class = {"name": f"CLASS_{index:04d}"}
+        if index % 4 == 0:
+            net_class["clearance"] = round(rng.uniform(0.1, 0.5), 3)
+        classes.append(net_class)
+
+    pro_path = os.path.join(directory, SYNTHETIC_NAME + ".kicad_pro")
+    settings = {"meta": {"filename": SYNTHETIC_NAME + ".kicad_pro", "version": 3}}
+    settings["net_settings"] = {
+        "classes": classes,
+        "meta": {"version": 4},
+        "netclass_assignments": {
+            get_synthetic_net(index): [net_class["name"]] for index, net_class in enumerate(classes)
+        },
+    }
+    write_atomic(pro_path, json.dumps(settings, indent=2).encode("utf-8"))
+
+    pair_count = class_count * (class_count + 1) // 2
+    cells = {}
+    for _ in range(min(rule_count, pair_count)):
+        while True:
+            row, col = sorted((rng.randrange(class_count), rng.randrange(class_count)))
+            if (row, col) not in cells:
+                break
+        cells[(row, col)] = round(rng.uniform(0.6, 5.0), 3)
+
+    if cells:
+        class_names = [net_class["name"] for net_class in classes]
+        dru_path = os.path.join(directory, SYNTHETIC_NAME + ".kicad_dru")
+        if os.path.exists(dru_path):
+            os.remove(dru_path)
+        write_rules(dru_path, iter_rule_strings(class_names, sorted(cells.items())))
+
+    if track_count:
+        pcb_path = os.path.join(directory, SYNTHETIC_NAME + ".kicad_pcb")
+        write_atomic(pcb_path, get_synthetic_board(rng, class_count, track_count))
+
+    return pro_path
+
+
+def get_synthetic_net(index: int) -> str:
+    """Get the name of the net of a synthetic net class.
+
+    :param index: Row/column of the class.
+    :return: Net name.
+    """
+    return f"NET_{index:04d}"
+
+
+def get_synthetic_board(rng: random.Random, class_count: int, track_count: int) -> bytes:
+    """Generate a .kicad_pcb file of random tracks and vias, spread over a square board
+    of SYNTHETIC_AREA_PER_TRACK mm² per track.
+
+    :param rng: Random number generator.
+    :param class_count: Number of net classes, each with a net.
+    :param track_count: Number of tracks.
+    :return: Contents of the file.
+    """
+    side = (track_count * SYNTHETIC_AREA_PER_TRACK) ** 0.5
+    lines = ["(kicad_pcb", '\t(net 0 "")']
+    lines += [f'\t(net {index + 1} "{get_synthetic_net(index)}")' for index in range(class_count)]
+
+    for count in range(track_count):
+        net = rng.randrange(class_count) + 1
+        x, y = rng.uniform(0, side), rng.uniform(0, side)
+        length, angle = rng.uniform(0.5, 5.0), rng.choice((0, 45, 90, 135))
+        end_x = x + length * math.cos(math.radians(angle))
+        end_y = y + length * math.sin(math.radians(angle))
+        layer = rng.choice(("F.Cu", "B.Cu"))
+        lines.append(
+            f"\t(segment (start {x:.4f} {y:.4f}) (end {end_x:.4f} {end_y:.4f})"
+            f' (width {rng.uniform(0.1, 0.5):.3f}) (layer "{layer}") (net {net})'
+            f' (uuid "00000000-0000-0000-0000-{count:012d}"))'
+        )
+        if count % 10 == 0:
+            lines.append(
+                f'\t(via (at {end_x:.4f} {end_y:.4f}) (size 0.6) (drill 0.3)'
+                f' (layers "F.Cu" "B.Cu") (net {net})'
+                f' (uuid "00000000-0000-0000-0001-{count:012d}"))'
+            )
+
+    lines.append(")\n")
+    return "\n".join(lines).encode("utf-8")
+
+
+def get_project_path(source: str) -> str:
+    """Get the project a NCCM_FAKE_KICAD value stands for, generating it if needed.
+
+    :param source: Value of NCCM_FAKE_KICAD.
+    :return: Path of the project directory or .kicad_pro file.
+    """
+    if not source.startswith(SYNTHETIC_PREFIX):
+        return source
+
+    if source not in synthetic_projects:
+        counts = [int(count) for count in source[len(SYNTHETIC_PREFIX) :].split(":")]
+        directory = tempfile.mkdtemp(prefix="nccm-")
+        synthetic_projects[source] = write_synthetic_project(directory, *counts[:3])
+
+    return synthetic_projects[source]
+
+
+class NetClass:
+    """Net class as given by the KiCad API, with the clearance in nm."""
+
+    def __init__(self, name: str, clearance: Optional[int]):
+        self.name = name
+        self.clearance = clearance
+
+
+class Project:
+    """Project of the open board.
+
+    :param project_file: Project on disk served as the open one.
+    """
+
+    def __init__(self, project_file: ProjectFile):
+        self.project_file = project_file
+        self.path = project_file.path
+        self.name = project_file.name
+
+    def get_net_classes(self) -> list[NetClass]:
+        simulate_latency()
+        return [
+            NetClass(net_class.name, net_class.clearance)
+            for net_class in self.project_file.get_net_classes()
+        ]
+
+
+def is_copper_layer(layer: int) -> bool:
+    """Check if a layer of the stand-in board is a copper layer, as
+    kipy.util.board_layer.is_copper_layer.
+
+    :param layer: Layer number.
+    :return: True for the copper layers.
+    """
+    return F_CU <= layer <= B_CU
+
+
+def get_layer_number(name: str) -> int:
+    """Get the number of a copper layer of a .kicad_pcb file.
+
+    :param name: Layer name, such as "F.Cu" or "In2.Cu".
+    :return: Layer number.
+    """
+    if name == "F.Cu":
+        return F_CU
+    if name == "B.Cu":
+        return B_CU
+    return F_CU + int(name[2:-3])
+
+
+def to_nm(text: bytes) -> int:
+    """Convert a length of a .kicad_pcb file to nm, as the KiCad API gives lengths.
+
+    :param text: Length in mm.
+    :return: Length in nm.
+    """
+    return round(float(text) * NM_PER_MM)
+
+
+def get_item(uuid: bytes, net: str, **kwargs) -> SimpleNamespace:
+    """Get a board item with the fields of kipy that the NCCM reads.
+
+    :param uuid: ID of the item.
+    :param net: Name of the net of the item.
+    :param kwargs: Other fields of the item.
+    :return: The item.
+    """
+    return SimpleNamespace(
+        id=SimpleNamespace(value=uuid.decode()), net=SimpleNamespace(name=net), **kwargs
+    )
+
+
+def get_point(x: bytes, y: bytes) -> SimpleNamespace:
+    """Get a point of a .kicad_pcb file as a kipy Vector2 in nm.
+
+    :param x: X in mm.
+    :param y: Y in mm.
+    :return: The point.
+    """
+    return SimpleNamespace(x=to_nm(x), y=to_nm(y))
+
+
+class Board:
+    """Board open in KiCad.
+
+    :param project_file: Project on disk the board belongs to.
+    :param pcb: Contents of the .kicad_pcb file and its net names, read on first use.
+    """
+
+    def __init__(self, project_file: ProjectFile):
+        self.project_file = project_file
+        self.name = project_file.name + ".kicad_pcb"
+        self.pcb = None
+
+    def get_project(self) -> Project:
+        return Project(self.project_file)
+
+    def read_pcb(self) -> tuple[bytes, dict[bytes, str]]:
+        """Read the .kicad_pcb file of the board, once.
+
+        :return: Contents of the file and the net names by number.
+        """
+        if self.pcb is None:
+            try:
+                f_read = open(os.path.join(self.project_file.path, self.name), "rb")
+                data = f_read.read()
+                f_read.close()
+            except FileNotFoundError:
+                data = b""
+            nets = {
+                match.group(1): match.group(2).decode("utf-8")
+                for match in PCB_NET_RE.finditer(data)
+            }
+            self.pcb = data, nets
+
+        return self.pcb
+
+    def get_tracks(self) -> list[SimpleNamespace]:
+        simulate_latency()
+        data, nets = self.read_pcb()
+        tracks = []
+        for match in PCB_TRACK_RE.finditer(data):
+            kind, x1, y1, mid_x, mid_y, x2, y2, width, layer, net, uuid = match.groups()
+            fields = {
+                "start": get_point(x1, y1),
+                "end": get_point(x2, y2),
+                "width": to_nm(width),
+                "layer": get_layer_number(layer.decode()),
+            }
+            if kind == b"arc":
+                fields["mid"] = get_point(mid_x, mid_y)
+            tracks.append(get_item(uuid, nets.get(net, ""), **fields))
+        return tracks
+
+    def get_vias(self) -> list[SimpleNamespace]:
+        simulate_latency()
+        data, nets = self.read_pcb()
+        return [
+            get_item(uuid, nets.get(net, ""), position=get_point(x, y), diameter=to_nm(size))
+            for x, y, size, net, uuid in PCB_VIA_RE.findall(data)
+        ]
+
+    def get_pads(self) -> list:
+        simulate_latency()
+        return []
+
+    def get_zones(self) -> list:
+        simulate_latency()
+        return []
+
+    def get_netclass_for_nets(self, nets: list) -> dict[str, NetClass]:
+        """Get the net class of nets from the assignments of the project file.
+
+        :param nets: Nets to look up.
+        :return: Net class of each net by its name, the Default class if it has none.
+        """
+        simulate_latency()
+        f_read = open(self.project_file.pro_path, "r", encoding="utf-8")
+        settings = json.load(f_read)
+        f_read.close()
+
+        assignments = settings.get("net_settings", {}).get("netclass_assignments") or {}
+        return {
+            net.name: NetClass((assignments.get(net.name) or [DEFAULT_CLASS])[0], None)
+            for net in nets
+        }
+
+
+class KiCad:
+    """Connection to the stand-in KiCad described by NCCM_FAKE_KICAD."""
+
+    def __init__(self):
+        simulate_latency()
+        self.source = os.environ.get(FAKE_KICAD_ENV, "")
+
+    def get_board(self) -> Board:
+        simulate_latency()
+        if self.source == NO_KICAD:
+            raise ConnectionError("KiCad is not running")
+        if self.source == NO_BOARD:
+            raise ApiError("No board is open")
+
+        return Board(ProjectFile(get_project_path(self.source)))
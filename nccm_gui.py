@@ -78,6 +78,30 @@ class NetClassClearanceMatrixDialog ( wx.Dialog ):
         self.btnRemoveFromCR = wx.Button( self, wx.ID_ANY, _(u"Remove From Custom Rules"), wx.DefaultPosition, wx.DefaultSize, 0 )
         btnSizer.Add( self.btnRemoveFromCR, 0, wx.ALL|wx.ALIGN_BOTTOM, 5 )
 
+        self.chkCompact = wx.CheckBox( self, wx.ID_ANY, _(u"Compact Rules"), wx.DefaultPosition, wx.DefaultSize, 0 )
+        self.chkCompact.SetToolTip( _(u"Group the class pairs sharing a clearance into as few rules as possible") )
+
+        btnSizer.Add( self.chkCompact, 0, wx.ALL|wx.ALIGN_CENTER_VERTICAL, 5 )
+
+        choiceConstraintChoices = [ _(u"clearance"), _(u"hole_clearance"), _(u"physical_clearance"), _(u"physical_hole_clearance") ]
+        self.choiceConstraint = wx.Choice( self, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize, choiceConstraintChoices, 0 )
+        self.choiceConstraint.SetSelection( 0 )
+        self.choiceConstraint.SetToolTip( _(u"Constraint type shown and edited in the grid, all of them are written in the rule of each class pair") )
+
+        btnSizer.Add( self.choiceConstraint, 0, wx.ALL|wx.ALIGN_CENTER_VERTICAL, 5 )
+
+        self.btnAudit = wx.Button( self, wx.ID_ANY, _(u"Audit Board"), wx.DefaultPosition, wx.DefaultSize, 0 )
+        self.btnAudit.SetToolTip( _(u"Shade the class pairs whose copper on the board is already closer than their clearance") )
+
+        btnSizer.Add( self.btnAudit, 0, wx.ALL|wx.ALIGN_BOTTOM, 5 )
+
+        self.txtAudit = wx.StaticText( self, wx.ID_ANY, wx.EmptyString, wx.DefaultPosition, wx.DefaultSize, 0 )
+        self.txtAudit.Wrap( -1 )
+
+        self.txtAudit.SetToolTip( _(u"Item pairs of the edited class pair closer than the value being typed") )
+
+        btnSizer.Add( self.txtAudit, 0, wx.ALL|wx.ALIGN_CENTER_VERTICAL, 5 )
+
 
         btnSizer.Add( ( 10, 0), 1, wx.ALIGN_CENTER, 5 )
 
@@ -96,8 +120,13 @@ class NetClassClearanceMatrixDialog ( wx.Dialog ):
 
         # Connect Events
         self.gridNCCM.Bind( wx.grid.EVT_GRID_CELL_CHANGED, self.check_cells )
+        self.gridNCCM.Bind( wx.grid.EVT_GRID_CELL_RIGHT_CLICK, self.show_grid_menu )
+        self.gridNCCM.Bind( wx.grid.EVT_GRID_EDITOR_CREATED, self.editor_created )
+        self.gridNCCM.Bind( wx.EVT_KEY_DOWN, self.grid_key_down )
         self.btnUpdateCR.Bind( wx.EVT_BUTTON, self.update_custom_rules )
         self.btnRemoveFromCR.Bind( wx.EVT_BUTTON, self.remove_from_custom_rules )
+        self.choiceConstraint.Bind( wx.EVT_CHOICE, self.select_constraint )
+        self.btnAudit.Bind( wx.EVT_BUTTON, self.audit_board )
         self.btnExit.Bind( wx.EVT_BUTTON, self.gui_exit )
 
     def __del__( self ):
@@ -108,12 +137,27 @@ class NetClassClearanceMatrixDialog ( wx.Dialog ):
     def check_cells( self, event ):
         event.Skip()
 
+    def show_grid_menu( self, event ):
+        event.Skip()
+
+    def editor_created( self, event ):
+        event.Skip()
+
+    def grid_key_down( self, event ):
+        event.Skip()
+
     def update_custom_rules( self, event ):
         event.Skip()
 
     def remove_from_custom_rules( self, event ):
         event.Skip()
 
+    def select_constraint( self, event ):
+        event.Skip()
+
+    def audit_board( self, event ):
+        event.Skip()
+
     def gui_exit( self, event ):
         event.Skip()
 
@@ -0,0 +1,200 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Sizes of the grid's columns and labels, worked out from the net class names.
+
+Measuring a text is a font metric query, which is slow with GTK on high-DPI displays.
+The extents are therefore cached in memory and on disk by font and text, so a grid of
+classes seen before is laid out without measuring anything, and the sizes of every
+column and label are worked out together for the grid to apply at once. Column labels
+are shortened to a few characters and turned on their side once there are more classes
+than fit across a screen, so the columns stay as narrow as the values in them.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from nccm_dru import write_atomic
+from nccm_netclass import get_cache_dir
+
+EXTENT_FILE = "text_extents.json"
+EXTENT_VERSION = 1
+
+# Texts kept on disk for each font, the most recently measured ones
+MAX_FONT_EXTENTS = 20000
+
+# Column labels are turned on their side in grids of more classes than this
+ROTATE_CLASS_COUNT = 16
+
+# Space left around the text of a label or cell, in pixels
+LABEL_PADDING = 10
+
+# Widest value a cell can show, the largest clearance
+VALUE_SAMPLE = "999.999999"
+
+ELLIPSIS = "…"
+
+# Extents shared by every cache of the process, by font
+memory_extents = {}
+
+
+class ExtentCache:
+    """Text extents of fonts cached in memory and in a JSON file.
+
+    :param path: Path of the cache file, in get_cache_dir() by default.
+    :param fonts: Extents of the cache file by font and text, read on first use.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_cache_dir(), EXTENT_FILE)
+        self.fonts = None
+
+    def measure(
+        self, font_key: str, texts: list[str], get_extent: Callable
+    ) -> list[tuple[int, int]]:
+        """Get the extents of texts in a font, measuring only the ones not cached. Any
+        newly measured are written to the cache file in one go.
+
+        :param font_key: Description of the font and scale the texts are drawn in.
+        :param texts: Texts to get the extents of.
+        :param get_extent: Function measuring a text, such as wx.DC.GetTextExtent.
+        :return: Width and height of each text, in pixels.
+        """
+        extents = memory_extents.get(font_key)
+        if extents is None:
+            stored = self.load().get(font_key, {})
+            extents = {text: (extent[0], extent[1]) for text, extent in stored.items()}
+            memory_extents[font_key] = extents
+
+        missing = [text for text in dict.fromkeys(texts) if text not in extents]
+        for text in missing:
+            width, height = get_extent(text)
+            extents[text] = (width, height)
+        if missing:
+            self.save(font_key, extents)
+
+        return [extents[text] for text in texts]
+
+    def save(self, font_key: str, extents: dict[str, tuple[int, int]]):
+        """Write the extents of a font to the cache file. Failing to write it only costs
+        measuring the texts again next time, so it is not reported.
+
+        :param font_key: Description of the font and scale.
+        :param extents: Width and height of each text measured in the font.
+        """
+        fonts = self.load()
+        fonts[font_key] = dict(list(extents.items())[-MAX_FONT_EXTENTS:])
+        data = json.dumps({"version": EXTENT_VERSION, "fonts": fonts})
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_atomic(self.path, data.encode("utf-8"))
+        except OSError:
+            pass
+
+    def load(self) -> dict:
+        """Read the cache file once. A missing, unreadable or outdated file is treated
+        as an empty cache.
+
+        :return: Extents by font and text.
+        """
+        if self.fonts is not None:
+            return self.fonts
+
+        self.fonts = {}
+        try:
+            f_read = open(self.path, "r", encoding="utf-8")
+            data = json.load(f_read)
+            f_read.close()
+        except (OSError, ValueError):
+            return self.fonts
+
+        if isinstance(data, dict) and data.get("version") == EXTENT_VERSION:
+            self.fonts = data.get("fonts", {})
+
+        return self.fonts
+
+
+def abbreviate(label: str, max_chars: int) -> str:
+    """Shorten a label by replacing its middle with an ellipsis, keeping the start and
+    the end, where the numbers of classes such as DIFF_90R_USB1 and DIFF_90R_USB2 are.
+
+    :param label: Label to shorten.
+    :param max_chars: Number of characters to keep, including the ellipsis.
+    :return: The label, shortened if it is longer than max_chars.
+    """
+    if len(label) <= max_chars:
+        return label
+
+    head = max_chars // 2
+    tail = max_chars - 1 - head
+    return label[:head] + ELLIPSIS + (label[-tail:] if tail > 0 else "")
+
+
+@dataclass
+class GridLayout:
+    """Sizes to apply to the grid.
+
+    :param col_labels: Text of the column labels, in the order of the classes.
+    :param vertical: The column labels are drawn on their side.
+    :param col_width: Width of every column.
+    :param col_label_height: Height of the column labels.
+    :param row_label_width: Width of the row labels.
+    """
+
+    col_labels: list[str]
+    vertical: bool
+    col_width: int
+    col_label_height: int
+    row_label_width: int
+
+
+def get_grid_layout(
+    class_names: list[str],
+    measure: Callable,
+    col_width: int,
+    max_chars: int,
+    label_height: int,
+) -> GridLayout:
+    """Work out the sizes of the grid's columns and labels from the extents of the class
+    names, the shortened column labels and the widest value, all measured in one call.
+
+    :param class_names: Net class names indexed by row/column.
+    :param measure: Function getting the extents of a list of texts, such as
+        ExtentCache.measure with its font given.
+    :param col_width: Smallest width of a column with its label written across it.
+    :param max_chars: Number of characters the column labels are shortened to.
+    :param label_height: Height of the column labels written across the columns.
+    :return: Sizes of the grid.
+    """
+    col_labels = [abbreviate(name, max_chars) for name in class_names]
+    vertical = len(class_names) > ROTATE_CLASS_COUNT
+
+    texts = list(dict.fromkeys([VALUE_SAMPLE, *class_names, *col_labels]))
+    extents = dict(zip(texts, measure(texts)))
+
+    row_label_width = max((extents[name][0] for name in class_names), default=0)
+    col_label_width = max((extents[label][0] for label in col_labels), default=0)
+    if vertical:
+        col_width = extents[VALUE_SAMPLE][0] + LABEL_PADDING
+        label_height = col_label_width + LABEL_PADDING
+    else:
+        col_width = max(col_width, col_label_width + LABEL_PADDING)
+
+    return GridLayout(
+        col_labels, vertical, col_width, label_height, row_label_width + LABEL_PADDING
+    )
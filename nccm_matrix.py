@@ -0,0 +1,433 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from array import array
+from collections.abc import ItemsView, MutableMapping, Sequence
+from itertools import compress
+from math import isqrt
+from typing import Iterator
+
+
+def packed_length(size: int) -> int:
+    """Number of cells in the upper triangle (diagonal included) of a square matrix.
+
+    :param size: Number of rows/columns of the matrix.
+    :return: size * (size + 1) / 2
+    """
+    return size * (size + 1) // 2
+
+
+def packed_index(row: int, col: int) -> int:
+    """Index of a valid (row <= col) cell in the packed upper triangle.
+
+    The cells are packed column by column, which is the same order the valid
+    coordinates of the grid have always been listed in.
+
+    :param row: Row of the cell.
+    :param col: Column of the cell.
+    :return: Index into the packed array.
+    """
+    return col * (col + 1) // 2 + row
+
+
+def unpack_index(index: int) -> tuple[int, int]:
+    """Cell at an index of the packed upper triangle, the inverse of packed_index.
+
+    :param index: Index into the packed array.
+    :return: Row and column of the cell.
+    """
+    col = (isqrt(8 * index + 1) - 1) // 2
+    return index - col * (col + 1) // 2, col
+
+
+def sequence_equal(sequence: Sequence, other) -> bool:
+    """Compare a sequence view item by item with a list, tuple or other sequence.
+
+    :param sequence: Sequence view.
+    :param other: Object compared with.
+    :return: True if both hold the same items in the same order, NotImplemented if
+        other is not a sequence.
+    """
+    if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+        return NotImplemented
+    return len(sequence) == len(other) and all(a == b for a, b in zip(sequence, other))
+
+
+class ClearanceMatrix:
+    """Clearances between net classes held in one packed upper-triangular array.
+
+    Only the cells with row <= col hold data, the rest of the square is implied.
+    A value of 0 means that no clearance has been set for that pair.
+
+    :param size: Number of net classes.
+    :param values: Packed array of N(N+1)/2 clearances in mm.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = array("d", bytes(8 * packed_length(size)))
+
+    @classmethod
+    def from_values(cls, size: int, values: array) -> "ClearanceMatrix":
+        """Make a matrix over an existing packed array, without copying it.
+
+        :param size: Number of net classes.
+        :param values: Packed array of N(N+1)/2 clearances in mm.
+        :return: The matrix.
+        """
+        if len(values) != packed_length(size):
+            raise ValueError(f"{len(values)} values do not fill a matrix of size {size}")
+
+        matrix = cls(0)
+        matrix.size = size
+        matrix.values = values
+        return matrix
+
+    def is_valid(self, row: int, col: int) -> bool:
+        """Check if a cell holds data.
+
+        :param row: Row of the cell.
+        :param col: Column of the cell.
+        :return: True if the cell is in the upper triangle of the matrix.
+        """
+        return 0 <= row <= col < self.size
+
+    def get(self, row: int, col: int) -> float:
+        """Get the value of a valid cell.
+
+        :param row: Row of the cell.
+        :param col: Column of the cell.
+        :return: Value of the cell.
+        """
+        if not self.is_valid(row, col):
+            raise IndexError(f"({row}, {col}) is not a valid cell")
+        return self.values[packed_index(row, col)]
+
+    def set(self, row: int, col: int, value: float):
+        """Set the value of a valid cell.
+
+        :param row: Row of the cell.
+        :param col: Column of the cell.
+        :param value: New value of the cell.
+        """
+        if not self.is_valid(row, col):
+            raise IndexError(f"({row}, {col}) is not a valid cell")
+        self.values[packed_index(row, col)] = value
+
+    def clear(self):
+        """Set every cell back to 0."""
+        self.values = array("d", bytes(8 * packed_length(self.size)))
+
+    def nonzero(self) -> Iterator[tuple[tuple[int, int], float]]:
+        """Iterate over the cells that have a value, in packed order. The empty cells
+        are skipped without being looked at one by one in Python.
+
+        :return: Iterator of ((row, col), value) pairs.
+        """
+        values = self.values
+        for index in compress(range(len(values)), values):
+            yield unpack_index(index), values[index]
+
+    def count_nonzero(self) -> int:
+        """Count the cells that have a value.
+
+        :return: Number of non-zero cells.
+        """
+        return len(self.values) - self.values.count(0.0)
+
+
+class MatrixStack:
+    """Matrices of the same net classes, one layer per constraint type, making up a
+    3-D array indexed by (constraint, row, col). Each layer is a ClearanceMatrix of its
+    own, so everything working on a matrix works on a single layer.
+
+    :param size: Number of net classes.
+    :param constraints: Constraint type of each layer, in order.
+    :param layers: Matrix of each constraint type.
+    """
+
+    def __init__(self, size: int, constraints: Sequence[str]):
+        self.size = size
+        self.constraints = list(constraints)
+        self.layers = {constraint: ClearanceMatrix(size) for constraint in self.constraints}
+
+    @classmethod
+    def from_values(cls, size: int, constraints: Sequence[str], values: array) -> "MatrixStack":
+        """Make a stack from its layers packed one after the other, as values gives them.
+
+        :param size: Number of net classes.
+        :param constraints: Constraint type of each layer, in order.
+        :param values: Packed array of the layers.
+        :return: The stack.
+        """
+        length = packed_length(size)
+        if len(values) != length * len(constraints):
+            raise ValueError(f"{len(values)} values do not fill {len(constraints)} layers")
+
+        stack = cls(0, [])
+        stack.size = size
+        stack.constraints = list(constraints)
+        stack.layers = {
+            constraint: ClearanceMatrix.from_values(
+                size, values[pos * length : (pos + 1) * length]
+            )
+            for pos, constraint in enumerate(stack.constraints)
+        }
+        return stack
+
+    @property
+    def values(self) -> array:
+        """Every layer packed one after the other, in the order of the constraints."""
+        values = array("d")
+        for constraint in self.constraints:
+            values.extend(self.layers[constraint].values)
+        return values
+
+    def layer(self, constraint: str) -> ClearanceMatrix:
+        """Get the matrix of a constraint type.
+
+        :param constraint: Constraint type of the layer.
+        :return: Matrix of the layer.
+        """
+        return self.layers[constraint]
+
+    def copy(self) -> "MatrixStack":
+        """Get a copy of the stack that does not share its values.
+
+        :return: The copy.
+        """
+        return MatrixStack.from_values(self.size, self.constraints, self.values)
+
+    def clear(self):
+        """Set every cell of every layer back to 0."""
+        for matrix in self.layers.values():
+            matrix.clear()
+
+    def nonzero(self) -> Iterator[tuple[tuple[int, int], tuple[tuple[str, float], ...]]]:
+        """Iterate over the cells that have a value in any layer, in packed order.
+
+        :return: Iterator of ((row, col), ((constraint, value), ...)) pairs, only
+            holding the layers where the cell has a value.
+        """
+        layers = [(constraint, self.layers[constraint].values) for constraint in self.constraints]
+        if len(layers) == 1:
+            constraint = layers[0][0]
+            for coord, value in self.layers[constraint].nonzero():
+                yield coord, ((constraint, value),)
+            return
+
+        indices = set()
+        for _, values in layers:
+            indices.update(compress(range(len(values)), values))
+
+        for index in sorted(indices):
+            yield unpack_index(index), tuple(
+                (constraint, values[index]) for constraint, values in layers if values[index]
+            )
+
+    def count_nonzero(self) -> int:
+        """Count the cells that have a value in any layer.
+
+        :return: Number of non-zero cells.
+        """
+        indices = set()
+        for matrix in self.layers.values():
+            indices.update(compress(range(len(matrix.values)), matrix.values))
+        return len(indices)
+
+
+class CoordView(Sequence):
+    """Valid coordinates of a square grid, worked out from their position instead of
+    being stored. They are listed column by column as (row, col) with row <= col, or
+    transposed row by row as (row, col) with col <= row.
+
+    :param size: Number of rows/columns of the grid.
+    :param transpose: List the lower triangle instead of the upper one.
+    """
+
+    def __init__(self, size: int, transpose: bool = False):
+        self.size = size
+        self.transpose = transpose
+
+    def __len__(self) -> int:
+        return packed_length(self.size)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("coordinate index out of range")
+
+        row, col = unpack_index(index)
+        return (col, row) if self.transpose else (row, col)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        for outer in range(self.size):
+            for inner in range(outer + 1):
+                yield (outer, inner) if self.transpose else (inner, outer)
+
+    def __contains__(self, coord) -> bool:
+        row, col = coord
+        if self.transpose:
+            row, col = col, row
+        return 0 <= row <= col < self.size
+
+    __eq__ = sequence_equal
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"CoordView({self.size}, transpose={self.transpose})"
+
+
+class InvalidCoordView(Sequence):
+    """Coordinates of a square grid that are not valid. Their order is the one of the set
+    difference they have always been computed with, so the list is only built once it
+    is iterated or indexed. Length and membership are worked out arithmetically.
+
+    :param valid: Valid coordinates of the grid.
+    :param coords: The built list, None until needed.
+    """
+
+    def __init__(self, valid: CoordView):
+        self.valid = valid
+        self.coords = None
+
+    def get_coords(self) -> list[tuple[int, int]]:
+        """Build the list of invalid coordinates, once.
+
+        :return: List of the invalid coordinates.
+        """
+        if self.coords is None:
+            size = self.valid.size
+            coords_list = [(row, col) for col in range(size) for row in range(size)]
+            self.coords = list(set(coords_list) ^ set(self.valid))
+        return self.coords
+
+    def __len__(self) -> int:
+        return self.valid.size**2 - len(self.valid)
+
+    def __getitem__(self, index):
+        return self.get_coords()[index]
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return iter(self.get_coords())
+
+    def __contains__(self, coord) -> bool:
+        row, col = coord
+        size = self.valid.size
+        return 0 <= row < size and 0 <= col < size and coord not in self.valid
+
+    __eq__ = sequence_equal
+    __hash__ = None
+
+
+class CellValues(MutableMapping):
+    """Non-zero cells of a ClearanceMatrix seen as a {(row, col): value} dictionary.
+    Nothing is stored apart from the matrix, so the view is always up to date.
+
+    :param matrix: Matrix holding the values.
+    """
+
+    def __init__(self, matrix: ClearanceMatrix):
+        self.matrix = matrix
+
+    def __getitem__(self, coord: tuple[int, int]) -> float:
+        row, col = coord
+        if self.matrix.is_valid(row, col):
+            value = self.matrix.get(row, col)
+            if value != 0:
+                return value
+        raise KeyError(coord)
+
+    def __setitem__(self, coord: tuple[int, int], value: float):
+        self.matrix.set(*coord, value)
+
+    def __delitem__(self, coord: tuple[int, int]):
+        if coord not in self:
+            raise KeyError(coord)
+        self.matrix.set(*coord, 0)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        for coord, _ in self.matrix.nonzero():
+            yield coord
+
+    def __len__(self) -> int:
+        return self.matrix.count_nonzero()
+
+    def items(self) -> ItemsView:
+        return CellItems(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class CellItems(ItemsView):
+    """Items of CellValues, read in one pass over the matrix."""
+
+    def __iter__(self) -> Iterator[tuple[tuple[int, int], float]]:
+        return self._mapping.matrix.nonzero()
+
+
+class PairBaselines(Sequence):
+    """Clearance each pair of classes already has from the net classes themselves,
+    which is the larger of the two class clearances. Only the clearance of each class
+    is stored, the pairs are packed the same way as the matrix.
+
+    :param clearances: Clearance of each net class.
+    """
+
+    def __init__(self, clearances: list[float]):
+        self.clearances = array("d", clearances)
+
+    def get(self, row: int, col: int) -> float:
+        """Get the clearance of a pair.
+
+        :param row: Row of the cell of the pair.
+        :param col: Column of the cell of the pair.
+        :return: Larger of the two class clearances.
+        """
+        return max(self.clearances[row], self.clearances[col])
+
+    def __len__(self) -> int:
+        return packed_length(len(self.clearances))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("pair index out of range")
+
+        return self.get(*unpack_index(index))
+
+    def __iter__(self) -> Iterator[float]:
+        clearances = self.clearances
+        for col, clearance_col in enumerate(clearances):
+            for clearance_row in clearances[: col + 1]:
+                yield max(clearance_row, clearance_col)
+
+
+def pair_baselines(clearances: list[float]) -> PairBaselines:
+    """Get the clearance each pair of classes already has from the net classes themselves,
+    packed the same way as the matrix so that it can be compared cell for cell.
+
+    :param clearances: Clearance of each net class.
+    :return: Packed sequence of the pair clearances.
+    """
+    return PairBaselines(clearances)
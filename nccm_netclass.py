@@ -0,0 +1,224 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Sources of the net classes of a project, and the cache kept in front of them.
+
+The project file is read first since it needs neither KiCad nor an IPC round trip.
+Whatever it gives is cached in memory and on disk against the path, modification time
+and size of the file, so opening an unchanged project again reads neither the file
+nor KiCad. The KiCad API is only asked when the project file cannot provide the
+net classes.
+"""
+
+import json
+import os
+import sys
+from typing import Optional
+
+from nccm_core import NccmError, NetClass, Project
+from nccm_dru import write_atomic
+
+# Environment variable overriding the directory of the on-disk cache
+CACHE_DIR_ENV = "NCCM_CACHE_DIR"
+CACHE_FILE = "net_classes.json"
+CACHE_VERSION = 1
+
+# Entries shared by every cache of the process, by project file path
+memory_cache = {}
+
+
+class ProjectFileProvider:
+    """Net classes read from the net_settings of the .kicad_pro file."""
+
+    # The result only depends on the project file, so it can be cached against it
+    cacheable = True
+
+    def get_net_classes(self, pro_path: str) -> list[NetClass]:
+        """Get the net classes of a project.
+
+        :param pro_path: Path of the .kicad_pro file.
+        :return: List of the net classes in the order of the project file.
+        """
+        return Project(pro_path).get_net_classes()
+
+
+class KiCadProvider:
+    """Net classes asked of a running KiCad through the IPC API.
+
+    :param project: Project of the open board, from the KiCad API.
+    """
+
+    # KiCad may hold changes that are not in the project file yet
+    cacheable = False
+
+    def __init__(self, project):
+        self.project = project
+
+    def get_net_classes(self, pro_path: str) -> list:
+        """Get the net classes of the open board.
+
+        :param pro_path: Path of the .kicad_pro file, unused.
+        :return: List of the net classes from the KiCad API.
+        """
+        return self.project.get_net_classes()
+
+
+def get_cache_dir() -> str:
+    """Get the directory of the on-disk cache, following the platform conventions.
+
+    :return: Path of the directory.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        return cache_dir
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+
+    return os.path.join(base, "nccm")
+
+
+def get_file_key(path: str) -> Optional[tuple[int, int]]:
+    """Get what a cache entry of a file is checked against.
+
+    :param path: Path of the file.
+    :return: Modification time in ns and size, None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class NetClassCache:
+    """Net classes of project files cached in memory and in a JSON file.
+
+    :param path: Path of the cache file, in get_cache_dir() by default.
+    :param entries: Entries of the cache file by project file path, read on first use.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_cache_dir(), CACHE_FILE)
+        self.entries = None
+
+    def get(self, pro_path: str, key: tuple[int, int]) -> Optional[list[NetClass]]:
+        """Get the cached net classes of a project file.
+
+        :param pro_path: Absolute path of the .kicad_pro file.
+        :param key: Modification time and size of the file.
+        :return: The net classes, None if they are not cached for this version of the file.
+        """
+        entry = memory_cache.get(pro_path)
+        if entry is None:
+            entry = self.load().get(pro_path)
+        if entry is None or (entry["mtime_ns"], entry["size"]) != key:
+            return None
+
+        memory_cache[pro_path] = entry
+        return [NetClass(name, clearance) for name, clearance in entry["classes"]]
+
+    def put(self, pro_path: str, key: tuple[int, int], net_classes: list):
+        """Cache the net classes of a project file. Failing to write the cache file
+        only costs the next start up, so it is not reported.
+
+        :param pro_path: Absolute path of the .kicad_pro file.
+        :param key: Modification time and size of the file.
+        :param net_classes: Net classes read from the file.
+        """
+        entry = {
+            "mtime_ns": key[0],
+            "size": key[1],
+            "classes": [
+                [net_class.name, getattr(net_class, "clearance", None)]
+                for net_class in net_classes
+            ],
+        }
+        memory_cache[pro_path] = entry
+
+        entries = self.load()
+        entries[pro_path] = entry
+        data = json.dumps({"version": CACHE_VERSION, "projects": entries})
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_atomic(self.path, data.encode("utf-8"))
+        except OSError:
+            pass
+
+    def load(self) -> dict:
+        """Read the cache file once. A missing, unreadable or outdated file is treated
+        as an empty cache.
+
+        :return: Entries by project file path.
+        """
+        if self.entries is not None:
+            return self.entries
+
+        self.entries = {}
+        try:
+            f_read = open(self.path, "r", encoding="utf-8")
+            data = json.load(f_read)
+            f_read.close()
+        except (OSError, ValueError):
+            return self.entries
+
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            self.entries = data.get("projects", {})
+
+        return self.entries
+
+
+def get_net_classes(
+    pro_path: str, providers: list, cache: Optional[NetClassCache] = None
+) -> list:
+    """Get the net classes of a project from the cache, or else from the first
+    provider able to give them.
+
+    :param pro_path: Path of the .kicad_pro file.
+    :param providers: Net class providers, in the order they are tried.
+    :param cache: Cache to use, the one in get_cache_dir() by default.
+    :return: List of the net classes.
+    """
+    pro_path = os.path.abspath(pro_path)
+    cache = cache or NetClassCache()
+
+    key = get_file_key(pro_path)
+    if key is not None:
+        net_classes = cache.get(pro_path, key)
+        if net_classes is not None:
+            return net_classes
+
+    errors = []
+    for provider in providers:
+        try:
+            net_classes = provider.get_net_classes(pro_path)
+        except NccmError as err:
+            errors.append(str(err))
+            continue
+
+        if not net_classes:
+            continue
+
+        if provider.cacheable and key is not None:
+            cache.put(pro_path, key, net_classes)
+        return net_classes
+
+    raise NccmError("\n".join(errors) or f"No net classes found for {pro_path}")
@@ -0,0 +1,210 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Timing of the start up phases and event handlers, enabled by NCCM_PROFILE.
+
+    NCCM_PROFILE=1          time every phase
+    NCCM_PROFILE=cprofile   also run cProfile on the main thread for the whole session
+
+Each phase is written as one JSON line to nccm-profile.jsonl in the project directory,
+with its wall-clock time and the change in the number of allocated memory blocks. The
+cProfile statistics go to nccm-profile.prof next to it. The variable is read once on
+import, and when it is not set the decorated functions are left as they are.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+PROFILE_ENV = "NCCM_PROFILE"
+CPROFILE = "cprofile"
+REPORT_FILE = "nccm-profile.jsonl"
+STATS_FILE = "nccm-profile.prof"
+
+ENABLED = bool(os.environ.get(PROFILE_ENV))
+
+
+class Session:
+    """Phases recorded by one run of the plugin.
+
+    :param id: Identifier shared by the records of the session.
+    :param records: Records waiting for the report directory to be known.
+    :param report_dir: Directory the report is written to, once known.
+    :param profiler: cProfile profiler running for the session, if any.
+    :param depth: Number of phases currently running in each thread.
+    :param lock: Lock serialising the records of the worker and main threads.
+    """
+
+    def __init__(self, use_cprofile: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.records = []
+        self.report_dir = None
+        self.profiler = None
+        self.depth = threading.local()
+        self.lock = threading.Lock()
+
+        if use_cprofile:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def record(self, name: str, wall_s: float, blocks: int, depth: int):
+        """Record a finished phase, writing it out if the report directory is known.
+
+        :param name: Name of the phase.
+        :param wall_s: Wall-clock time of the phase.
+        :param blocks: Change in the number of allocated memory blocks.
+        :param depth: Number of phases the phase ran within.
+        """
+        record = {
+            "session": self.id,
+            "time": time.time(),
+            "phase": name,
+            "wall_ms": round(wall_s * 1000, 3),
+            "alloc_blocks": blocks,
+            "depth": depth,
+            "thread": threading.current_thread().name,
+        }
+        with self.lock:
+            self.records.append(record)
+            if self.report_dir is not None:
+                self.flush()
+
+    def set_report_dir(self, directory: str):
+        """Set where the report goes and write the records made so far.
+
+        :param directory: Project directory.
+        """
+        with self.lock:
+            self.report_dir = directory
+            self.flush()
+
+    def flush(self):
+        """Append the waiting records to the report. Failing to write it must not stop
+        the plugin, so the records are dropped instead."""
+        lines = "".join(json.dumps(record) + "\n" for record in self.records)
+        self.records = []
+        try:
+            f_write = open(os.path.join(self.report_dir, REPORT_FILE), "a", encoding="utf-8")
+            f_write.write(lines)
+            f_write.close()
+        except OSError:
+            pass
+
+    def stop(self):
+        """Stop cProfile and write its statistics next to the report."""
+        if self.profiler is None:
+            return
+
+        self.profiler.disable()
+        if self.report_dir is not None:
+            try:
+                self.profiler.dump_stats(os.path.join(self.report_dir, STATS_FILE))
+            except OSError:
+                pass
+        self.profiler = None
+
+
+session: Optional[Session] = None
+if ENABLED:
+    session = Session(CPROFILE in os.environ[PROFILE_ENV].lower().split(","))
+
+
+class Phase:
+    """Context manager timing the code within it as one phase.
+
+    :param name: Name of the phase.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        depth = getattr(session.depth, "value", 0)
+        session.depth.value = depth + 1
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_s = time.perf_counter() - self.start
+        blocks = sys.getallocatedblocks() - self.blocks
+        session.depth.value -= 1
+        session.record(self.name, wall_s, blocks, session.depth.value)
+
+
+class NullPhase:
+    """Context manager standing in for Phase while profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_PHASE = NullPhase()
+
+
+def phase(name: str):
+    """Time a block of code as one phase.
+
+    :param name: Name of the phase.
+    :return: Context manager.
+    """
+    if session is None:
+        return NULL_PHASE
+
+    return Phase(name)
+
+
+def profiled(func: Callable) -> Callable:
+    """Time every call of a function as a phase named after it. The function is
+    returned unchanged while profiling is disabled.
+
+    :param func: Function to time.
+    :return: The timed function.
+    """
+    if session is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with Phase(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def set_report_dir(directory: str):
+    """Set the project directory the report is written to.
+
+    :param directory: Project directory.
+    """
+    if session is not None:
+        session.set_report_dir(directory)
+
+
+def stop():
+    """End the session, writing the cProfile statistics if cProfile was running."""
+    if session is not None:
+        session.stop()
@@ -0,0 +1,384 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Binary store of the matrix read from the NCCM section of a custom rules file, so that
+reopening a project does not parse its rules again.
+
+Each store holds the packed layer of every constraint type, the class names they are
+indexed by and the SHA-256 of the section they were read from. It is only used while
+the section still has that hash, a section edited by hand is parsed as before and the
+store written again. The stores live in the net class cache directory, one per custom
+rules file:
+
+    header      magic, version, flags, class count, section hash, table length
+    table       JSON of the class names, the constraint types and the rules naming other
+                classes
+    values      packed layers one after the other as little-endian doubles
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from collections.abc import ItemsView, Mapping
+from typing import Iterable, Iterator, Optional, Union
+
+from nccm_core import fill_layers
+from nccm_dru import (
+    CLEARANCE,
+    CONSTRAINTS,
+    CellValue,
+    find_section,
+    get_layer_val_dicts,
+    is_compact,
+    parse_dru,
+    write_chunks_atomic,
+)
+from nccm_matrix import ClearanceMatrix, MatrixStack, packed_length
+from nccm_netclass import get_cache_dir
+from nccm_units import format_mm
+
+STORE_DIR = "matrices"
+STORE_SUFFIX = ".nccm"
+STORE_MAGIC = b"NCCMMTX\0"
+STORE_VERSION = 2
+
+# Magic, version, flags, class count, section hash, table length
+HEADER = struct.Struct("<8sHHI32sI")
+
+# Flags
+COMPACT_FLAG = 1
+
+
+@dataclass
+class MatrixStore:
+    """Layers read from an NCCM section.
+
+    :param class_names: Net class names indexed by row/column.
+    :param values: Packed layers, as MatrixStack.values.
+    :param digest: SHA-256 of the section, marker lines included.
+    :param compact: The section was written with grouped rules.
+    :param other_pairs: Constraint type mapped to the values of the class pairs naming
+        classes not in class_names.
+    :param constraints: Constraint type of each layer, in order.
+    """
+
+    class_names: list[str]
+    values: array
+    digest: bytes
+    compact: bool = False
+    other_pairs: dict[str, dict[tuple, str]] = field(default_factory=dict)
+    constraints: list[str] = field(default_factory=lambda: list(CONSTRAINTS))
+
+
+@dataclass
+class LoadedMatrix:
+    """Contents of an NCCM section, placed in a matrix.
+
+    :param class_val_dict: Class pairs and their clearance as key-value pairs, a view
+        over the store when loaded from it.
+    :param missing: Class pairs naming classes that are not in the matrix.
+    :param compact: The section was written with grouped rules.
+    :param from_store: The matrix came from the store rather than the rules.
+    :param digest: SHA-256 of the section, marker lines included.
+    """
+
+    class_val_dict: Mapping[tuple, str]
+    missing: list[tuple]
+    compact: bool
+    from_store: bool
+    digest: bytes
+
+
+def get_store_path(dru_path: str) -> str:
+    """Get the path of the store of a custom rules file.
+
+    :param dru_path: Path to the .kicad_dru file.
+    :return: Path of the store in the cache directory.
+    """
+    key = hashlib.sha1(os.path.abspath(dru_path).encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_dir(), STORE_DIR, key + STORE_SUFFIX)
+
+
+def write_store(path: str, store: MatrixStore):
+    """Write a store. Failing to write it only costs parsing the rules next time, so it
+    is not reported.
+
+    :param path: Path of the store.
+    :param store: Matrix to store.
+    """
+    table = json.dumps(
+        {
+            "classes": store.class_names,
+            "constraints": store.constraints,
+            "other_pairs": [
+                [constraint, a, b, value]
+                for constraint, pairs in store.other_pairs.items()
+                for (a, b), value in pairs.items()
+            ],
+        }
+    ).encode("utf-8")
+    header = HEADER.pack(
+        STORE_MAGIC,
+        STORE_VERSION,
+        COMPACT_FLAG if store.compact else 0,
+        len(store.class_names),
+        store.digest,
+        len(table),
+    )
+
+    values = store.values
+    if sys.byteorder == "big":
+        values = array("d", values)
+        values.byteswap()
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_chunks_atomic(path, [header, table, memoryview(values).cast("B")])
+    except OSError:
+        pass
+
+
+def read_store(path: str) -> Optional[MatrixStore]:
+    """Read a store. A missing, unreadable or outdated store is ignored.
+
+    :param path: Path of the store.
+    :return: The stored matrix, None if there is no usable store.
+    """
+    try:
+        f_read = open(path, "rb")
+        data = f_read.read()
+        f_read.close()
+    except OSError:
+        return None
+
+    if len(data) < HEADER.size:
+        return None
+    magic, version, flags, size, digest, table_length = HEADER.unpack_from(data)
+    if magic != STORE_MAGIC or version != STORE_VERSION:
+        return None
+
+    values_start = HEADER.size + table_length
+    try:
+        table = json.loads(data[HEADER.size : values_start].decode("utf-8"))
+        class_names = table["classes"]
+        constraints = table["constraints"]
+        other_pairs = {}
+        for constraint, a, b, value in table["other_pairs"]:
+            other_pairs.setdefault(constraint, {})[(a, b)] = value
+    except (ValueError, KeyError, TypeError):
+        return None
+    if len(class_names) != size:
+        return None
+    if len(data) != values_start + 8 * packed_length(size) * len(constraints):
+        return None
+
+    values = array("d")
+    values.frombytes(data[values_start:])
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return MatrixStore(
+        class_names, values, digest, bool(flags & COMPACT_FLAG), other_pairs, constraints
+    )
+
+
+def get_other_pairs(
+    layer_val_dicts: dict[str, Mapping[tuple, str]], missing: list[tuple]
+) -> dict[str, dict[tuple, str]]:
+    """Get the values of the class pairs naming classes not in the matrix, to store them.
+
+    :param layer_val_dicts: Constraint type mapped to the class pairs and their value.
+    :param missing: Class pairs naming classes that are not in the matrix.
+    :return: Constraint type mapped to the values of the missing class pairs it has.
+    """
+    other_pairs = {}
+    for constraint, class_val_dict in layer_val_dicts.items():
+        pairs = {pair: class_val_dict[pair] for pair in missing if pair in class_val_dict}
+        if pairs:
+            other_pairs[constraint] = pairs
+
+    return other_pairs
+
+
+def save_matrix(
+    dru_path: str,
+    class_names: list[str],
+    cells: Iterable[tuple[tuple[int, int], CellValue]],
+    compact: bool = False,
+) -> Optional[MatrixStore]:
+    """Store the cells just written to the NCCM section of a custom rules file, so that
+    the next load can skip parsing them.
+
+    :param dru_path: Path to the .kicad_dru file.
+    :param class_names: Net class names indexed by row/column.
+    :param cells: ((row, col), value) pairs that were written as rules, each value being
+        a clearance or every (constraint type, minimum) pair of the cell.
+    :param compact: The section was written with grouped rules.
+    :return: What was stored, None if the file or its section could not be read.
+    """
+    try:
+        f_read = open(dru_path, "rb")
+        data = f_read.read()
+        f_read.close()
+    except OSError:
+        return None
+
+    span = find_section(data)
+    if span is None:
+        return None
+
+    stack = MatrixStack(len(class_names), CONSTRAINTS)
+    for (row, col), value in cells:
+        if not isinstance(value, tuple):
+            value = ((CLEARANCE, value),)
+        for constraint, minimum in value:
+            stack.layer(constraint).set(row, col, minimum)
+
+    digest = hashlib.sha256(data[span[0] : span[1]]).digest()
+    store = MatrixStore(list(class_names), stack.values, digest, compact)
+    write_store(get_store_path(dru_path), store)
+    return store
+
+
+class StoredClassValues(Mapping):
+    """Class pairs of one layer of a store seen as the dictionary get_class_val_dict
+    gives. Nothing is worked out until it is looked at, so loading from the store stays
+    quick however many rules the section has.
+
+    :param store: Stored layers.
+    :param constraint: Constraint type of the layer.
+    :param matrix: Matrix over the stored values of the layer.
+    :param other_pairs: Values of the layer's class pairs naming classes not stored.
+    :param class_index: Position of every stored class, built on first lookup.
+    """
+
+    def __init__(self, store: MatrixStore, constraint: str = CLEARANCE):
+        self.store = store
+        self.constraint = constraint
+        length = packed_length(len(store.class_names))
+        start = store.constraints.index(constraint) * length
+        self.matrix = ClearanceMatrix.from_values(
+            len(store.class_names), store.values[start : start + length]
+        )
+        self.other_pairs = store.other_pairs.get(constraint, {})
+        self.class_index = None
+
+    def __getitem__(self, class_pair: tuple) -> str:
+        if class_pair in self.other_pairs:
+            return self.other_pairs[class_pair]
+
+        if self.class_index is None:
+            self.class_index = {name: pos for pos, name in enumerate(self.store.class_names)}
+        pos_a = self.class_index.get(class_pair[0])
+        pos_b = self.class_index.get(class_pair[1])
+        if pos_a is not None and pos_b is not None and pos_a <= pos_b:
+            value = self.matrix.get(pos_a, pos_b)
+            if value != 0:
+                return format_mm(value) + "mm"
+        raise KeyError(class_pair)
+
+    def __iter__(self) -> Iterator[tuple]:
+        names = self.store.class_names
+        for (row, col), _ in self.matrix.nonzero():
+            yield names[row], names[col]
+        yield from self.other_pairs
+
+    def __len__(self) -> int:
+        return self.matrix.count_nonzero() + len(self.other_pairs)
+
+    def items(self) -> ItemsView:
+        return StoredItems(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class StoredItems(ItemsView):
+    """Items of StoredClassValues, read in one pass over the matrix."""
+
+    def __iter__(self) -> Iterator[tuple[tuple, str]]:
+        mapping = self._mapping
+        names = mapping.store.class_names
+        for (row, col), value in mapping.matrix.nonzero():
+            yield (names[row], names[col]), format_mm(value) + "mm"
+        yield from mapping.other_pairs.items()
+
+
+def load_matrix(
+    dru_path: str, matrix: Union[ClearanceMatrix, MatrixStack], class_names: list[str]
+) -> Optional[LoadedMatrix]:
+    """Fill an empty matrix from the NCCM section of a custom rules file, from its store
+    if the section is unchanged since the store was written, otherwise by parsing the
+    file and storing the result. Every layer of the section is stored, whether a stack
+    or only the clearance matrix is filled.
+
+    :param dru_path: Path to the .kicad_dru file.
+    :param matrix: Empty stack of layers, or empty matrix of the clearances, to fill.
+    :param class_names: Net class names indexed by row/column.
+    :return: What was loaded, None if the file has no NCCM section.
+    """
+    f_read = open(dru_path, "rb")
+    data = f_read.read()
+    f_read.close()
+
+    span = find_section(data)
+    if span is None:
+        return None
+
+    if isinstance(matrix, MatrixStack):
+        stack = matrix
+    else:
+        stack = MatrixStack(matrix.size, CONSTRAINTS)
+        stack.layers[CLEARANCE] = matrix
+
+    digest = hashlib.sha256(data[span[0] : span[1]]).digest()
+    store_path = get_store_path(dru_path)
+    store = read_store(store_path)
+
+    if store is not None and store.digest == digest and store.constraints == stack.constraints:
+        class_val_dict = StoredClassValues(store)
+        if store.class_names == class_names:
+            # The same classes in the same order, so each layer is copied at once
+            stored = MatrixStack.from_values(len(class_names), store.constraints, store.values)
+            for constraint in stack.constraints:
+                stack.layer(constraint).values = stored.layer(constraint).values
+            missing = list(
+                dict.fromkeys(pair for pairs in store.other_pairs.values() for pair in pairs)
+            )
+        else:
+            layer_val_dicts = {
+                constraint: StoredClassValues(store, constraint)
+                for constraint in store.constraints
+            }
+            missing = fill_layers(stack, class_names, layer_val_dicts)
+        return LoadedMatrix(class_val_dict, missing, store.compact, True, digest)
+
+    dru = parse_dru(data)
+    layer_val_dicts = get_layer_val_dicts(dru, stack.constraints)
+    compact = is_compact(dru)
+    missing = fill_layers(stack, class_names, layer_val_dicts)
+
+    other_pairs = get_other_pairs(layer_val_dicts, missing)
+    store = MatrixStore(
+        list(class_names), stack.values, digest, compact, other_pairs, stack.constraints
+    )
+    write_store(store_path, store)
+
+    return LoadedMatrix(layer_val_dicts[CLEARANCE], missing, compact, False, digest)
@@ -0,0 +1,96 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Parsing and formatting of the lengths entered in the grid and written to the rules.
+
+A length is a number followed by an optional unit, mm when it has none. The number is
+read as a decimal and scaled to whole nanometres, KiCad's internal unit, without going
+through a float, so 0.1234567mm is 123456nm and 1e-3mm is 1000nm. The matrix holds
+millimetres as nm / NM_PER_MM, which format_mm writes back as the same decimal, so a
+value read from the rules is written out exactly as it was read.
+"""
+
+import re
+from decimal import Decimal
+from typing import Optional
+
+NM_PER_MM = 1000000
+
+# Nanometres per unit, by the lower case unit as it can be written
+UNIT_NM = {
+    "mm": NM_PER_MM,
+    "um": 1000,
+    "µm": 1000,
+    "μm": 1000,
+    "mil": 25400,
+    "mils": 25400,
+    "thou": 25400,
+    "in": 25400000,
+    "inch": 25400000,
+}
+
+# Number, with a point or a comma as decimal separator, and the unit following it. The unit
+# has to end the word, so that text such as "0.5 inherited" is read as mm. The exponent is
+# kept to three digits, which keeps every value within the range of the decimal context.
+VALUE_RE = re.compile(
+    r"\s*([-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][-+]?\d{1,3})?)\s*"
+    r"(?:(mm|um|µm|μm|mils?|thou|inch|in)(?![^\W\d_]))?",
+    re.I,
+)
+
+
+def parse_nm(text: str, low: int, high: int) -> Optional[int]:
+    """Get the length at the start of a text in nanometres. Any text after the number and
+    its unit is ignored, and the length is truncated to whole nanometres.
+
+    :param text: Text such as "0.2", "0.2mm", "8 mil" or "1e-3".
+    :param low: Smallest length to give, in nm.
+    :param high: Largest length to give, in nm.
+    :return: Length in nm clamped to low and high, None if the text has no number.
+    """
+    match = VALUE_RE.match(text)
+    if match is None:
+        return None
+
+    number, unit = match.groups()
+    nm = Decimal(number.replace(",", ".")) * UNIT_NM[unit.lower() if unit else "mm"]
+    if nm <= low:
+        return low
+    if nm >= high:
+        return high
+    return int(nm)
+
+
+def nm_to_mm(nm: int) -> float:
+    """Get a length in nanometres as millimetres, the nearest float to the exact value.
+
+    :param nm: Length in nm.
+    :return: Length in mm.
+    """
+    return nm / NM_PER_MM
+
+
+def format_mm(value: float) -> str:
+    """Format a length in millimetres as the decimal it was parsed from, with at least one
+    decimal place and no exponent, the inverse of parse_nm for whole nanometres.
+
+    :param value: Length in mm.
+    :return: Decimal text, such as "5.0" or "0.000001".
+    """
+    nm = round(value * NM_PER_MM)
+    whole, fraction = divmod(abs(nm), NM_PER_MM)
+    sign = "-" if nm < 0 else ""
+    return f"{sign}{whole}.{f'{fraction:06d}'.rstrip('0') or '0'}"
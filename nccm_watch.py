@@ -0,0 +1,211 @@
+# Net Class Clearance Matrix (NCCM) KiCad Plugin
+# Copyright (C) 2025 Mage Control Systems Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Watching of the custom rules file for changes made outside of the plugin, such as in
+the Custom Rules editor of KiCad's Board Setup.
+
+Watchers are polled from the GUI thread and only say whether the file may have changed.
+On Linux inotify is read without blocking, so a poll costs a single read call. Anywhere
+else, or if inotify cannot be used, the modification time and size of the file are
+compared instead. The section is then hashed and only parsed if it differs from the one
+last seen.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import struct
+import sys
+from dataclasses import dataclass, field
+from typing import Optional
+
+from nccm_core import fill_layers
+from nccm_dru import (
+    CONSTRAINTS,
+    find_section,
+    get_layer_val_dicts,
+    is_compact,
+    parse_dru,
+)
+from nccm_matrix import MatrixStack
+from nccm_netclass import get_file_key
+from nccm_store import MatrixStore, get_other_pairs, get_store_path, write_store
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+# Files are replaced as often as they are written in place, so the directory is watched
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# Watch descriptor, mask, cookie and name length of an inotify event
+EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Watcher comparing the modification time and size of the file.
+
+    :param path: Path of the file to watch.
+    :param key: Modification time and size of the file when last polled.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key = get_file_key(path)
+
+    def changed(self) -> bool:
+        """Check if the file may have changed since the last poll.
+
+        :return: True if it may have.
+        """
+        key = get_file_key(self.path)
+        if key == self.key:
+            return False
+
+        self.key = key
+        return True
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watcher reading the inotify events of the directory of the file.
+
+    :param path: Path of the file to watch.
+    :param name: Name of the file, as given in the events.
+    :param fd: inotify file descriptor, read without blocking.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.fsencode(os.path.basename(path))
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        directory = os.fsencode(os.path.dirname(os.path.abspath(path)))
+        if libc.inotify_add_watch(self.fd, directory, WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def changed(self) -> bool:
+        """Check if the file may have changed since the last poll.
+
+        :return: True if any event of the file is waiting.
+        """
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            pos = 0
+            while pos < len(data):
+                _, mask, _, length = EVENT.unpack_from(data, pos)
+                pos += EVENT.size
+                name = data[pos : pos + length].rstrip(b"\0")
+                pos += length
+                if name == self.name or mask & IN_Q_OVERFLOW:
+                    changed = True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def get_watcher(path: str):
+    """Get the best watcher available for a file.
+
+    :param path: Path of the file to watch, which does not need to exist yet.
+    :return: An InotifyWatcher on Linux, otherwise a PollingWatcher.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError, TypeError):
+            pass
+
+    return PollingWatcher(path)
+
+
+@dataclass
+class SectionMatrix:
+    """Matrix read from the NCCM section of a custom rules file.
+
+    :param layers: Values of every constraint type of the section.
+    :param digest: SHA-256 of the section, None if the file has no section.
+    :param missing: Class pairs naming classes that are not in the matrix.
+    :param compact: The section was written with grouped rules.
+    """
+
+    layers: MatrixStack
+    digest: Optional[bytes]
+    missing: list[tuple] = field(default_factory=list)
+    compact: bool = False
+
+
+def read_section_matrix(
+    dru_path: str, class_names: list[str], digest: Optional[bytes]
+) -> Optional[SectionMatrix]:
+    """Read the NCCM section of a custom rules file again if it changed. Only the bytes
+    of the section are parsed, and the result is stored for the next load. A deleted file
+    is not taken as a request to empty the grid, the next update writes it again.
+
+    :param dru_path: Path to the .kicad_dru file.
+    :param class_names: Net class names indexed by row/column.
+    :param digest: SHA-256 of the section last read, None if there was no section.
+    :return: The section, None if it is the same as the one last read or the file is gone.
+    """
+    try:
+        f_read = open(dru_path, "rb")
+        data = f_read.read()
+        f_read.close()
+    except FileNotFoundError:
+        return None
+
+    span = find_section(data)
+    section = data[span[0] : span[1]] if span is not None else None
+    new_digest = hashlib.sha256(section).digest() if section is not None else None
+    if new_digest == digest:
+        return None
+
+    stack = MatrixStack(len(class_names), CONSTRAINTS)
+    if section is None:
+        return SectionMatrix(stack, None)
+
+    dru = parse_dru(section)
+    layer_val_dicts = get_layer_val_dicts(dru, stack.constraints)
+    compact = is_compact(dru)
+    missing = fill_layers(stack, class_names, layer_val_dicts)
+
+    other_pairs = get_other_pairs(layer_val_dicts, missing)
+    store = MatrixStore(
+        list(class_names), stack.values, new_digest, compact, other_pairs, stack.constraints
+    )
+    write_store(get_store_path(dru_path), store)
+
+    return SectionMatrix(stack, new_digest, missing, compact)
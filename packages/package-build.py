@@ -9,6 +9,16 @@ ARCHIVE = "nccm-archive"
 PCM = "pcm"
 ACTION_FILE = "nccm_action.py"
 GUI_FILE = "nccm_gui.py"
+MATRIX_FILE = "nccm_matrix.py"
+DRU_FILE = "nccm_dru.py"
+CORE_FILE = "nccm_core.py"
+NETCLASS_FILE = "nccm_netclass.py"
+PROFILE_FILE = "nccm_profile.py"
+STORE_FILE = "nccm_store.py"
+WATCH_FILE = "nccm_watch.py"
+AUDIT_FILE = "nccm_audit.py"
+UNITS_FILE = "nccm_units.py"
+LAYOUT_FILE = "nccm_layout.py"
 ICON24_FILE = "icon24.png"
 ICON64_FILE = "icon64.png"
 METADATA_JSON = "metadata.json"
@@ -53,6 +63,16 @@ if __name__ == "__main__":
     pcm_path = os.path.join(dir, PCM)
     action_file_path = os.path.join("..", ACTION_FILE)
     gui_file_path = os.path.join("..", GUI_FILE)
+    matrix_file_path = os.path.join("..", MATRIX_FILE)
+    dru_file_path = os.path.join("..", DRU_FILE)
+    core_file_path = os.path.join("..", CORE_FILE)
+    netclass_file_path = os.path.join("..", NETCLASS_FILE)
+    profile_file_path = os.path.join("..", PROFILE_FILE)
+    store_file_path = os.path.join("..", STORE_FILE)
+    watch_file_path = os.path.join("..", WATCH_FILE)
+    audit_file_path = os.path.join("..", AUDIT_FILE)
+    units_file_path = os.path.join("..", UNITS_FILE)
+    layout_file_path = os.path.join("..", LAYOUT_FILE)
     requirements_file_path = os.path.join("..", REQUIREMENTS)
     plugin_json_path = os.path.join("..", PLUGIN_JSON)
     icon24_path = os.path.join("..", os.path.join("images", ICON24_FILE))
@@ -79,6 +99,16 @@ if __name__ == "__main__":
     os.mkdir(plugins_path)
     shutil.copy(action_file_path, plugins_path)
     shutil.copy(gui_file_path, plugins_path)
+    shutil.copy(matrix_file_path, plugins_path)
+    shutil.copy(dru_file_path, plugins_path)
+    shutil.copy(core_file_path, plugins_path)
+    shutil.copy(netclass_file_path, plugins_path)
+    shutil.copy(profile_file_path, plugins_path)
+    shutil.copy(store_file_path, plugins_path)
+    shutil.copy(watch_file_path, plugins_path)
+    shutil.copy(audit_file_path, plugins_path)
+    shutil.copy(units_file_path, plugins_path)
+    shutil.copy(layout_file_path, plugins_path)
     shutil.copy(icon24_path, plugins_path)
     shutil.copy(plugin_json_path, plugins_path)
     shutil.copy(requirements_file_path, plugins_path)
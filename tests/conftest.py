@@ -0,0 +1,16 @@
+import os
+
+import pytest
+from nccm_fake import FAKE_KICAD_ENV
+from nccm_netclass import CACHE_DIR_ENV
+
+TEST_PROJECT = os.path.join(os.path.dirname(__file__), "test-project-nccm")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fake_kicad(tmp_path_factory):
+    """Serve the test project through the KiCad stand-in, unless NCCM_FAKE_KICAD is
+    already set. Setting it to an empty string uses the running KiCad instead."""
+    os.environ.setdefault(FAKE_KICAD_ENV, TEST_PROJECT)
+    os.environ.setdefault(CACHE_DIR_ENV, str(tmp_path_factory.mktemp("cache")))
+    yield
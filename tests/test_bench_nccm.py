@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks"))
+
+from bench_nccm import compare, main, run  # noqa: E402
+
+
+def test_run():
+    results = run([5], 1, ["parse_dru", "update_rewrite"])
+    assert [(result["name"], result["n"]) for result in results["results"]] == [
+        ("parse_dru", 5),
+        ("update_rewrite", 5),
+    ]
+    assert results["results"][0]["min_s"] > 0
+
+
+def test_compare(tmp_path):
+    baseline = {"results": [{"name": "parse_dru", "n": 5, "min_s": 1.0}]}
+    current = {
+        "results": [
+            {"name": "parse_dru", "n": 5, "min_s": 2.0},
+            {"name": "parse_dru", "n": 34, "min_s": 2.0},
+        ]
+    }
+    assert compare(baseline, current) == ["! parse_dru                 N=5         2.00x"]
+
+    baseline_path = tmp_path / "baseline.json"
+    baseline_path.write_text(json.dumps(baseline))
+    output_path = tmp_path / "results.json"
+    args = ["--sizes", "5", "--repeat", "1", "--only", "parse_dru", "-o", str(output_path)]
+    assert main(args + ["--compare", str(baseline_path)]) == 0
+    assert json.loads(output_path.read_text())["results"][0]["n"] == 5
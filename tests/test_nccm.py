@@ -2,10 +2,18 @@ import pytest
 import wx
 import wx.grid
 import os
+import subprocess
+import sys
+import time
+import nccm_action
+import nccm_fake
 from nccm_action import NetClassClearanceMatrix, Info, convert_to_float, MAX, MIN
+from nccm_dru import read_dru
+from nccm_matrix import ClearanceMatrix, pair_baselines
 
-# INFO: Please remember to open the test-project-nccm.kicad_pcb before running the tests
-# since the KiCAD Plugin API attaches to a running KiCAD instance.
+# INFO: The test project is served by the KiCad stand-in unless NCCM_FAKE_KICAD is set to
+# an empty string, then please remember to open the test-project-nccm.kicad_pcb before
+# running the tests since the KiCAD Plugin API attaches to a running KiCAD instance.
 
 
 @pytest.fixture(scope="module")
@@ -26,6 +34,27 @@ def test_frame_title(frame: NetClassClearanceMatrix):
     assert frame.GetTitle() == "Net Class Clearance Matrix"
 
 
+def test_action_imports():
+    # Opening the plugin on the KiCad stand-in imports neither NumPy nor kipy
+    code = (
+        "import sys, nccm_action;"
+        "heavy = {'numpy', 'kipy', 'concurrent.futures'} & set(sys.modules);"
+        "assert not heavy, heavy"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=repo_root, check=True)
+
+    # The stand-in itself is only imported once a board is asked for
+    code = "import sys, nccm_action; assert 'nccm_fake' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=repo_root, check=True)
+    assert nccm_action.FAKE_KICAD_ENV == nccm_fake.FAKE_KICAD_ENV
+
+
+def test_connect_bad_project(frame: NetClassClearanceMatrix, monkeypatch):
+    monkeypatch.setenv(nccm_action.FAKE_KICAD_ENV, "no/such/project")
+    assert frame.connect().startswith("Unable to open the board.")
+
+
 def test_info_dialogue(app):
     info_dialogue = Info("Text")
     assert info_dialogue.GetTitle() == "Net Class Clearance Matrix"
@@ -173,6 +202,132 @@ def test_remove_from_custom_rules(frame: NetClassClearanceMatrix):
         assert frame.gridNCCM.GetCellValue(valid_coords) == ""
 
 
+def test_bulk_edits(frame: NetClassClearanceMatrix):
+    frame.gridNCCM.SetGridCursor(0, 1)
+    assert frame.paste_text("1.5\t2\n-\t0.3\n") == 3
+    assert frame.coord_val_dict == {(0, 1): 1.5, (0, 2): 2.0, (1, 2): 0.3, (2, 3): 5.0}
+
+    assert frame.fill_class(4, 0.8) == 5
+    assert frame.gridNCCM.GetCellValue(3, 4) == "0.8 mm"
+    assert frame.gridNCCM.GetCellValue(4, 3) == "-"
+
+    frame.gridNCCM.SelectBlock(3, 0, 4, 1)
+    assert frame.fill_selection(0.1) == 4
+    assert frame.coord_val_dict[(1, 4)] == 0.1
+
+
+def test_sync_file(frame: NetClassClearanceMatrix):
+    dru_path = os.path.join(frame.project.path, frame.project.name + ".kicad_dru")
+
+    f_read = open(dru_path, "r")
+    file_contents_before_test = f_read.read()
+    f_read.close()
+
+    def write_value(value):
+        f_write = open(dru_path, "w")
+        f_write.write(file_contents_before_test.replace("5.0mm", value))
+        f_write.close()
+
+    try:
+        # A cell left alone takes the value written outside of the plugin
+        write_value("2.5mm")
+        assert frame.sync_file() == 0
+        assert frame.coord_val_dict == {(2, 3): 2.5}
+
+        # A cell edited in both places keeps the grid's value and is flagged
+        frame.gridNCCM.SetCellValue(2, 3, "1.0")
+        write_value("3.0mm")
+        assert frame.sync_file() == 1
+        assert frame.coord_val_dict == {(2, 3): 1.0}
+        assert frame.table.conflicts == {(2, 3)}
+    finally:
+        f_write = open(dru_path, "w")
+        f_write.write(file_contents_before_test)
+        f_write.close()
+
+
+def test_constraint_layers(frame: NetClassClearanceMatrix):
+    dru_path = os.path.join(frame.project.path, frame.project.name + ".kicad_dru")
+
+    f_read = open(dru_path, "r")
+    file_contents_before_test = f_read.read()
+    f_read.close()
+
+    try:
+        # Each constraint type is a layer of its own, without a net class baseline
+        frame.choiceConstraint.SetSelection(1)
+        frame.select_constraint(wx.EVT_CHOICE)
+        assert frame.constraint == "hole_clearance"
+        assert frame.coord_val_dict == {}
+        assert frame.gridNCCM.GetCellValue(2, 3) == ""
+
+        # Both constraints of the pair are written in its one rule
+        frame.gridNCCM.SetCellValue(2, 3, "0.8")
+        frame.update_custom_rules(wx.EVT_BUTTON)
+        _, dru = read_dru(dru_path)
+        assert [rule.constraints for rule in dru.nccm_rules] == [
+            {"clearance": {"min": "5.0mm"}, "hole_clearance": {"min": "0.8mm"}}
+        ]
+
+        frame.show_layer("clearance")
+        assert frame.coord_val_dict == {(2, 3): 5.0}
+    finally:
+        f_write = open(dru_path, "w")
+        f_write.write(file_contents_before_test)
+        f_write.close()
+
+
+def test_size_grid(frame: NetClassClearanceMatrix):
+    # Long names are shortened in the column labels, the rows keep them whole
+    assert frame.gridNCCM.GetColLabelValue(4) == "THIS_I…_NAME"
+    assert frame.gridNCCM.GetRowLabelValue(4) == "THIS_IS_A_LONG_NET_CLASS_NAME"
+    assert len({frame.gridNCCM.GetColSize(col) for col in range(5)}) == 1
+
+    # The first layout of 300 classes measures their names, the next ones reuse them
+    class_names = [f"CLASS_{index:03d}_OF_A_LARGE_BOARD" for index in range(300)]
+    frame.table.reset(ClearanceMatrix(300), class_names, pair_baselines([0.0] * 300))
+    for _ in range(2):
+        start = time.perf_counter()
+        frame.size_grid()
+        assert time.perf_counter() - start < 0.1
+
+    # Grids wider than a screen get their column labels on their side
+    assert frame.gridNCCM.GetColLabelTextOrientation() == wx.VERTICAL
+    assert frame.gridNCCM.GetColSize(299) < frame.gridNCCM.GetColLabelSize()
+
+
+def test_audit_board(frame: NetClassClearanceMatrix):
+    frame.audit_board(wx.EVT_BUTTON)
+
+    # BAT- and LED copper is 1.94mm apart on the test board, under the 5mm of the matrix
+    assert frame.table.audit.get(2, 3) == pytest.approx(1.94)
+    assert frame.table.get_heat_level(2, 3) is not None
+    assert frame.table.get_heat_level(1, 2) is None
+
+    # The shading follows the value as it is edited
+    frame.gridNCCM.SetCellValue(2, 3, "1.5")
+    assert frame.table.get_heat_level(2, 3) is None
+
+
+def test_preview_value(frame: NetClassClearanceMatrix):
+    assert frame.preview_value(2, 3, "3.0") is None
+
+    frame.audit_board(wx.EVT_BUTTON)
+    assert frame.preview_value(2, 3, "3.0") == 2
+    assert frame.txtAudit.GetLabel() == "BAT- / LED at 3.0 mm: 2 violations"
+    assert frame.preview_value(2, 3, "1.5") == 0
+
+    # Values further than the audit reached measure the two classes again
+    assert frame.table.audit.get(1, 3) == float("inf")
+    assert frame.preview_value(1, 3, "10") == 1
+    assert frame.table.audit.get(1, 3) == pytest.approx(6.42)
+
+    # The audit is dropped once the board changes
+    frame.audit_cache.revision = None
+    assert frame.preview_value(2, 3, "3.0") is None
+    assert frame.table.audit is None
+
+
 def test_convert_to_float():
     assert convert_to_float("0.1234567") == 0.123456
     assert convert_to_float("999999999") == MAX
@@ -0,0 +1,172 @@
+import math
+import time
+
+import pytest
+import nccm_audit
+import nccm_fake
+from nccm_audit import (
+    ALL_LAYERS,
+    AuditCache,
+    CopperItems,
+    audit_clearances,
+    get_pad_capsule,
+    get_reach,
+    read_board_copper,
+    segment_distance,
+)
+from nccm_core import Project, get_class_clearances
+from nccm_fake import write_synthetic_project
+from nccm_matrix import ClearanceMatrix, packed_index, pair_baselines
+
+CLASS_NAMES = ["Default", "BAT+", "BAT-", "LED", "THIS_IS_A_LONG_NET_CLASS_NAME"]
+NM = 1000000
+
+MEASURES = [False, pytest.param(True, marks=pytest.mark.skipif(
+    nccm_audit.get_numpy() is None, reason="NumPy is not installed"
+))]
+
+
+def read_synthetic_board(directory, class_count, track_count, seed=0):
+    pro_path = write_synthetic_project(directory, class_count, track_count=track_count, seed=seed)
+    project = Project(pro_path)
+    class_names = [net_class.name for net_class in project.get_net_classes()]
+    board = nccm_fake.Board(project)
+    return read_board_copper(board, class_names, nccm_fake.is_copper_layer)
+
+
+def iter_item_distances(items):
+    for a in range(len(items)):
+        for b in range(a + 1, len(items)):
+            if items.nets[a] == items.nets[b] or not items.layers[a] & items.layers[b]:
+                continue
+            distance = segment_distance(
+                items.x1[a], items.y1[a], items.x2[a], items.y2[a],
+                items.x1[b], items.y1[b], items.x2[b], items.y2[b],
+            )
+            yield a, b, max(distance - items.radius[a] - items.radius[b], 0) / NM
+
+
+def brute_force(items, class_count, reach):
+    achieved = [math.inf] * (class_count * (class_count + 1) // 2)
+    for a, b, distance in iter_item_distances(items):
+        if distance <= reach:
+            index = packed_index(*sorted((items.classes[a], items.classes[b])))
+            achieved[index] = min(achieved[index], distance)
+    return achieved
+
+
+def get_pair_distances(items, row, col):
+    return [
+        distance
+        for a, b, distance in iter_item_distances(items)
+        if sorted((items.classes[a], items.classes[b])) == [row, col]
+    ]
+
+
+def test_segment_distance():
+    assert segment_distance(0, 0, 10, 0, 0, 5, 10, 5) == 5
+    assert segment_distance(0, 0, 10, 10, 0, 10, 10, 0) == 0
+    assert segment_distance(0, 0, 10, 0, 13, 4, 13, 4) == 5
+    assert segment_distance(3, 3, 3, 3, 0, 0, 0, 0) == math.hypot(3, 3)
+
+
+def test_pad_capsule():
+    start, end, radius = get_pad_capsule(0, 0, 4, 2, 0)
+    assert (start, end, radius) == ((-1, 0), (1, 0), 1)
+
+    # A tall pad, or a wide one turned by 90 degrees, lies along the Y axis
+    start, end, radius = get_pad_capsule(0, 0, 2, 4, 0)
+    assert radius == 1
+    assert start[0] == pytest.approx(0) and abs(end[1] - start[1]) == pytest.approx(2)
+    assert get_pad_capsule(0, 0, 4, 2, 90)[0] == pytest.approx((0, 1))
+
+
+@pytest.mark.parametrize("use_numpy", MEASURES)
+def test_audit_items(use_numpy):
+    items = CopperItems()
+    items.add((0, 0), (10 * NM, 0), 0.1 * NM, 1, 0, 0, "a")
+    items.add((0, 0.5 * NM), (10 * NM, 0.5 * NM), 0.1 * NM, 1, 1, 1, "b")
+    # Same net as a, then on another layer than a and b
+    items.add((0, 0.25 * NM), (10 * NM, 0.25 * NM), 0.1 * NM, 1, 0, 1, "c")
+    items.add((0, 0.3 * NM), (10 * NM, 0.3 * NM), 0.1 * NM, 2, 2, 2, "d")
+    # A via reaching every layer
+    items.add((20 * NM, 0), (20 * NM, 0), 0.3 * NM, ALL_LAYERS, 3, 2, "e")
+
+    audit = audit_clearances(items, 3, 10.0, use_numpy)
+    assert audit.get(0, 1) == pytest.approx(0.3)
+    assert audit.get(1, 1) == pytest.approx(0.05)
+    assert audit.get(0, 2) == pytest.approx(9.6)
+    assert audit.get(0, 0) == math.inf
+
+    # Pairs beyond the reach are not measured
+    assert audit_clearances(items, 3, 1.0, use_numpy).get(0, 2) == math.inf
+
+
+@pytest.mark.parametrize("use_numpy", MEASURES)
+def test_audit_synthetic(tmp_path, use_numpy):
+    items = read_synthetic_board(str(tmp_path), 12, 300, seed=4)
+    audit = audit_clearances(items, 12, 1.0, use_numpy)
+    assert list(audit.achieved) == pytest.approx(brute_force(items, 12, 1.0))
+
+
+@pytest.mark.parametrize("use_numpy", MEASURES)
+def test_audit_cache(tmp_path, use_numpy):
+    items = read_synthetic_board(str(tmp_path), 8, 300, seed=2)
+    cache = AuditCache(items, 8, "revision", 0.5, use_numpy)
+    assert cache.is_current("revision") and not cache.is_current("other")
+
+    for row, col in ((1, 3), (2, 5)):
+        pair_distances = get_pair_distances(items, row, col)
+        for clearance in (0.3, 0.5, 2.0, 1.0, 4.0):
+            count = cache.count_violations(row, col, clearance)
+            assert count == sum(distance < clearance for distance in pair_distances)
+
+        # The pair was measured as far as the largest clearance asked for
+        measure = cache.pairs[packed_index(row, col)]
+        assert measure.reach == 4.0
+        assert len(measure.item_ids) == len(measure.distances)
+        assert cache.audit.get(row, col) == pytest.approx(measure.distances[0])
+
+
+def test_audit_cache_classes(tmp_path, monkeypatch):
+    items = read_synthetic_board(str(tmp_path), 8, 300, seed=2)
+    cache = AuditCache(items, 8, None, 0.5)
+
+    # Only the items of the two classes are measured again
+    measured = []
+    subset = CopperItems.subset
+    monkeypatch.setattr(CopperItems, "subset", lambda self, indices: measured.append(
+        {items.classes[index] for index in indices}
+    ) or subset(self, indices))
+    cache.count_violations(1, 3, 2.0)
+    assert measured == [{1, 3}]
+
+    # A clearance within the reach already measured needs no measuring
+    cache.count_violations(1, 3, 1.0)
+    assert len(measured) == 1
+
+
+def test_audit_test_project():
+    board = nccm_fake.KiCad().get_board()
+    items = read_board_copper(board, CLASS_NAMES, nccm_fake.is_copper_layer)
+    assert len(items) == 6
+    assert items.ids[0] == "04557f7d-8dc5-4172-a7e8-dcda406cfa59"
+
+    matrix = ClearanceMatrix(5)
+    matrix.set(2, 3, 5.0)
+    net_classes = board.get_project().get_net_classes()
+    baselines = pair_baselines(get_class_clearances(net_classes))
+    assert get_reach(matrix, baselines) == 5.0
+
+    # GND and the LED are 1.94mm apart where the matrix asks for 5mm
+    audit = audit_clearances(items, 5, get_reach(matrix, baselines))
+    assert list(audit.iter_violations(matrix, baselines)) == [((2, 3), 5.0, pytest.approx(1.94))]
+
+
+def test_audit_time(tmp_path):
+    items = read_synthetic_board(str(tmp_path), 200, 10000)
+
+    start = time.perf_counter()
+    audit = audit_clearances(items, 200, 2.0)
+    assert time.perf_counter() - start < 5
+    assert sum(distance < math.inf for distance in audit.achieved) > 0
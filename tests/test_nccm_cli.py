@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+from nccm import main
+from nccm_dru import read_dru
+
+TEST_PROJECT = os.path.join(os.path.dirname(__file__), "test-project-nccm")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def project(tmp_path):
+    path = tmp_path / "test-project-nccm"
+    shutil.copytree(TEST_PROJECT, path)
+    yield path
+
+
+def read_text(path) -> str:
+    with open(path, "r", encoding="utf-8") as f_read:
+        return f_read.read()
+
+
+def test_export_csv(project, capsys):
+    assert main(["export", str(project)]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == ",Default,BAT+,BAT-,LED,THIS_IS_A_LONG_NET_CLASS_NAME"
+    assert lines[3] == "BAT-,-,-,,5.0,"
+
+
+def test_export_apply_round_trip(project, tmp_path):
+    dru_path = project / "test-project-nccm.kicad_dru"
+    before = read_text(dru_path)
+
+    for name in ("matrix.csv", "matrix.json"):
+        matrix_path = str(tmp_path / name)
+        assert main(["export", str(project), "-o", matrix_path]) == 0
+        assert main(["apply", str(project), matrix_path]) == 0
+        assert read_text(dru_path) == before
+
+    data = json.loads(read_text(tmp_path / "matrix.json"))
+    assert data["clearances"] == [{"a": "BAT-", "b": "LED", "clearance": 5.0}]
+
+
+def test_apply_json(project, tmp_path, capsys):
+    matrix_path = tmp_path / "matrix.json"
+    matrix_path.write_text(
+        json.dumps(
+            {
+                "clearances": [
+                    {"a": "LED", "b": "BAT+", "clearance": 0.5},
+                    {"a": "LED", "b": "LED", "clearance": "0.1mm"},
+                    {"a": "HV", "b": "LED", "clearance": 2},
+                ]
+            }
+        )
+    )
+
+    assert main(["apply", str(project), str(matrix_path)]) == 0
+    captured = capsys.readouterr()
+    assert "updated (1 rules)" in captured.out
+    assert "HV to LED" in captured.err
+
+    # LED to LED is below the Default clearance so no rule is needed
+    _, dru = read_dru(str(project / "test-project-nccm.kicad_dru"))
+    assert [rule.class_pair for rule in dru.nccm_rules] == [("BAT+", "LED")]
+
+
+def test_apply_keeps_other_constraints(project, tmp_path):
+    dru_path = project / "test-project-nccm.kicad_dru"
+    dru_path.write_text(
+        read_text(dru_path).replace(
+            "(constraint clearance (min 5.0mm))",
+            "(constraint clearance (min 5.0mm))\n  (constraint hole_clearance (min 0.8mm))",
+        )
+    )
+    matrix_path = tmp_path / "matrix.json"
+    matrix_path.write_text(json.dumps({"clearances": [{"a": "LED", "b": "BAT-", "clearance": 4}]}))
+
+    # The matrix file only sets the clearance, the hole clearance of the pair stays
+    assert main(["apply", str(project), str(matrix_path)]) == 0
+    _, dru = read_dru(str(dru_path))
+    assert len(dru.nccm_rules) == 1
+    assert dru.nccm_rules[0].constraints == {
+        "clearance": {"min": "4.0mm"},
+        "hole_clearance": {"min": "0.8mm"},
+    }
+
+
+def test_clear(project, capsys):
+    assert main(["clear", str(project)]) == 0
+    assert main(["clear", str(project)]) == 0
+
+    assert capsys.readouterr().out.splitlines() == [
+        "test-project-nccm: cleared",
+        "test-project-nccm: no NCCM section",
+    ]
+    assert read_text(project / "test-project-nccm.kicad_dru").strip() == "(version 1)"
+
+
+def test_errors(tmp_path, capsys):
+    assert main(["clear", str(tmp_path)]) == 1
+    assert "Expected one .kicad_pro file" in capsys.readouterr().err
+
+
+def test_no_gui_imports(project):
+    code = (
+        "import sys, nccm; nccm.main(['export', sys.argv[1]]);"
+        "assert 'wx' not in sys.modules and 'kipy' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code, str(project)], cwd=REPO_ROOT, check=True)
+
+
+def test_batch(tmp_path, capsys):
+    boards = tmp_path / "boards"
+    for name in ("a", "b", "c"):
+        shutil.copytree(TEST_PROJECT, boards / name)
+    os.remove(boards / "b" / "test-project-nccm.kicad_dru")
+    os.remove(boards / "c" / "test-project-nccm.kicad_pro")
+
+    matrix_path = tmp_path / "matrix.json"
+    matrix_path.write_text(
+        json.dumps(
+            {
+                "clearances": [
+                    {"a": "bat-", "b": "led", "clearance": 5.0},
+                    {"a": "Battery+", "b": "LED", "clearance": 0.5},
+                ]
+            }
+        )
+    )
+    map_path = tmp_path / "map.json"
+    map_path.write_text(json.dumps({"Battery+": "BAT+"}))
+
+    args = ["batch", str(matrix_path), str(boards / "*"), "--map", str(map_path)]
+    assert main(args + ["-j", "2"]) == 1
+
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == [
+        f"{boards / 'a'}: updated (2 rules)",
+        f"{boards / 'b'}: created (2 rules)",
+        "1 created, 1 updated, 0 unchanged, 1 failed",
+    ]
+    assert f"{boards / 'c'}: failed, Expected one .kicad_pro file" in captured.err
+
+    _, dru = read_dru(str(boards / "b" / "test-project-nccm.kicad_dru"))
+    assert [rule.class_pair for rule in dru.nccm_rules] == [("BAT+", "LED"), ("BAT-", "LED")]
+
+    assert main(args + ["-j", "1"]) == 1
+    assert capsys.readouterr().out.splitlines()[-1] == "0 created, 0 updated, 2 unchanged, 1 failed"
@@ -0,0 +1,160 @@
+import ast
+import os
+import subprocess
+import sys
+import time
+
+from nccm_core import (
+    copy_cells,
+    fill_cells,
+    generate_coords,
+    get_block_cells,
+    get_class_cells,
+    iter_effective_layer_cells,
+    merge_cells,
+    missing_class_message,
+    parse_cell_values,
+    parse_tsv,
+    paste_cells,
+)
+from nccm_matrix import ClearanceMatrix, pair_baselines
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_action_imports():
+    """Get the modules nccm_action imports at its top, apart from wx and the GUI module."""
+    with open(os.path.join(REPO_ROOT, "nccm_action.py"), encoding="utf-8") as f_read:
+        tree = ast.parse(f_read.read())
+
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            modules.append(node.module)
+
+    return [name for name in modules if name.split(".")[0] not in ("wx", "nccm_gui")]
+
+
+def test_generate_coords():
+    valid_coords, invalid_coords = generate_coords(3)
+    assert valid_coords == [(0, 0), (0, 1), (1, 1), (0, 2), (1, 2), (2, 2)]
+    assert sorted(invalid_coords) == [(1, 0), (2, 0), (2, 1)]
+
+    valid_coords, invalid_coords = generate_coords(3, "bot")
+    assert valid_coords == [(0, 0), (1, 0), (1, 1), (2, 0), (2, 1), (2, 2)]
+    assert sorted(invalid_coords) == [(0, 1), (0, 2), (1, 2)]
+
+    assert generate_coords(0) == ([], [])
+
+
+def test_no_heavy_imports():
+    modules = get_action_imports()
+    assert {"nccm_audit", "nccm_core", "nccm_dru"} <= set(modules)
+
+    # NumPy, kipy and the process pool are only imported once they are used
+    code = (
+        f"import sys, {', '.join(modules)};"
+        "heavy = {'numpy', 'kipy', 'concurrent.futures'} & set(sys.modules);"
+        "assert not heavy, heavy"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True)
+
+
+def test_missing_class_message():
+    class_pairs = [(f"A{i}", "B") for i in range(12)]
+    lines = missing_class_message(class_pairs).splitlines()
+
+    assert lines[0].startswith("12 NCCM rule(s)")
+    assert lines[2] == "  A0 to B"
+    assert lines[-1] == "  ...and 2 more"
+    assert len(missing_class_message(class_pairs[:2]).splitlines()) == 4
+
+
+def test_parse_tsv():
+    assert parse_tsv("1\t2\r\n\t3 mm\r\n") == [["1", "2"], ["", "3 mm"]]
+    assert parse_tsv("") == []
+
+
+def test_paste_cells():
+    matrix = ClearanceMatrix(3)
+    matrix.set(2, 2, 9.0)
+
+    # The lower cells go to their mirror, unless the upper cell is pasted too
+    rows = parse_tsv("1\t2\t3\t4\n5\t-\t6\n7\t8\t\n0.5")
+    assert paste_cells(matrix, 0, 0, rows) == 5
+    assert dict(matrix.nonzero()) == {(0, 0): 1.0, (0, 1): 2.0, (0, 2): 3.0, (1, 2): 6.0}
+
+    assert paste_cells(matrix, 2, 1, [["4.5", "1", "1"]]) == 2
+    assert matrix.get(1, 2) == 4.5 and matrix.get(2, 2) == 1.0
+
+    # Units from a spreadsheet are converted to mm
+    assert paste_cells(matrix, 0, 0, [["8 mil", "150um", "0,3"]]) == 3
+    assert [matrix.get(0, col) for col in range(3)] == [0.2032, 0.15, 0.3]
+
+
+def test_parse_cell_values():
+    assert parse_cell_values(["0.2", "8mil", "", "x", "0.2", "1e-3", "-1"]) == [
+        0.2, 0.2032, 0.0, 0.0, 0.2, 0.001, 0.0
+    ]
+
+
+def test_fill_and_copy():
+    matrix = ClearanceMatrix(4)
+    assert fill_cells(matrix, get_block_cells(4, 2, 0, 5, 1), 0.5) == 4
+    assert sorted(coord for coord, _ in matrix.nonzero()) == [(0, 2), (0, 3), (1, 2), (1, 3)]
+
+    assert get_class_cells(3, 1) == [(0, 1), (1, 1), (1, 2)]
+    fill_cells(matrix, get_class_cells(4, 3), 2.0)
+
+    assert copy_cells(matrix, 1, 0, 3, 3) == "\t\t0.5\t2.0\n0.5\t0.5\t\t2.0\n2.0\t2.0\t2.0\t2.0\n"
+
+
+def test_paste_large_block():
+    matrix = ClearanceMatrix(200)
+    rows = [[f"{(row + col) % 7 / 10 + 0.1:.1f}" for col in range(100)] for row in range(100)]
+
+    start = time.perf_counter()
+    assert paste_cells(matrix, 0, 100, rows) == 10000
+    assert time.perf_counter() - start < 0.5
+
+
+def test_merge_cells():
+    base = ClearanceMatrix(4)
+    base.set(0, 1, 0.5)
+    base.set(2, 3, 5.0)
+    base.set(1, 2, 1.0)
+
+    matrix = ClearanceMatrix.from_values(4, base.values[:])
+    matrix.set(2, 3, 4.0)
+    matrix.set(0, 3, 2.0)
+    matrix.set(1, 2, 3.0)
+
+    disk = ClearanceMatrix.from_values(4, base.values[:])
+    disk.set(0, 1, 0)
+    disk.set(2, 3, 6.0)
+    disk.set(1, 1, 0.3)
+    disk.set(1, 2, 3.0)
+
+    updated, conflicts = merge_cells(matrix, base, disk)
+
+    # Untouched cells follow the file, cells edited in both keep the grid's value
+    assert updated == [(0, 1), (1, 1)]
+    assert conflicts == [(2, 3)]
+    assert list(matrix.nonzero()) == [((1, 1), 0.3), ((1, 2), 3.0), ((0, 3), 2.0), ((2, 3), 4.0)]
+
+
+def test_iter_effective_layer_cells():
+    cells = [
+        ((0, 1), (("clearance", 0.1), ("hole_clearance", 0.5))),
+        ((1, 1), (("clearance", 0.2),)),
+        ((1, 2), (("clearance", 0.3), ("physical_clearance", 0.1))),
+    ]
+
+    # Only the clearance is compared with the net classes
+    baselines = pair_baselines([0.2, 0.2, 0.2])
+    assert list(iter_effective_layer_cells(cells, baselines)) == [
+        ((0, 1), (("hole_clearance", 0.5),)),
+        ((1, 2), (("clearance", 0.3), ("physical_clearance", 0.1))),
+    ]
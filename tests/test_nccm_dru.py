@@ -0,0 +1,433 @@
+import os
+import random
+
+import pytest
+import nccm_dru
+from nccm_dru import (
+    CREATED,
+    UNCHANGED,
+    UPDATED,
+    DruSyntaxError,
+    build_section,
+    find_section,
+    get_class_val_dict,
+    get_layer_val_dicts,
+    get_rule_strings,
+    is_compact,
+    iter_rule_strings,
+    parse_dru,
+    read_dru,
+    remove_section,
+    remove_section_from_file,
+    update_rules,
+    write_rules,
+)
+
+TEST_DRU = os.path.join(
+    os.path.dirname(__file__), "test-project-nccm", "test-project-nccm.kicad_dru"
+)
+
+MIXED_DRU = b"""(version 1)
+# A hand written rule
+(rule "HV"
+  (constraint clearance (min 2mm))
+  (condition "A.NetClass == 'HV'"))
+### 4E43434D NCCM SECTION START ###
+
+(rule "CLR_A_to_B_to_C"
+  (severity error)
+  (condition "A.NetClass == 'A_to_B' && B.NetClass == 'C'")
+  (constraint clearance (min 0.25mm))
+)
+### 4E43434D NCCM SECTION END ###
+(rule "after" (layer outer) (constraint track_width (min 0.2mm) (opt 0.3mm)))
+"""
+
+
+def test_parse_test_project():
+    data, dru = read_dru(TEST_DRU)
+
+    assert dru.version == 1
+    assert dru.section_span == (12, len(data))
+    assert dru.other_rules == []
+    assert get_class_val_dict(dru) == {("BAT-", "LED"): "5.0mm"}
+
+    rule = dru.nccm_rules[0]
+    assert rule.name == "CLR_BAT-_to_LED"
+    assert rule.severity == "error"
+    assert rule.clearance == ("5.0", "mm")
+    assert data[rule.span[0] : rule.span[1]].startswith(b'(rule "CLR_BAT-_to_LED"')
+    assert data[rule.span[0] : rule.span[1]].endswith(b")")
+
+
+def test_parse_mixed_rules():
+    dru = parse_dru(MIXED_DRU)
+
+    # Class names are taken from the condition so they can contain _to_
+    assert get_class_val_dict(dru) == {("A_to_B", "C"): "0.25mm"}
+    assert [rule.name for rule in dru.other_rules] == ["HV", "after"]
+    assert dru.other_rules[1].constraints == {
+        "track_width": {"min": "0.2mm", "opt": "0.3mm"}
+    }
+
+    without_section = remove_section(MIXED_DRU, dru)
+    assert b"NCCM" not in without_section
+    assert without_section.startswith(MIXED_DRU[: dru.section_span[0]])
+    assert without_section.endswith(b'(rule "after"' + MIXED_DRU.split(b'(rule "after"')[1])
+
+
+def test_parse_whitespace_independent():
+    reformatted = (
+        MIXED_DRU.replace(b"\n  ", b" ")
+        .replace(b"(min 0.25mm)", b"(\tmin   0.25mm )")
+        .replace(b"(severity error)", b"( severity\nerror )")
+    )
+
+    dru = parse_dru(MIXED_DRU)
+    dru_reformatted = parse_dru(reformatted)
+
+    assert get_class_val_dict(dru) == get_class_val_dict(dru_reformatted)
+    assert [rule.name for rule in dru.other_rules] == [
+        rule.name for rule in dru_reformatted.other_rules
+    ]
+
+
+def test_parse_unterminated_section():
+    data = b"(version 1)\n### 4E43434D NCCM SECTION START ###\n(rule x)\n"
+    dru = parse_dru(data)
+
+    assert dru.section_span == (12, len(data))
+    assert remove_section(data, dru) == b"(version 1)\n"
+
+
+def test_parse_errors():
+    with pytest.raises(DruSyntaxError):
+        parse_dru(b"(version 1)\n(rule \"x\"")
+    with pytest.raises(DruSyntaxError):
+        parse_dru(b"(version 1))")
+    with pytest.raises(DruSyntaxError):
+        parse_dru(b"version 1")
+
+
+def test_update_rules_file(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    rule = "\n(rule \"CLR_BAT-_to_LED\"\n  (severity error)\n  (condition \"A.NetClass == 'BAT-' && B.NetClass == 'LED'\")\n  (constraint clearance (min 5.0mm))\n)\n"
+
+    assert update_rules(dru_path, [rule])[0] == CREATED
+    with open(dru_path, "rb") as f_read:
+        created = f_read.read()
+    with open(TEST_DRU, "rb") as f_read:
+        assert created == f_read.read()
+
+    # Writing the same section again leaves the file alone
+    mtime = os.stat(dru_path).st_mtime_ns
+    assert update_rules(dru_path, [rule])[0] == UNCHANGED
+    assert os.stat(dru_path).st_mtime_ns == mtime
+
+    # Other rules are kept
+    with open(dru_path, "ab") as f_write:
+        f_write.write(b'(rule "other" (constraint clearance (min 1mm)))')
+    assert update_rules(dru_path, [])[0] == UPDATED
+    _, dru = read_dru(dru_path)
+    assert [rule.name for rule in dru.other_rules] == ["other"]
+    assert dru.nccm_rules == []
+
+    assert os.listdir(tmp_path) == ["test.kicad_dru"]
+
+
+def test_update_rules_adds_version(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    with open(dru_path, "wb") as f_write:
+        f_write.write(b"")
+
+    assert update_rules(dru_path, [])[0] == UPDATED
+    _, dru = read_dru(dru_path)
+    assert dru.version == 1
+    assert dru.section_span is not None
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions and symbolic links")
+def test_update_rules_keeps_file(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    with open(dru_path, "wb") as f_write:
+        f_write.write(MIXED_DRU)
+    os.chmod(dru_path, 0o644)
+    rule_strings = get_rule_strings(["A", "B"], [((0, 1), 0.5)])
+
+    update_rules(dru_path, rule_strings)
+    assert os.stat(dru_path).st_mode & 0o777 == 0o644
+
+    # A linked file is written through the link, which stays a link
+    link_path = str(tmp_path / "link.kicad_dru")
+    os.symlink(dru_path, link_path)
+    update_rules(link_path, [])
+    assert os.path.islink(link_path)
+    _, dru = read_dru(dru_path)
+    assert dru.nccm_rules == [] and len(dru.other_rules) == 2
+    assert os.stat(dru_path).st_mode & 0o777 == 0o644
+
+    # A new file gets the permissions of the umask, not those of the temporary file
+    umask = os.umask(0o022)
+    try:
+        new_path = str(tmp_path / "new.kicad_dru")
+        update_rules(new_path, rule_strings)
+        assert os.stat(new_path).st_mode & 0o777 == 0o644
+    finally:
+        os.umask(umask)
+
+
+def test_remove_section_from_file(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    with open(dru_path, "wb") as f_write:
+        f_write.write(MIXED_DRU)
+
+    assert remove_section_from_file(dru_path)
+    assert not remove_section_from_file(dru_path)
+    _, dru = read_dru(dru_path)
+    assert dru.section_span is None
+    assert len(dru.other_rules) == 2
+
+
+def test_get_rule_strings():
+    class_names = ["Default", "BAT+", "BAT-", "LED", "THIS_IS_A_LONG_NET_CLASS_NAME"]
+    section = build_section(get_rule_strings(class_names, [((2, 3), 5.0)]))
+
+    with open(TEST_DRU, "rb") as f_read:
+        assert b"(version 1)\n" + section == f_read.read()
+
+
+def test_compact_rule_strings_round_trip():
+    rng = random.Random(4)
+    class_names = [f"C_to_{i}" for i in range(40)]
+    cells = [
+        ((row, col), rng.choice([0.1, 0.2, 0.5]))
+        for col in range(40)
+        for row in range(col + 1)
+        if rng.random() < 0.8
+    ]
+
+    rule_strings = get_rule_strings(class_names, cells, compact=True)
+    dru = parse_dru(b"(version 1)\n" + build_section(rule_strings))
+
+    assert is_compact(dru)
+    assert len(rule_strings) < len(cells)
+
+    # Pairs are unordered so compare them the way the grid stores them
+    class_index = {name: pos for pos, name in enumerate(class_names)}
+    matrix = {}
+    for (class_a, class_b), value in get_class_val_dict(dru).items():
+        pos_a, pos_b = class_index[class_a], class_index[class_b]
+        matrix[(min(pos_a, pos_b), max(pos_a, pos_b))] = value
+    assert matrix == {coord: f"{value}mm" for coord, value in cells}
+
+
+def test_compact_rule_strings_uniform():
+    class_names = [f"C{i}" for i in range(30)]
+    cells = [((row, col), 0.2) for col in range(30) for row in range(col + 1)]
+
+    rule_strings = get_rule_strings(class_names, cells, compact=True)
+    dru = parse_dru(b"(version 1)\n" + build_section(rule_strings))
+
+    assert len(rule_strings) == 1
+    assert len(get_class_val_dict(dru)) == len(cells) * 2 - 30
+
+
+def test_write_rules(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    class_names = ["Default", "BAT+", "BAT-", "LED", "THIS_IS_A_LONG_NET_CLASS_NAME"]
+    rule_strings = iter_rule_strings(class_names, iter([((2, 3), 5.0)]))
+    assert not isinstance(rule_strings, list)
+
+    assert write_rules(dru_path, rule_strings) == (CREATED, 1)
+    with open(dru_path, "rb") as f_read:
+        created = f_read.read()
+    with open(TEST_DRU, "rb") as f_read:
+        assert created == f_read.read()
+
+    mtime = os.stat(dru_path).st_mtime_ns
+    assert write_rules(dru_path, iter_rule_strings(class_names, [((2, 3), 5.0)])) == (
+        UNCHANGED,
+        1,
+    )
+    assert os.stat(dru_path).st_mtime_ns == mtime
+
+    # A section that only starts the same as the old one is still written
+    cells = [((2, 3), 5.0), ((3, 4), 1.0)]
+    assert write_rules(dru_path, iter_rule_strings(class_names, cells)) == (UPDATED, 2)
+    assert write_rules(dru_path, iter([])) == (UPDATED, 0)
+    assert os.listdir(tmp_path) == ["test.kicad_dru"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_rule_strings_escape_class_names(compact):
+    class_names = ["it's", 'say "hi"', "back\\slash", "plain"]
+    cells = [((0, 1), 0.5), ((2, 3), 0.5), ((1, 2), 0.3)]
+
+    rule_strings = get_rule_strings(class_names, cells, compact)
+    dru = parse_dru(b"(version 1)\n" + build_section(rule_strings))
+
+    class_val_dict = get_class_val_dict(dru)
+    for (row, col), value in cells:
+        pair = (class_names[row], class_names[col])
+        assert class_val_dict.get(pair, class_val_dict.get(pair[::-1])) == f"{value}mm"
+
+
+def test_find_section():
+    for data in [
+        MIXED_DRU,
+        b"(version 1)\n" + build_section([])[:-1],
+        b"(version 1)\n### 4E43434D NCCM SECTION START ###\n(rule \"a\")\n",
+        b"(version 1)\n",
+    ]:
+        assert find_section(data) == parse_dru(data).section_span
+
+
+def test_update_rules_in_place(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    class_names = [f"C{i}" for i in range(6)]
+    cells = [((0, 1), 0.5), ((2, 3), 5.0), ((1, 4), 1.5), ((0, 5), 0.3)]
+
+    # The section sits between hand written rules, which must not move
+    with open(dru_path, "wb") as f_write:
+        f_write.write(
+            b'(version 1)\n(rule "before" (constraint clearance (min 1mm)))\n'
+            + build_section(get_rule_strings(class_names, cells))
+            + b'(rule "after" (constraint clearance (min 2mm)))\n'
+        )
+    with open(dru_path, "rb") as f_read:
+        before = f_read.read()
+
+    # One value changed, one pair dropped and one added
+    new_cells = [((0, 1), 0.5), ((2, 3), 6.0), ((0, 5), 0.3), ((3, 5), 0.8)]
+    status, changes = update_rules(dru_path, iter_rule_strings(class_names, iter(new_cells)))
+    assert status == UPDATED
+    assert (changes.added, changes.changed, changes.removed, changes.kept) == (1, 1, 1, 2)
+    assert changes.rule_count == 4
+    assert changes.summary() == "1 added, 1 changed, 1 removed"
+
+    with open(dru_path, "rb") as f_read:
+        after = f_read.read()
+    assert after.startswith(before[: before.index(b"(min 5.0mm)")])
+    assert after.endswith(b'(rule "after" (constraint clearance (min 2mm)))\n')
+    assert b"CLR_C1_to_C4" not in after
+
+    # Kept rules keep their bytes and the new one goes at the end of the section
+    _, dru = read_dru(dru_path)
+    assert [rule.name for rule in dru.other_rules] == ["before", "after"]
+    assert [rule.name for rule in dru.nccm_rules] == [
+        "CLR_C0_to_C1",
+        "CLR_C2_to_C3",
+        "CLR_C0_to_C5",
+        "CLR_C3_to_C5",
+    ]
+    section = build_section(get_rule_strings(class_names, new_cells))
+    start, end = dru.section_span
+    assert after[start:end] == section
+
+    mtime = os.stat(dru_path).st_mtime_ns
+    status, changes = update_rules(dru_path, iter_rule_strings(class_names, new_cells))
+    assert status == UNCHANGED
+    assert changes.kept == 4
+    assert os.stat(dru_path).st_mtime_ns == mtime
+
+    # Removing every rule leaves an empty section in place
+    assert update_rules(dru_path, iter([]))[1].removed == 4
+    _, dru = read_dru(dru_path)
+    assert dru.nccm_rules == []
+    assert [rule.name for rule in dru.other_rules] == ["before", "after"]
+    assert os.listdir(tmp_path) == ["test.kicad_dru"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_update_rules_same_names(tmp_path, compact):
+    # Both pairs are named CLR_A_to_B_to_C, so they can only be told apart by condition
+    dru_path = str(tmp_path / "test.kicad_dru")
+    class_names = ["A", "B_to_C", "A_to_B", "C"]
+    cells = [((0, 1), 0.5), ((2, 3), 0.8)]
+    assert update_rules(dru_path, iter_rule_strings(class_names, cells, compact))[0] == CREATED
+
+    for _ in range(3):
+        status, changes = update_rules(dru_path, iter_rule_strings(class_names, cells, compact))
+        assert status == UNCHANGED
+        assert changes.summary() == "0 added, 0 changed, 0 removed"
+
+    # Changing one of the pairs rewrites that pair only
+    cells[1] = ((2, 3), 0.9)
+    _, changes = update_rules(dru_path, iter_rule_strings(class_names, cells, compact))
+    assert changes.summary() == "0 added, 1 changed, 0 removed"
+
+
+def test_update_rules_removes_blank_lines(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    class_names = ["Default", "A", "B", "C"]
+    cells = [((0, 1), 0.5), ((1, 2), 1.0), ((0, 2), 1.5), ((2, 3), 2.0), ((0, 3), 2.5)]
+    with open(dru_path, "wb") as f_write:
+        f_write.write(
+            b"(version 1)\n# Kept\n" + build_section(get_rule_strings(class_names, cells))
+        )
+
+    # Removing the rule right after the start marker, then others, then switching to
+    # compact rules, always leaves the section as it would be written from scratch
+    for new_cells, compact in [
+        (cells[1:], False),
+        (cells[2:4], False),
+        (cells[2:4], True),
+        (cells[:1] + cells[3:], False),
+    ]:
+        update_rules(dru_path, iter_rule_strings(class_names, new_cells, compact))
+        with open(dru_path, "rb") as f_read:
+            assert f_read.read() == b"(version 1)\n# Kept\n" + build_section(
+                get_rule_strings(class_names, new_cells, compact)
+            )
+
+
+def test_update_rules_spooled(tmp_path, monkeypatch):
+    # With a tiny buffer the new text of the rules is read back from disk in pieces
+    monkeypatch.setattr(nccm_dru, "WRITE_BUFFER_SIZE", 64)
+    dru_path = str(tmp_path / "test.kicad_dru")
+    class_names = [f"C{i}" for i in range(8)]
+    cells = [((row, col), 0.5) for col in range(8) for row in range(col + 1)]
+    write_rules(dru_path, iter_rule_strings(class_names, cells[::2]))
+
+    # Every rule changes and the rest are added, in no particular order
+    new_cells = [(coords, 1.0 + index / 100) for index, (coords, _) in enumerate(cells)]
+    status, changes = update_rules(dru_path, iter_rule_strings(class_names, new_cells))
+    assert (status, changes.changed, changes.added) == (UPDATED, 18, 18)
+    with open(dru_path, "rb") as f_read:
+        assert f_read.read() == b"(version 1)\n" + build_section(
+            get_rule_strings(class_names, new_cells[::2] + new_cells[1::2])
+        )
+
+
+def test_multi_constraint_rules(tmp_path):
+    dru_path = str(tmp_path / "test.kicad_dru")
+    class_names = ["A", "B", "C"]
+    cells = [
+        ((0, 1), (("clearance", 0.3), ("hole_clearance", 0.5))),
+        ((1, 2), (("physical_clearance", 0.25),)),
+        ((2, 2), 0.2),
+    ]
+
+    # Every constraint of a pair goes in its one rule
+    rule_strings = get_rule_strings(class_names, cells)
+    assert len(rule_strings) == 3
+    assert rule_strings[0].count("(constraint ") == 2
+    assert rule_strings[2] == get_rule_strings(class_names, [((2, 2), (("clearance", 0.2),))])[0]
+
+    dru = parse_dru(build_section(rule_strings))
+    assert get_class_val_dict(dru) == {("A", "B"): "0.3mm", ("C", "C"): "0.2mm"}
+    layer_val_dicts = get_layer_val_dicts(dru)
+    assert layer_val_dicts["hole_clearance"] == {("A", "B"): "0.5mm"}
+    assert layer_val_dicts["physical_clearance"] == {("B", "C"): "0.25mm"}
+    assert layer_val_dicts["physical_hole_clearance"] == {}
+
+    # Pairs are only grouped with pairs having the same constraints
+    compact = parse_dru(build_section(get_rule_strings(class_names, cells, compact=True)))
+    assert get_layer_val_dicts(compact) == layer_val_dicts
+
+    # A constraint changed on one pair rewrites its rule alone
+    write_rules(dru_path, iter_rule_strings(class_names, cells))
+    cells[0] = ((0, 1), (("clearance", 0.3), ("hole_clearance", 0.6)))
+    _, changes = update_rules(dru_path, iter_rule_strings(class_names, cells))
+    assert (changes.added, changes.changed, changes.removed, changes.kept) == (0, 1, 0, 2)
+    assert get_layer_val_dicts(read_dru(dru_path)[1])["hole_clearance"] == {("A", "B"): "0.6mm"}
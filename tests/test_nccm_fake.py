@@ -0,0 +1,69 @@
+import time
+
+import pytest
+import nccm_fake
+from nccm_dru import read_dru
+from nccm_fake import FAKE_KICAD_ENV, FAKE_LATENCY_ENV, KiCad, errors, write_synthetic_project
+
+
+def test_test_project():
+    project = KiCad().get_board().get_project()
+    assert project.name == "test-project-nccm"
+
+    net_classes = project.get_net_classes()
+    assert [net_class.name for net_class in net_classes][:3] == ["Default", "BAT+", "BAT-"]
+    assert net_classes[0].clearance == 200000
+
+
+def test_synthetic(monkeypatch):
+    monkeypatch.setattr(nccm_fake, "synthetic_projects", {})
+    monkeypatch.setenv(FAKE_KICAD_ENV, "synthetic:40:25")
+    project = KiCad().get_board().get_project()
+
+    net_classes = project.get_net_classes()
+    assert len(net_classes) == 40
+    assert net_classes[4].clearance is not None and net_classes[5].clearance is None
+
+    _, dru = read_dru(f"{project.path}/{project.name}.kicad_dru")
+    assert len(dru.nccm_rules) == 25
+    assert KiCad().get_board().get_project().path == project.path
+
+
+def test_synthetic_all_pairs(tmp_path):
+    write_synthetic_project(str(tmp_path), 4, 100)
+    _, dru = read_dru(str(tmp_path / "synthetic.kicad_dru"))
+    assert len(dru.nccm_rules) == 10
+
+
+def test_errors_and_latency(monkeypatch):
+    monkeypatch.setenv(FAKE_KICAD_ENV, "no-kicad")
+    with pytest.raises(errors.ConnectionError):
+        KiCad().get_board()
+
+    monkeypatch.setenv(FAKE_KICAD_ENV, "no-board")
+    monkeypatch.setenv(FAKE_LATENCY_ENV, "20")
+    start = time.perf_counter()
+    with pytest.raises(errors.ApiError):
+        KiCad().get_board()
+    assert time.perf_counter() - start >= 0.04
+
+
+def test_board_copper(tmp_path):
+    board = KiCad().get_board()
+    tracks = board.get_tracks()
+    assert len(tracks) == 6
+    assert (tracks[0].start.x, tracks[0].start.y, tracks[0].width) == (123515000, 89400000, 1600000)
+    assert tracks[0].net.name == "Net-(BT1-+)"
+    assert nccm_fake.is_copper_layer(tracks[0].layer)
+
+    net_classes = board.get_netclass_for_nets([track.net for track in tracks])
+    assert net_classes["GND"].name == "BAT-"
+
+    pro_path = write_synthetic_project(str(tmp_path), 6, track_count=50)
+    board = nccm_fake.Board(nccm_fake.ProjectFile(pro_path))
+    assert len(board.get_tracks()) == 50
+    assert len(board.get_vias()) == 5
+    class_names = [net_class.name for net_class in board.get_project().get_net_classes()]
+    net_classes = board.get_netclass_for_nets([via.net for via in board.get_vias()])
+    for net_name, net_class in net_classes.items():
+        assert net_class.name == class_names[int(net_name.removeprefix("NET_"))]
@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+import pytest
+import nccm_layout
+from nccm_layout import (
+    ROTATE_CLASS_COUNT,
+    VALUE_SAMPLE,
+    ExtentCache,
+    abbreviate,
+    get_grid_layout,
+)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(nccm_layout, "memory_extents", {})
+    yield ExtentCache(str(tmp_path / "cache" / "text_extents.json"))
+
+
+class Measurer:
+    """Text measurement at 7 pixels a character, recording the texts measured."""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return 7 * len(text), 14
+
+
+def test_abbreviate():
+    assert abbreviate("BAT+", 12) == "BAT+"
+    assert abbreviate("THIS_IS_A_LONG_NET_CLASS_NAME", 12) == "THIS_I…_NAME"
+    assert abbreviate("DIFF_90R_USB_LANE1", 8) == "DIFF…NE1"
+    assert abbreviate("LONG", 1) == "…"
+
+
+def test_extent_cache(cache, monkeypatch):
+    measurer = Measurer()
+    assert cache.measure("Sans 9@1.0", ["GND", "VCC", "GND"], measurer) == [
+        (21, 14),
+        (21, 14),
+        (21, 14),
+    ]
+    assert measurer.texts == ["GND", "VCC"]
+
+    # Only the new texts are measured, for each font
+    cache.measure("Sans 9@1.0", ["GND", "HV"], measurer)
+    cache.measure("Sans 9@2.0", ["GND"], measurer)
+    assert measurer.texts == ["GND", "VCC", "HV", "GND"]
+
+    # The next session reads them from the cache file
+    monkeypatch.setattr(nccm_layout, "memory_extents", {})
+    measurer = Measurer()
+    assert ExtentCache(cache.path).measure("Sans 9@1.0", ["HV", "VCC"], measurer) == [
+        (14, 14),
+        (21, 14),
+    ]
+    assert measurer.texts == []
+
+
+def test_bad_extent_file(cache):
+    os.makedirs(os.path.dirname(cache.path))
+    with open(cache.path, "w") as f_write:
+        f_write.write("{not json")
+
+    measurer = Measurer()
+    assert cache.measure("Sans 9@1.0", ["GND"], measurer) == [(21, 14)]
+    with open(cache.path) as f_read:
+        assert json.load(f_read)["fonts"] == {"Sans 9@1.0": {"GND": [21, 14]}}
+
+
+def test_grid_layout(cache):
+    measurer = Measurer()
+
+    def measure(texts):
+        return cache.measure("Sans 9@1.0", texts, measurer)
+
+    class_names = ["Default", "BAT+", "THIS_IS_A_LONG_NET_CLASS_NAME"]
+    layout = get_grid_layout(class_names, measure, 100, 12, 25)
+    assert layout.col_labels == ["Default", "BAT+", "THIS_I…_NAME"]
+    assert not layout.vertical
+    assert (layout.col_width, layout.col_label_height) == (100, 25)
+    assert layout.row_label_width == 7 * 29 + 10
+
+    # Wide grids get narrow columns, as wide as the values, under labels on their side
+    class_names = [f"CLASS_{index:03d}_OF_A_LARGE_BOARD" for index in range(300)]
+    start = time.perf_counter()
+    layout = get_grid_layout(class_names, measure, 100, 12, 25)
+    assert time.perf_counter() - start < 0.1
+    assert ROTATE_CLASS_COUNT < 300 and layout.vertical
+    assert layout.col_width == 7 * len(VALUE_SAMPLE) + 10
+    assert layout.col_label_height == 7 * 12 + 10
+
+    # Laying the same classes out again measures nothing
+    count = len(measurer.texts)
+    assert get_grid_layout(class_names, measure, 100, 12, 25) == layout
+    assert len(measurer.texts) == count
@@ -0,0 +1,140 @@
+import pytest
+from nccm_matrix import (
+    CellValues,
+    ClearanceMatrix,
+    CoordView,
+    InvalidCoordView,
+    MatrixStack,
+    packed_index,
+    packed_length,
+    pair_baselines,
+    unpack_index,
+)
+
+
+def test_packed_length():
+    assert packed_length(0) == 0
+    assert packed_length(5) == 15
+    assert packed_length(300) == 45150
+
+
+def test_packed_index_order():
+    # The packed order follows the valid coordinates column by column
+    coords = [(row, col) for col in range(5) for row in range(col + 1)]
+    assert [packed_index(row, col) for row, col in coords] == list(range(15))
+
+
+def test_get_set():
+    matrix = ClearanceMatrix(5)
+    assert len(matrix.values) == 15
+
+    matrix.set(2, 3, 5.0)
+    assert matrix.get(2, 3) == 5.0
+    assert matrix.is_valid(2, 3)
+    assert not matrix.is_valid(3, 2)
+
+    with pytest.raises(IndexError):
+        matrix.get(3, 2)
+    with pytest.raises(IndexError):
+        matrix.set(0, 5, 1.0)
+
+
+def test_nonzero_and_clear():
+    matrix = ClearanceMatrix(5)
+    matrix.set(0, 0, 0.2)
+    matrix.set(2, 3, 5.0)
+    matrix.set(1, 4, 1.5)
+
+    assert list(matrix.nonzero()) == [((0, 0), 0.2), ((2, 3), 5.0), ((1, 4), 1.5)]
+
+    matrix.clear()
+    assert list(matrix.nonzero()) == []
+
+
+def test_from_values():
+    values = ClearanceMatrix(3).values
+    matrix = ClearanceMatrix.from_values(3, values)
+    matrix.set(1, 2, 0.5)
+    assert values[packed_index(1, 2)] == 0.5
+
+    with pytest.raises(ValueError):
+        ClearanceMatrix.from_values(4, values)
+
+
+def test_pair_baselines():
+    baselines = pair_baselines([0.2, 0.5, 0.1])
+
+    assert list(baselines) == [0.2, 0.5, 0.5, 0.2, 0.5, 0.1]
+    assert baselines[packed_index(0, 2)] == 0.2
+    assert baselines[packed_index(1, 2)] == 0.5
+
+
+def test_unpack_index():
+    for index in range(packed_length(60)):
+        assert packed_index(*unpack_index(index)) == index
+
+
+def test_coord_views():
+    valid = CoordView(4)
+    assert valid == [(r, c) for c in range(4) for r in range(c + 1)]
+    assert valid[-1] == (3, 3) and valid[1:3] == [(0, 1), (1, 1)]
+    assert (1, 2) in valid and (2, 1) not in valid and (0, 4) not in valid
+
+    lower = CoordView(4, transpose=True)
+    assert list(lower) == [(r, c) for r in range(4) for c in range(r + 1)]
+    assert (2, 1) in lower and (1, 2) not in lower
+
+    invalid = InvalidCoordView(valid)
+    assert len(invalid) == 6 and invalid.coords is None
+    assert (2, 1) in invalid and (1, 2) not in invalid and invalid.coords is None
+    assert sorted(invalid) == [(r, c) for r in range(4) for c in range(r)]
+
+
+def test_cell_values():
+    matrix = ClearanceMatrix(4)
+    cells = CellValues(matrix)
+    assert cells == {} and len(cells) == 0
+
+    cells[(1, 3)] = 2.5
+    matrix.set(0, 0, 0.2)
+    assert cells == {(0, 0): 0.2, (1, 3): 2.5}
+    assert list(cells.items()) == [((0, 0), 0.2), ((1, 3), 2.5)]
+    assert (3, 1) not in cells and (0, 1) not in cells
+
+    del cells[(0, 0)]
+    assert matrix.count_nonzero() == 1
+    with pytest.raises(KeyError):
+        del cells[(0, 0)]
+    with pytest.raises(IndexError):
+        cells[(3, 1)] = 1.0
+
+    matrix.clear()
+    assert cells == {}
+
+
+def test_matrix_stack():
+    stack = MatrixStack(3, ["clearance", "hole_clearance"])
+    stack.layer("clearance").set(0, 1, 0.3)
+    stack.layer("hole_clearance").set(0, 1, 0.5)
+    stack.layer("hole_clearance").set(2, 2, 0.4)
+
+    assert list(stack.nonzero()) == [
+        ((0, 1), (("clearance", 0.3), ("hole_clearance", 0.5))),
+        ((2, 2), (("hole_clearance", 0.4),)),
+    ]
+    assert stack.count_nonzero() == 2
+
+    # The layers are packed one after the other
+    assert len(stack.values) == 12
+    assert stack.values[6 + packed_index(2, 2)] == 0.4
+    copy = MatrixStack.from_values(3, stack.constraints, stack.values)
+    assert list(copy.nonzero()) == list(stack.nonzero())
+    with pytest.raises(ValueError):
+        MatrixStack.from_values(3, ["clearance"], stack.values)
+
+    # Clearing keeps the layer matrices, so references to them stay valid
+    layer = stack.layer("clearance")
+    stack.clear()
+    assert stack.layer("clearance") is layer
+    assert list(stack.nonzero()) == []
+    assert list(copy.nonzero()) != []
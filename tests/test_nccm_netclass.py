@@ -0,0 +1,90 @@
+import os
+import shutil
+
+import pytest
+import nccm_netclass
+from nccm_core import NccmError, NetClass
+from nccm_netclass import NetClassCache, ProjectFileProvider, get_net_classes
+
+TEST_PROJECT = os.path.join(os.path.dirname(__file__), "test-project-nccm")
+
+
+class CountingProvider:
+    """Provider recording how many times it was asked."""
+
+    def __init__(self, provider, cacheable=True):
+        self.provider = provider
+        self.cacheable = cacheable
+        self.calls = 0
+
+    def get_net_classes(self, pro_path):
+        self.calls += 1
+        return self.provider.get_net_classes(pro_path)
+
+
+class BoardProvider:
+    cacheable = False
+
+    def get_net_classes(self, pro_path):
+        return [NetClass("Default", 200000), NetClass("HV")]
+
+
+@pytest.fixture
+def pro_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(nccm_netclass, "memory_cache", {})
+    monkeypatch.setenv(nccm_netclass.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    shutil.copytree(TEST_PROJECT, tmp_path / "project")
+    yield str(tmp_path / "project" / "test-project-nccm.kicad_pro")
+
+
+def class_fields(net_classes):
+    return [(net_class.name, net_class.clearance) for net_class in net_classes]
+
+
+def test_project_file(pro_path):
+    provider = CountingProvider(ProjectFileProvider())
+    net_classes = get_net_classes(pro_path, [provider])
+
+    assert class_fields(net_classes) == [
+        ("Default", 200000),
+        ("BAT+", None),
+        ("BAT-", None),
+        ("LED", None),
+        ("THIS_IS_A_LONG_NET_CLASS_NAME", None),
+    ]
+
+    # Memory, then disk once the memory is gone
+    assert class_fields(get_net_classes(pro_path, [provider])) == class_fields(net_classes)
+    nccm_netclass.memory_cache.clear()
+    assert class_fields(get_net_classes(pro_path, [provider])) == class_fields(net_classes)
+    assert provider.calls == 1
+    assert os.path.isfile(NetClassCache().path)
+
+    # Changing the file makes the entry stale
+    with open(pro_path, "a", encoding="utf-8") as f_write:
+        f_write.write("\n")
+    get_net_classes(pro_path, [provider])
+    assert provider.calls == 2
+
+
+def test_fallback(pro_path):
+    board = CountingProvider(BoardProvider(), cacheable=False)
+    os.remove(pro_path)
+
+    for _ in range(2):
+        net_classes = get_net_classes(pro_path, [ProjectFileProvider(), board])
+        assert class_fields(net_classes) == [("Default", 200000), ("HV", None)]
+    assert board.calls == 2
+
+    with pytest.raises(NccmError, match="is not a KiCad project"):
+        get_net_classes(pro_path, [ProjectFileProvider()])
+
+
+def test_bad_cache_file(pro_path):
+    cache = NetClassCache()
+    os.makedirs(os.path.dirname(cache.path))
+    with open(cache.path, "w", encoding="utf-8") as f_write:
+        f_write.write("{")
+
+    assert len(get_net_classes(pro_path, [ProjectFileProvider()], cache)) == 5
+    assert len(NetClassCache().load()) == 1
@@ -0,0 +1,42 @@
+import json
+
+import nccm_profile
+from nccm_profile import NULL_PHASE, REPORT_FILE, STATS_FILE, Session, phase, profiled
+
+
+def double(value):
+    return value * 2
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(nccm_profile, "session", None)
+
+    assert profiled(double) is double
+    assert phase("load") is NULL_PHASE
+    nccm_profile.set_report_dir("unused")
+    nccm_profile.stop()
+
+
+def test_enabled(monkeypatch, tmp_path):
+    session = Session(use_cprofile=True)
+    monkeypatch.setattr(nccm_profile, "session", session)
+
+    timed_double = profiled(double)
+    with phase("load"):
+        assert timed_double(2) == 4
+    assert not (tmp_path / REPORT_FILE).exists()
+
+    nccm_profile.set_report_dir(str(tmp_path))
+    timed_double(3)
+    nccm_profile.stop()
+
+    lines = (tmp_path / REPORT_FILE).read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [(record["phase"], record["depth"]) for record in records] == [
+        ("double", 1),
+        ("load", 0),
+        ("double", 0),
+    ]
+    assert {record["session"] for record in records} == {session.id}
+    assert all(record["wall_ms"] >= 0 for record in records)
+    assert (tmp_path / STATS_FILE).exists()
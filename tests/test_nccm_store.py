@@ -0,0 +1,144 @@
+import os
+import shutil
+
+import pytest
+import nccm_netclass
+from nccm_dru import CONSTRAINTS, iter_rule_strings, write_rules
+from nccm_matrix import ClearanceMatrix, MatrixStack
+from nccm_store import get_store_path, load_matrix, read_store, save_matrix
+
+TEST_PROJECT = os.path.join(os.path.dirname(__file__), "test-project-nccm")
+CLASS_NAMES = ["Default", "BAT+", "BAT-", "LED", "THIS_IS_A_LONG_NET_CLASS_NAME"]
+
+
+@pytest.fixture
+def dru_path(tmp_path, monkeypatch):
+    monkeypatch.setenv(nccm_netclass.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    shutil.copytree(TEST_PROJECT, tmp_path / "project")
+    yield str(tmp_path / "project" / "test-project-nccm.kicad_dru")
+
+
+def load(dru_path, class_names=CLASS_NAMES):
+    matrix = ClearanceMatrix(len(class_names))
+    return matrix, load_matrix(dru_path, matrix, class_names)
+
+
+def test_load_from_store(dru_path):
+    parsed_matrix, parsed = load(dru_path)
+    assert not parsed.from_store
+    assert os.path.isfile(get_store_path(dru_path))
+
+    stored_matrix, stored = load(dru_path)
+    assert stored.from_store
+    assert stored_matrix.values == parsed_matrix.values
+    assert stored.class_val_dict == parsed.class_val_dict == {("BAT-", "LED"): "5.0mm"}
+    assert stored.missing == parsed.missing == []
+    assert not stored.compact
+
+    # The stored pairs are looked up the way they were written
+    assert stored.class_val_dict[("BAT-", "LED")] == "5.0mm"
+    assert ("LED", "BAT-") not in stored.class_val_dict
+    assert len(stored.class_val_dict) == 1
+
+
+def test_load_edited_section(dru_path):
+    load(dru_path)
+
+    with open(dru_path, "rb") as f_read:
+        data = f_read.read()
+    with open(dru_path, "wb") as f_write:
+        f_write.write(data.replace(b"(min 5.0mm)", b"(min 2.5mm)"))
+
+    matrix, loaded = load(dru_path)
+    assert not loaded.from_store
+    assert matrix.get(2, 3) == 2.5
+
+    # The edited section was stored in turn
+    assert load(dru_path)[1].from_store
+
+
+def test_load_other_classes(dru_path):
+    load(dru_path)
+
+    # Classes renamed or reordered since the store was written are matched by name
+    class_names = ["LED", "Default", "BAT+"]
+    matrix, loaded = load(dru_path, class_names)
+    assert loaded.from_store
+    assert list(matrix.nonzero()) == []
+    assert loaded.missing == [("BAT-", "LED")]
+
+    matrix, loaded = load(dru_path, CLASS_NAMES)
+    assert loaded.from_store
+    assert matrix.get(2, 3) == 5.0
+
+    # Rules naming classes missing from the stored table are stored with their names
+    os.remove(get_store_path(dru_path))
+    assert not load(dru_path, class_names)[1].from_store
+    matrix, loaded = load(dru_path, class_names)
+    assert loaded.from_store
+    assert loaded.missing == [("BAT-", "LED")]
+    matrix, loaded = load(dru_path, CLASS_NAMES)
+    assert loaded.from_store
+    assert matrix.get(2, 3) == 5.0
+
+
+def test_load_bad_store(dru_path):
+    load(dru_path)
+    store_path = get_store_path(dru_path)
+    with open(store_path, "r+b") as f_write:
+        f_write.truncate(os.path.getsize(store_path) - 1)
+    assert read_store(store_path) is None
+
+    matrix, loaded = load(dru_path)
+    assert not loaded.from_store
+    assert matrix.get(2, 3) == 5.0
+
+
+def test_load_without_section(tmp_path, monkeypatch):
+    monkeypatch.setenv(nccm_netclass.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    dru_path = str(tmp_path / "test.kicad_dru")
+    with open(dru_path, "wb") as f_write:
+        f_write.write(b"(version 1)\n")
+
+    assert load(dru_path)[1] is None
+
+
+def test_save_matrix(dru_path):
+    cells = [((2, 3), 0.25), ((0, 4), 1.5)]
+    write_rules(dru_path, iter_rule_strings(CLASS_NAMES, cells, compact=True))
+    save_matrix(dru_path, CLASS_NAMES, cells, compact=True)
+
+    matrix, loaded = load(dru_path)
+    assert loaded.from_store
+    assert loaded.compact
+    assert list(matrix.nonzero()) == cells
+
+
+def test_load_layers(dru_path):
+    cells = [((2, 3), (("clearance", 5.0), ("hole_clearance", 0.8))), ((0, 4), 1.5)]
+    write_rules(dru_path, iter_rule_strings(CLASS_NAMES, cells))
+
+    for from_store in (False, True):
+        stack = MatrixStack(len(CLASS_NAMES), CONSTRAINTS)
+        loaded = load_matrix(dru_path, stack, CLASS_NAMES)
+        assert loaded.from_store == from_store
+        assert stack.layer("hole_clearance").get(2, 3) == 0.8
+        assert list(stack.layer("clearance").nonzero()) == [((2, 3), 5.0), ((0, 4), 1.5)]
+
+    # Loading only the clearances still stores every layer
+    os.remove(get_store_path(dru_path))
+    assert load(dru_path)[0].get(2, 3) == 5.0
+    assert read_store(get_store_path(dru_path)).constraints == list(CONSTRAINTS)
+
+    # Layers are matched by class name when the classes changed
+    stack = MatrixStack(2, CONSTRAINTS)
+    loaded = load_matrix(dru_path, stack, ["LED", "BAT-"])
+    assert loaded.from_store
+    assert list(stack.nonzero()) == [((0, 1), (("clearance", 5.0), ("hole_clearance", 0.8)))]
+    assert loaded.missing == [("Default", "THIS_IS_A_LONG_NET_CLASS_NAME")]
+
+    # Saved cells are stored with every constraint
+    save_matrix(dru_path, CLASS_NAMES, cells)
+    stack = MatrixStack(len(CLASS_NAMES), CONSTRAINTS)
+    assert load_matrix(dru_path, stack, CLASS_NAMES).from_store
+    assert stack.layer("hole_clearance").get(2, 3) == 0.8
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+from nccm_core import MAX_NM, MIN_NM, fill_matrix
+from nccm_dru import build_section, get_class_val_dict, get_rule_strings, parse_dru
+from nccm_matrix import ClearanceMatrix
+from nccm_units import format_mm, nm_to_mm, parse_nm
+
+
+@pytest.mark.parametrize(
+    "text, nm",
+    [
+        ("0.2", 200000),
+        ("0.2mm", 200000),
+        (" 0.2 MM", 200000),
+        ("0,2", 200000),
+        (".5", 500000),
+        ("8 mil", 203200),
+        ("8mils", 203200),
+        ("8 thou", 203200),
+        ("0.01in", 254000),
+        ("1 inch", 25400000),
+        ("150um", 150000),
+        ("150 µm", 150000),
+        ("1e-3", 1000),
+        ("1E-5mm", 10),
+        ("2e1 mil", 508000),
+        ("0.1234567", 123456),
+        ("0.5 inherited", 500000),
+        ("5.0 mm (edited)", 5000000),
+    ],
+)
+def test_parse_nm(text, nm):
+    assert parse_nm(text, MIN_NM, MAX_NM) == nm
+
+
+def test_parse_nm_limits():
+    assert parse_nm("test", MIN_NM, MAX_NM) is None
+    assert parse_nm("-0.5", MIN_NM, MAX_NM) == MIN_NM
+    assert parse_nm("1e999", MIN_NM, MAX_NM) == MAX_NM
+    assert parse_nm("2000 in", MIN_NM, MAX_NM) == MAX_NM
+
+
+def test_format_mm():
+    assert format_mm(5.0) == "5.0"
+    assert format_mm(0.1) == "0.1"
+    assert format_mm(nm_to_mm(1)) == "0.000001"
+    assert format_mm(nm_to_mm(10)) == "0.00001"
+    assert format_mm(nm_to_mm(MAX_NM)) == "999.999999"
+
+    # Every whole number of nanometres comes back as it went in
+    rng = random.Random(0)
+    for nm in [0, 1, 999, 1000, 123456, MAX_NM] + [rng.randrange(MAX_NM) for _ in range(10000)]:
+        assert parse_nm(format_mm(nm_to_mm(nm)), MIN_NM, MAX_NM) == nm
+
+
+def test_rules_round_trip():
+    rng = random.Random(1)
+    class_names = [f"C{i}" for i in range(20)]
+    cells = [
+        ((row, col), nm_to_mm(rng.randrange(1, 10 * 1000000)))
+        for col in range(20)
+        for row in range(col + 1)
+    ]
+    section = build_section(get_rule_strings(class_names, cells))
+    assert b"e-" not in section
+
+    # The values read back are the very floats written, and so write the same rules
+    matrix = ClearanceMatrix(len(class_names))
+    fill_matrix(matrix, class_names, get_class_val_dict(parse_dru(section)))
+    assert list(matrix.nonzero()) == cells
+    assert build_section(get_rule_strings(class_names, matrix.nonzero())) == section
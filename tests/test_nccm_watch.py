@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+
+import pytest
+import nccm_netclass
+from nccm_dru import iter_rule_strings, update_rules
+from nccm_watch import InotifyWatcher, PollingWatcher, get_watcher, read_section_matrix
+
+CLASS_NAMES = ["Default", "BAT+", "BAT-", "LED"]
+
+
+@pytest.fixture
+def dru_path(tmp_path, monkeypatch):
+    monkeypatch.setenv(nccm_netclass.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    yield str(tmp_path / "test.kicad_dru")
+
+
+def write_cells(dru_path, cells):
+    update_rules(dru_path, iter_rule_strings(CLASS_NAMES, cells))
+
+
+def test_polling_watcher(dru_path):
+    watcher = PollingWatcher(dru_path)
+    assert not watcher.changed()
+
+    write_cells(dru_path, [((2, 3), 5.0)])
+    assert watcher.changed()
+    assert not watcher.changed()
+
+    os.remove(dru_path)
+    assert watcher.changed()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_inotify_watcher(dru_path, tmp_path):
+    watcher = get_watcher(dru_path)
+    assert isinstance(watcher, InotifyWatcher)
+    assert not watcher.changed()
+
+    # Files replaced atomically and written in place are both seen, other files are not
+    write_cells(dru_path, [((2, 3), 5.0)])
+    assert watcher.changed()
+    assert not watcher.changed()
+
+    (tmp_path / "other.kicad_dru").write_bytes(b"(version 1)\n")
+    assert not watcher.changed()
+
+    with open(dru_path, "ab") as f_write:
+        f_write.write(b"\n")
+    assert watcher.changed()
+    watcher.close()
+
+
+def test_read_section_matrix(dru_path):
+    # A missing file is read as an empty section
+    assert read_section_matrix(dru_path, CLASS_NAMES, None) is None
+
+    write_cells(dru_path, [((2, 3), 5.0), ((0, 1), 0.5)])
+    section = read_section_matrix(dru_path, CLASS_NAMES, None)
+    assert list(section.layers.layer("clearance").nonzero()) == [((0, 1), 0.5), ((2, 3), 5.0)]
+    assert read_section_matrix(dru_path, CLASS_NAMES, section.digest) is None
+
+    # Only the section is parsed, so a rule being typed elsewhere does not stop it
+    with open(dru_path, "ab") as f_write:
+        f_write.write(b'(rule "half written"')
+    assert read_section_matrix(dru_path, CLASS_NAMES, section.digest) is None
+
+    # A removed section empties the matrix but a removed file leaves it be
+    with open(dru_path, "wb") as f_write:
+        f_write.write(b"(version 1)\n")
+    section = read_section_matrix(dru_path, CLASS_NAMES, section.digest)
+    assert section.digest is None
+    assert list(section.layers.layer("clearance").nonzero()) == []
+
+    os.remove(dru_path)
+    assert read_section_matrix(dru_path, CLASS_NAMES, b"digest") is None
+
+
+def test_read_section_layers(dru_path):
+    write_cells(dru_path, [((2, 3), (("clearance", 5.0), ("physical_clearance", 1.0)))])
+    section = read_section_matrix(dru_path, CLASS_NAMES, None)
+    assert list(section.layers.layer("clearance").nonzero()) == [((2, 3), 5.0)]
+    assert list(section.layers.layer("physical_clearance").nonzero()) == [((2, 3), 1.0)]
+
+
+def test_poll_cost(dru_path):
+    write_cells(dru_path, [((2, 3), 5.0)])
+    watcher = get_watcher(dru_path)
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        watcher.changed()
+    assert time.perf_counter() - start < 0.5
+    watcher.close()